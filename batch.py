@@ -0,0 +1,362 @@
+"""
+This module is to extract DEI, CommonFact and CommonMeasurement values from a large number of XBRL xml files, for example a whole EDGAR archive, by fanning them out across a pool of worker processes.
+Each worker constructs an xbrl.XBRL object exactly as a single-file caller would, so the results are the same as calling XBRL(url) one at a time.
+
+Command line usage:
+    python batch.py [-p PROCESSES] [-d DOWNLOADS] [--quote-batch N] [--ordered] [--streaming] [-o OUTPUT] [-t TABLE] INPUT [INPUT ...]
+
+where INPUT can be a directory, a glob pattern, a manifest file which lists one path or url per line, or a path or url to an XBRL xml file.
+The results are written as one json object per line, and with -t as a CSV, Arrow or Parquet table, see export_helper.
+
+Quotes are not fetched by the workers one filing at a time. The workers calculate every CommonMeasurement which does not need a quote, and the quotes of quote_batch filings are then fetched together in this process with quote_helper.prefetch_quotes, in a single request to a bulk quote provider, before the rest are calculated here. See extract.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import Queue
+import sys
+import threading
+
+from download_helper import Downloader
+import export_helper
+from xbrl import XBRL, DEI
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+from stats_helper import XBRLStats
+from diagnostics_helper import DiagnosticsSummary, FilingDiagnostics
+from quote_helper import get_quote, prefetch_quotes
+from source_helper import is_gzip, is_instance_document
+
+# the number of filings whose quotes are fetched together by default, see extract
+DEFAULT_QUOTE_BATCH = 64
+
+class BatchResult(object):
+    """
+    The result of extracting a single XBRL xml file. If the extraction failed, error is a string describing the failure and the maps are empty.
+    """
+    def __init__(self, url, dei=None, common_facts=None, common_measurements=None, error=None, stats=None, diagnostics=None):
+        self.url = url
+        # A map that maps from DEI objects to its value
+        self.dei = dei if dei is not None else {}
+        # A map that maps from CommonFact objects to its value
+        self.common_facts = common_facts if common_facts is not None else {}
+        # A map that maps from CommonMeasurement objects to its value
+        self.common_measurements = common_measurements if common_measurements is not None else {}
+        self.error = error
+        # the stats_helper.XBRLStats of the worker extracting this file, None if it failed
+        self.stats = stats
+        # the diagnostics_helper.FilingDiagnostics of this file, None if it failed
+        self.diagnostics = diagnostics
+
+    def __repr__(self):
+        return '<{0}: {1}{2}>'.format(self.__class__.__name__, self.url, ' failed' if self.error else '')
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def json(self):
+        """
+        Return this result as a json string, the maps are keyed by the names of DEI, CommonFact and CommonMeasurement
+        """
+        return json.dumps({
+            'url': self.url,
+            'error': self.error,
+            'dei': dict((str(k), v) for k, v in self.dei.items()),
+            'common_facts': dict((str(k), v) for k, v in self.common_facts.items()),
+            'common_measurements': dict((str(k), v) for k, v in self.common_measurements.items()),
+            'stats': self.stats.as_dict() if self.stats else None,
+            'diagnostics': self.diagnostics.as_dict() if self.diagnostics else None,
+        }, sort_keys=True)
+
+def _is_manifest(path):
+    """
+    Return True if the given file is a manifest rather than an XBRL xml file, which may be gzip compressed
+    """
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.xml'):
+        return False
+    with open(path, 'rb') as f:
+        return not is_gzip(f.read(2))
+
+def find_instances(inputs):
+    """
+    Given a list of inputs, each could be
+        1. a directory, every XBRL instance document under it is taken, recursively
+        2. a glob pattern, eg. /data/edgar/2014/*/*.xml
+        3. a manifest file, which lists one path or url per line, blank lines and lines starting with # are ignored
+        4. a path or url to an XBRL xml file, or to a gzip compressed one
+    return a list of paths and urls in the order they were given, directories and glob patterns are sorted
+    """
+    ret = []
+    for item in inputs:
+        if item.startswith('http://') or item.startswith('https://'):
+            ret.append(item)
+        elif os.path.isdir(item):
+            for dirpath, dirnames, filenames in os.walk(item):
+                dirnames.sort()
+                ret.extend(os.path.join(dirpath, x) for x in sorted(filenames) if is_instance_document(x))
+        elif any(x in item for x in '*?['):
+            ret.extend(x for x in sorted(glob.glob(item)) if is_instance_document(x))
+        elif os.path.isfile(item) and _is_manifest(item):
+            with open(item) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        ret.append(line)
+        else:
+            ret.append(item)
+    return ret
+
+def quote_measurements():
+    """
+    Return a tuple of CommonMeasurement in evaluation order which need a quote, directly or through another CommonMeasurement
+    """
+    quoted = set(m for m in CommonMeasurement.all() if m.requires_quote)
+    quoted.update(CommonMeasurement.downstream(measurements=quoted))
+    return tuple(m for m in CommonMeasurement.evaluation_order() if m in quoted)
+
+def _extract(args):
+    """
+    Run in a worker process. Construct an XBRL object and return its values keyed by name, since names are cheap to send back to the parent process and can be mapped back to the registered objects there.
+    If defer_quotes is True, the CommonMeasurement which need a quote are left out, and (symbol, fiscal_period_end_date) of the quote is returned instead, see _add_quote_measurements
+    """
+    url, streaming, data, error, defer_quotes = args
+    if error:
+        return (url, None, None, None, error, None, None, None)
+    try:
+        x = XBRL(url, streaming=streaming, data=data)
+        if defer_quotes:
+            quoted = set(quote_measurements())
+            measurements = [m for m in CommonMeasurement.all() if m not in quoted]
+            quote = (x.dei[DEI.TradingSymbol], x.fiscal_period_end_date)
+        else:
+            measurements = CommonMeasurement.all()
+            quote = None
+        return (url,
+                dict((dei.name, value) for dei, value in x.dei.items()),
+                dict((fact.name, value) for fact, value in x.common_facts.items()),
+                dict((m.name, x.common_measurements[m]) for m in measurements),
+                None,
+                x.stats.as_dict(),
+                x.diagnostics.as_dict(),
+                quote)
+    except Exception as err:
+        return (url, None, None, None, '{0}: {1}'.format(err.__class__.__name__, err), None, None, None)
+
+def _to_result(values):
+    """
+    Return a tuple of (BatchResult, quote), where quote is the (symbol, fiscal_period_end_date) still to be fetched for it, or None
+    """
+    url, dei, common_facts, common_measurements, error, stats, diagnostics, quote = values
+    if error:
+        return (BatchResult(url, error=error), None)
+    return (BatchResult(
+        url,
+        dict((getattr(DEI, k), v) for k, v in dei.items()),
+        dict((CommonFact.pool[k], v) for k, v in common_facts.items()),
+        dict((CommonMeasurement.pool[k], v) for k, v in common_measurements.items()),
+        stats=XBRLStats.from_dict(stats),
+        diagnostics=FilingDiagnostics.from_dict(diagnostics),
+    ), quote)
+
+def _add_quote_measurements(pending):
+    """
+    Given a list of (BatchResult, quote) from _to_result, fetch the quotes of all of them at once with quote_helper.prefetch_quotes, then calculate the CommonMeasurement which need them the same way XBRL does.
+    Returns the list of BatchResult in the same order, a result whose quote could not be fetched fails just like it would in a worker.
+    """
+    quotes = [quote for result, quote in pending if quote is not None]
+    if quotes:
+        try:
+            prefetch_quotes(quotes)
+        except Exception:
+            # each filing asks for its own quote below, which reports the failure on that filing
+            pass
+    measurements = quote_measurements()
+    ret = []
+    for result, quote in pending:
+        if quote is not None:
+            try:
+                with result.stats.phase('quote'):
+                    value = get_quote(*quote)
+                result.stats.quote_requests += 1
+            except Exception as err:
+                result = BatchResult(result.url, error='{0}: {1}'.format(err.__class__.__name__, err))
+            else:
+                fact_values = CommonFact.values_of(result.common_facts)
+                values = CommonMeasurement.values_of(result.common_measurements)
+                with result.stats.phase('measure'):
+                    for m in measurements:
+                        values[m.index] = m.calculate_values(fact_values, values, value)
+                        result.common_measurements[m] = values[m.index]
+        ret.append(result)
+    return ret
+
+def aggregate_stats(results):
+    """
+    Given an iterable of BatchResult, return an XBRLStats which is the sum of the stats of every file extracted successfully
+    """
+    return XBRLStats.merged(result.stats for result in results if result.stats)
+
+def aggregate_diagnostics(results):
+    """
+    Given an iterable of BatchResult, return a DiagnosticsSummary of every file extracted successfully
+    """
+    ret = DiagnosticsSummary()
+    for result in results:
+        if result.diagnostics:
+            ret.add(result.diagnostics)
+    return ret
+
+class _JobWindow(object):
+    """
+    Hand out jobs to a multiprocessing.Pool at most size ahead of the results taken back, see release.
+    The pool takes jobs from its own thread as fast as it can, so without this a generator of downloads would be drained ahead of parsing, keeping every document in memory.
+    """
+    def __init__(self, jobs, size):
+        self._jobs = jobs
+        # a slot is taken for each job handed out and given back for each result
+        self._slots = Queue.Queue(size)
+        self._closed = threading.Event()
+
+    def __iter__(self):
+        jobs = iter(self._jobs)
+        while True:
+            # wait for a slot before taking the next job, but give up once closed
+            while True:
+                if self._closed.is_set():
+                    return
+                try:
+                    self._slots.put(None, timeout=0.5)
+                    break
+                except Queue.Full:
+                    pass
+            try:
+                job = next(jobs)
+            except StopIteration:
+                return
+            yield job
+
+    def release(self):
+        """
+        Give back the slot of a job whose result has been taken
+        """
+        try:
+            self._slots.get_nowait()
+        except Queue.Empty:
+            pass
+
+    def close(self):
+        self._closed.set()
+
+def extract(inputs, processes=None, ordered=False, streaming=False, progress=None, downloads=None, quote_batch=DEFAULT_QUOTE_BATCH):
+    """
+    Extract every XBRL xml file found in inputs (see find_instances) across a pool of worker processes and return a generator of BatchResult as soon as each file is done.
+    By default each worker reads its own file. If downloads is given, files are downloaded (or read) in this process by a download_helper.Downloader with that many concurrent connections instead, and each is handed to a worker as soon as it arrives.
+    Downloaded documents are handed to the workers at most 2 * processes ahead of the results taken back, downloading pauses until then.
+
+    Args:
+        inputs A list of directories, glob patterns, manifest files, paths or urls
+        processes Number of worker processes, default is the number of cpus
+        ordered If True, results are generated in the same order as the input files, otherwise in the order they complete
+        streaming Passed to XBRL, see XBRL.__init__
+        progress A callable taking (done, total, result) which is called after each file
+        downloads Number of concurrent downloads, or a download_helper.Downloader
+        quote_batch Number of filings whose quotes are fetched together, see _add_quote_measurements. Results are then generated quote_batch at a time. If 0 or None, each worker fetches the quote of its own filing instead
+
+    A failure on one file never stops the batch, it is reported in BatchResult.error instead.
+    """
+    urls = find_instances(inputs)
+    total = len(urls)
+    if not total:
+        return
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes)
+    window = None
+    try:
+        if downloads:
+            downloader = downloads if isinstance(downloads, Downloader) else Downloader(concurrency=downloads)
+            window = _JobWindow(((url, streaming, data, error, bool(quote_batch)) for url, data, error in downloader.fetch_all(urls, ordered)), 2 * processes)
+            jobs = iter(window)
+        else:
+            jobs = [(url, streaming, None, None, bool(quote_batch)) for url in urls]
+        mapper = pool.imap if ordered else pool.imap_unordered
+        done = 0
+        pending = []
+        for values in mapper(_extract, jobs):
+            if window is not None:
+                window.release()
+            pending.append(_to_result(values))
+            if quote_batch and len(pending) < quote_batch and done + len(pending) < total:
+                continue
+            for result in _add_quote_measurements(pending):
+                done += 1
+                if progress:
+                    progress(done, total, result)
+                yield result
+            pending = []
+        pool.close()
+    finally:
+        if window is not None:
+            window.close()
+        pool.terminate()
+        pool.join()
+
+def _print_progress(done, total, result):
+    sys.stderr.write('[{0}/{1}] {2}{3}\n'.format(done, total, result.url, ' FAILED ' + result.error if result.error else ''))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract DEI, CommonFact and CommonMeasurement values from XBRL xml files in parallel')
+    parser.add_argument('inputs', nargs='+', help='directories, glob patterns, manifest files, paths or urls of XBRL xml files')
+    parser.add_argument('-p', '--processes', type=int, default=None, help='number of worker processes, default is the number of cpus')
+    parser.add_argument('-d', '--downloads', type=int, default=None, help='download files with this many concurrent connections and hand them to the workers as they arrive')
+    parser.add_argument('-o', '--output', default=None, help='file to write json lines to, default is stdout')
+    parser.add_argument('-t', '--table', default=None, help='also write the results as a table with one row per file, to a .csv, .arrow or .parquet file, see export_helper. Json lines are then only written if --output is given')
+    parser.add_argument('--format', default=None, choices=sorted(export_helper.WRITERS), help='format of --table, by default determined by its extension')
+    parser.add_argument('--quote-batch', type=int, default=DEFAULT_QUOTE_BATCH, help='fetch the quotes of this many files together, 0 to let each worker fetch its own, default is {0}'.format(DEFAULT_QUOTE_BATCH))
+    parser.add_argument('--ordered', action='store_true', help='write results in input order instead of completion order')
+    parser.add_argument('--streaming', action='store_true', help='parse with iterparse to bound memory, see XBRL.__init__')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report progress on stderr')
+    parser.add_argument('--stats', action='store_true', help='report the stats of the whole batch on stderr at the end')
+    parser.add_argument('--diagnostics', action='store_true', help='report the diagnostics summary of the whole batch on stderr at the end')
+    args = parser.parse_args(argv)
+
+    if args.output:
+        out = open(args.output, 'w')
+    else:
+        out = None if args.table else sys.stdout
+    table = export_helper.open_writer(args.table, args.format) if args.table else None
+    failed = 0
+    stats = XBRLStats.merged(())
+    diagnostics = DiagnosticsSummary()
+    try:
+        for result in extract(args.inputs, args.processes, args.ordered, args.streaming, None if args.quiet else _print_progress, args.downloads, args.quote_batch):
+            if result.error:
+                failed += 1
+            else:
+                stats.merge(result.stats)
+                diagnostics.add(result.diagnostics)
+            if table is not None:
+                table.write(result)
+            if out is not None:
+                out.write(result.json())
+                out.write('\n')
+    finally:
+        if table is not None:
+            table.close()
+        if out is not None and out is not sys.stdout:
+            out.close()
+    if args.stats:
+        sys.stderr.write(json.dumps(stats.as_dict(), sort_keys=True))
+        sys.stderr.write('\n')
+    if args.diagnostics:
+        sys.stderr.write(json.dumps(diagnostics.as_dict(), sort_keys=True))
+        sys.stderr.write('\n')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Measure the memory taken by the core objects and the cost of reading their attributes, for the loaded taxonomies and optionally a large filing.
+
+    python benchmarks/bench_objects.py [path to an XBRL xml]
+
+Memory is reported as the shallow size of the objects plus their instance __dict__ if they have one, strings shared between objects are not counted. The rss is the peak resident size of this process.
+"""
+import os
+import resource
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+from usgaap_concept import UsGaapConceptPool
+import xbrl
+
+def object_size(objects):
+    ret = 0
+    for obj in objects:
+        ret += sys.getsizeof(obj)
+        if hasattr(obj, '__dict__'):
+            ret += sys.getsizeof(obj.__dict__)
+    return ret
+
+def peak_rss():
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def time_access(statement, namespace, number=1000000):
+    """
+    Return nanoseconds per execution of statement
+    """
+    timer = timeit.Timer(statement, setup='from __main__ import {0}'.format(', '.join(namespace)))
+    return min(timer.repeat(3, number)) / number * 1e9
+
+def report(label, value, unit):
+    if isinstance(value, float):
+        print '{0:<40} {1:>12,.1f} {2}'.format(label, value, unit)
+    else:
+        print '{0:<40} {1:>12,} {2}'.format(label, value, unit)
+
+def bench_taxonomy():
+    rss = peak_rss()
+    concepts = {}
+    for year in UsGaapConceptPool.get_years():
+        pool = UsGaapConceptPool.get_taxonomy(year).get_pool()
+        report('concepts in {0}'.format(year), len(pool), '')
+        for c in pool.itervalues():
+            concepts[id(c)] = c
+    report('distinct UsGaapConcept objects', len(concepts), '')
+    report('UsGaapConcept objects size', object_size(concepts.itervalues()) / 1024.0, 'KB')
+    report('peak rss growth loading taxonomies', (peak_rss() - rss) / 1024.0, 'MB')
+
+def bench_access():
+    global concept, fact, measurement, dei
+    concept = UsGaapConceptPool.get('us-gaap:Assets')
+    fact = CommonFact.Assets
+    measurement = CommonMeasurement.all()[0]
+    dei = xbrl.DEI.DocumentType
+    names = ['concept', 'fact', 'measurement', 'dei']
+    report('UsGaapConcept.label', time_access('concept.label', names), 'ns')
+    report('CommonFact.index', time_access('fact.index', names), 'ns')
+    report('CommonMeasurement.equation', time_access('measurement.equation', names), 'ns')
+    report('DEI.fact_name', time_access('dei.fact_name', names), 'ns')
+
+def bench_filing(path):
+    rss = peak_rss()
+    x = xbrl.XBRL(path)
+    facts = [f for facts in x._fact_index.itervalues() for f in facts]
+    report('facts in filing', len(facts), '')
+    report('Fact objects size', object_size(facts) / 1024.0, 'KB')
+    report('contexts in filing', len(x.contexts), '')
+    report('ContextRecord objects size', object_size(x.contexts) / 1024.0, 'KB')
+    report('peak rss growth loading filing', (peak_rss() - rss) / 1024.0, 'MB')
+
+if __name__ == '__main__':
+    bench_taxonomy()
+    bench_access()
+    if len(sys.argv) > 1:
+        bench_filing(sys.argv[1])
@@ -0,0 +1,177 @@
+"""
+Generate synthetic but realistic XBRL instance documents for benchmarking.
+
+A generated document looks like a 10-Q or 10-K filed to EDGAR: the usual DEI facts, the contexts for the current quarter, year to date, balance sheet date and their prior-year comparatives, then as many extra contexts, dimensional contexts and facts as asked for.
+Facts are tagged with the us-gaap tags CommonFact looks for, plus custom tags under extension prefixes, so every phase of XBRL has realistic work to do.
+
+    python benchmarks/generate_instance.py --size 10MB -o abc-20140628.xml
+    python benchmarks/generate_instance.py --facts 5000 --contexts 200 --segments 50 --prefixes 3 -o abc-20140628.xml
+"""
+import argparse
+from datetime import date, timedelta
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from common_fact import CommonFact
+
+NAMESPACES = (
+    ('xbrli', 'http://www.xbrl.org/2003/instance'),
+    ('dei', 'http://xbrl.sec.gov/dei/2014-01-31'),
+    ('us-gaap', 'http://fasb.org/us-gaap/2014-01-31'),
+    ('xbrldi', 'http://xbrl.org/2006/xbrldi'),
+    ('iso4217', 'http://www.xbrl.org/2003/iso4217'),
+)
+# a fact line is about this many bytes, used to turn a size into a number of facts
+BYTES_PER_FACT = 130
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+def parse_size(text):
+    """
+    Given a size like 100KB, 200MB or 1024, return the number of bytes
+    """
+    text = text.strip().upper()
+    for suffix, factor in SIZE_UNITS.items():
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+def facts_for_size(size, contexts=10, segments=0):
+    """
+    Return the number of facts which makes a document of about size bytes
+    """
+    overhead = 2048 + 400 * (contexts + segments)
+    return max(1, (size - overhead) // BYTES_PER_FACT)
+
+def _us_gaap_tags():
+    tags = []
+    for fact in CommonFact.all():
+        for name in fact.possible_fact_names or ():
+            prefix, sep, local_name = name.partition(':')
+            if prefix == 'us-gaap' and name not in tags:
+                tags.append(name)
+    return tags
+
+def _context(context_id, cik, period, segment=''):
+    if len(period) == 1:
+        period = '<xbrli:instant>{0}</xbrli:instant>'.format(period[0])
+    else:
+        period = '<xbrli:startDate>{0}</xbrli:startDate><xbrli:endDate>{1}</xbrli:endDate>'.format(*period)
+    if segment:
+        segment = '<xbrli:segment>{0}</xbrli:segment>'.format(segment)
+    return ('  <xbrli:context id="{0}"><xbrli:entity><xbrli:identifier scheme="http://www.sec.gov/CIK">{1}</xbrli:identifier>{2}</xbrli:entity>'
+            '<xbrli:period>{3}</xbrli:period></xbrli:context>\n').format(context_id, cik, segment, period)
+
+def _fact(tag, context_id, value, unit='usd', decimals='-6'):
+    return '  <{0} contextRef="{1}" unitRef="{2}" decimals="{3}">{4}</{0}>\n'.format(tag, context_id, unit, decimals, value)
+
+def generate(out, symbol='abc', period_end=date(2014, 6, 28), document_type='10-Q', contexts=10, facts=1000, segments=0, prefixes=1, seed=0):
+    """
+    Write a synthetic XBRL instance document to the file object out.
+
+    Args:
+        symbol The trading symbol, also the first extension prefix
+        period_end DocumentPeriodEndDate
+        document_type 10-Q or 10-K
+        contexts The number of contexts without dimensions, at least the 6 standard ones are always there
+        facts The number of facts besides DEI
+        segments The number of dimensional contexts, half of them with explicit members and half with typed members
+        prefixes The number of extension prefixes for custom tags besides us-gaap, at least 1
+        seed The seed of the random values, the same arguments always give the same document
+    """
+    rnd = random.Random(seed)
+    prefixes = ['{0}{1}'.format(symbol, i) if i else symbol for i in range(max(1, prefixes))]
+    cik = '{0:010d}'.format(rnd.randint(1, 1999999))
+    quarter = document_type != '10-K'
+    year_start = period_end - timedelta(days=(273 if quarter else 364))
+    prior_end = period_end - timedelta(days=364)
+    # the standard contexts: current quarter, year to date, balance sheet date, and their prior-year comparatives
+    periods = [
+        ('D0', (period_end - timedelta(days=90), period_end)),
+        ('D1', (year_start, period_end)),
+        ('I0', (period_end,)),
+        ('D2', (prior_end - timedelta(days=90), prior_end)),
+        ('D3', (year_start - timedelta(days=364), prior_end)),
+        ('I1', (prior_end,)),
+    ]
+    for i in range(len(periods), contexts):
+        # older quarters and balance sheet dates, skipping the ones one year apart which are taken by the comparatives
+        quarters = (i // 2) + (i // 2) // 3 + 1
+        end = period_end - timedelta(days=91 * quarters)
+        if i % 2:
+            periods.append(('I{0}'.format(i), (end,)))
+        else:
+            periods.append(('D{0}'.format(i), (end - timedelta(days=90), end)))
+    duration_ids = [x[0] for x in periods if len(x[1]) == 2]
+    instant_ids = [x[0] for x in periods if len(x[1]) == 1]
+    dimensional = []
+    for i in range(segments):
+        context_id, period = periods[i % len(periods)]
+        if i % 2:
+            member = '<xbrldi:typedMember dimension="{0}:DebtInstrumentAxis"><{0}:Note>{1}</{0}:Note></xbrldi:typedMember>'.format(prefixes[0], 2015 + i)
+        else:
+            member = '<xbrldi:explicitMember dimension="us-gaap:StatementBusinessSegmentsAxis">{0}:Segment{1}Member</xbrldi:explicitMember>'.format(prefixes[i % len(prefixes)], i)
+        dimensional.append(('{0}_S{1}'.format(context_id, i), period, member))
+
+    namespaces = list(NAMESPACES) + [(prefix, 'http://{0}.com/{1:%Y%m%d}'.format(prefix, period_end)) for prefix in prefixes]
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    out.write('<xbrli:xbrl {0}>\n'.format(' '.join('xmlns:{0}="{1}"'.format(prefix, url) for prefix, url in namespaces)))
+    for context_id, period in periods:
+        out.write(_context(context_id, cik, period))
+    for context_id, period, member in dimensional:
+        out.write(_context(context_id, cik, period, member))
+    out.write('  <xbrli:unit id="usd"><xbrli:measure>iso4217:USD</xbrli:measure></xbrli:unit>\n')
+    out.write('  <xbrli:unit id="shares"><xbrli:measure>xbrli:shares</xbrli:measure></xbrli:unit>\n')
+
+    dei = (
+        ('DocumentType', document_type),
+        ('AmendmentFlag', 'false'),
+        ('DocumentPeriodEndDate', str(period_end)),
+        ('DocumentFiscalYearFocus', str(period_end.year)),
+        ('DocumentFiscalPeriodFocus', 'Q3' if quarter else 'FY'),
+        ('CurrentFiscalYearEndDate', '--09-27'),
+        ('EntityCentralIndexKey', cik),
+        ('EntityRegistrantName', '{0} INC'.format(symbol.upper())),
+        ('TradingSymbol', symbol),
+        ('EntityFilerCategory', 'Large Accelerated Filer'),
+    )
+    for name, value in dei:
+        out.write('  <dei:{0} contextRef="D1">{1}</dei:{0}>\n'.format(name, value))
+
+    # roughly a third of the facts use the tags CommonFact looks for, the rest are custom tags
+    us_gaap_tags = _us_gaap_tags()
+    custom_tags = ['{0}:CustomConcept{1}'.format(prefixes[i % len(prefixes)], i) for i in range(max(1, facts // 20))]
+    dimensional_ids = [x[0] for x in dimensional]
+    for i in range(facts):
+        if i % 3 == 0:
+            tag = us_gaap_tags[(i // 3) % len(us_gaap_tags)]
+        else:
+            tag = rnd.choice(custom_tags)
+        if dimensional_ids and i % 10 == 9:
+            context_id = rnd.choice(dimensional_ids)
+        elif i % 2:
+            context_id = rnd.choice(instant_ids)
+        else:
+            context_id = rnd.choice(duration_ids)
+        out.write(_fact(tag, context_id, rnd.randint(1, 10 ** 9) * 1000))
+    out.write('</xbrli:xbrl>\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic XBRL instance document')
+    parser.add_argument('-o', '--output', required=True, help='path of the xml file to write, name it like abc-20140628.xml')
+    parser.add_argument('--size', help='approximate size of the document, eg. 100KB or 200MB, overrides --facts')
+    parser.add_argument('--facts', type=int, default=1000)
+    parser.add_argument('--contexts', type=int, default=10)
+    parser.add_argument('--segments', type=int, default=0)
+    parser.add_argument('--prefixes', type=int, default=1)
+    parser.add_argument('--document-type', default='10-Q', choices=('10-Q', '10-K'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    facts = facts_for_size(parse_size(args.size), args.contexts, args.segments) if args.size else args.facts
+    with open(args.output, 'wb') as f:
+        generate(f, document_type=args.document_type, contexts=args.contexts, facts=facts, segments=args.segments, prefixes=args.prefixes, seed=args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Time the phases of XBRL on synthetic documents of several sizes, plus rpn_helper and UsGaapConceptPool, and save the results so they can be compared between commits.
+
+    python benchmarks/run_benchmarks.py --sizes 100KB 1MB 10MB -o before.json
+    python benchmarks/run_benchmarks.py --sizes 100KB 1MB 10MB -o after.json --compare before.json
+
+The phases of XBRL are
+    parse       reading the xml into the fact index, see XBRL._load_document and XBRL._load_streaming
+    contexts    DEI and context discovery, see XBRL._determine_dei and XBRL._find_contexts
+    facts       fetching CommonFact values from the fact index, see XBRL._fetch_fact
+    impute      imputing the missing CommonFact, see XBRL._impute
+    measure     calculating every CommonMeasurement, see XBRL._calculate
+They are timed by wrapping those methods, a phase whose methods a commit does not have is reported as 0. Every CommonFact and CommonMeasurement is asked for, so nothing is left out when they are determined lazily.
+The harness also runs on commits older than the options it uses: --streaming needs XBRL(streaming=True), quotes come from a constant QuoteProvider, or a constant get_quote patched into xbrl before quote_helper had providers, and the taxonomy lookups are skipped if the taxonomy can not be loaded. Nothing goes to the network.
+Documents are generated once per size into --data-dir and reused.
+"""
+import argparse
+from datetime import datetime
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import generate_instance
+import quote_helper
+import rpn_helper
+from usgaap_concept import UsGaapConceptPool
+import xbrl
+
+PHASES = (
+    ('parse', ('_load_document', '_load_streaming')),
+    ('contexts', ('_determine_dei', '_find_contexts')),
+    ('facts', ('_fetch_fact',)),
+    ('impute', ('_impute',)),
+    ('measure', ('_calculate',)),
+)
+
+QUOTE = 100.0
+
+def use_constant_quote():
+    if hasattr(quote_helper, 'set_quote_provider'):
+        class ConstantQuoteProvider(quote_helper.QuoteProvider):
+            def get_quote(self, symbol, fiscal_period_end_date):
+                return QUOTE
+        quote_helper.set_quote_provider(ConstantQuoteProvider())
+    else:
+        xbrl.get_quote = lambda symbol, fiscal_period_end_date: QUOTE
+
+def supports_streaming():
+    return 'streaming' in inspect.getargspec(xbrl.XBRL.__init__).args
+
+class PhaseTimer(object):
+    """
+    Wrap the methods of XBRL listed in PHASES so that the time spent in each phase is added up. Calls nested in a method of the same phase are not counted twice.
+    """
+    def __init__(self):
+        self.totals = dict((phase, 0.0) for phase, methods in PHASES)
+        self._depth = dict((phase, 0) for phase, methods in PHASES)
+        self._originals = {}
+
+    def _wrap(self, phase, method):
+        def wrapper(*args, **kwargs):
+            self._depth[phase] += 1
+            start = time.time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._depth[phase] -= 1
+                if not self._depth[phase]:
+                    self.totals[phase] += time.time() - start
+        return wrapper
+
+    def install(self):
+        for phase, methods in PHASES:
+            for name in methods:
+                if name in xbrl.XBRL.__dict__:
+                    original = xbrl.XBRL.__dict__[name]
+                    self._originals[name] = original
+                    if isinstance(original, staticmethod):
+                        setattr(xbrl.XBRL, name, staticmethod(self._wrap(phase, original.__func__)))
+                    else:
+                        setattr(xbrl.XBRL, name, self._wrap(phase, original))
+
+    def uninstall(self):
+        for name, original in self._originals.items():
+            setattr(xbrl.XBRL, name, original)
+        self._originals = {}
+
+    def reset(self):
+        for phase in self.totals:
+            self.totals[phase] = 0.0
+
+def prepare_document(data_dir, size, contexts, segments, prefixes):
+    """
+    Return the path of a generated document of about size bytes, generating it if it does not exist yet
+    """
+    name = 'abc-20140628-{0}-c{1}-s{2}-p{3}.xml'.format(size, contexts, segments, prefixes)
+    path = os.path.join(data_dir, name)
+    if not os.path.isfile(path):
+        facts = generate_instance.facts_for_size(generate_instance.parse_size(size), contexts, segments)
+        with open(path, 'wb') as f:
+            generate_instance.generate(f, contexts=contexts, facts=facts, segments=segments, prefixes=prefixes)
+    return path
+
+def bench_document(path, repeat, streaming):
+    """
+    Return the best time of each phase over repeat runs, in seconds
+    """
+    timer = PhaseTimer()
+    timer.install()
+    best = None
+    try:
+        for i in range(repeat):
+            timer.reset()
+            start = time.time()
+            x = xbrl.XBRL(path, streaming=True) if streaming else xbrl.XBRL(path)
+            for fact in CommonFact.all():
+                x.common_facts[fact]
+            for m in CommonMeasurement.all():
+                x.common_measurements[m]
+            total = time.time() - start
+            result = dict(timer.totals)
+            result['total'] = total
+            if best is None or total < best['total']:
+                best = result
+    finally:
+        timer.uninstall()
+    best['bytes'] = os.path.getsize(path)
+    return best
+
+def bench_rpn(number=100000):
+    """
+    Return microseconds per rpn_helper.calculate call
+    """
+    tokens = ('5', '1', '2', '+', '4', '*', '+', '3', '-')
+    start = time.time()
+    for i in xrange(number):
+        rpn_helper.calculate(tokens)
+    return (time.time() - start) / number * 1e6
+
+def bench_taxonomy(number=10000):
+    """
+    Return the time to open the taxonomy and get a concept the first time, and microseconds per lookup after that. Returns an empty map if the taxonomy can not be loaded
+    """
+    start = time.time()
+    try:
+        UsGaapConceptPool.get('us-gaap:Assets')
+    except IOError as err:
+        sys.stderr.write('Skip taxonomy lookups: {0}\n'.format(err))
+        return {}
+    first = time.time() - start
+    tags = UsGaapConceptPool.get_all_tags()
+    step = max(1, len(tags) // number)
+    lookups = tags[::step]
+    start = time.time()
+    for tag in lookups:
+        UsGaapConceptPool.get(tag)
+    return {'first_lookup': first, 'lookup_us': (time.time() - start) / len(lookups) * 1e6}
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def compare(current, previous):
+    """
+    Print each timing of current next to the one in previous
+    """
+    print '{0:<24} {1:>12} {2:>12} {3:>8}'.format('', previous.get('revision', 'before'), current.get('revision', 'after'), 'ratio')
+    rows = []
+    for size, phases in sorted(current['documents'].items()):
+        for phase in [x[0] for x in PHASES] + ['total']:
+            old = previous.get('documents', {}).get(size, {}).get(phase)
+            rows.append(('{0} {1}'.format(size, phase), old, phases[phase]))
+    for key, value in sorted(current['micro'].items()):
+        rows.append((key, previous.get('micro', {}).get(key), value))
+    for label, old, new in rows:
+        ratio = '{0:.2f}'.format(new / old) if old else '-'
+        print '{0:<24} {1:>12} {2:>12.4f} {3:>8}'.format(label, '{0:.4f}'.format(old) if old is not None else '-', new, ratio)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark XBRL, rpn_helper and UsGaapConceptPool')
+    parser.add_argument('--sizes', nargs='+', default=['100KB', '1MB', '10MB'], help='document sizes, from 100KB up to 200MB')
+    parser.add_argument('--contexts', type=int, default=50)
+    parser.add_argument('--segments', type=int, default=20)
+    parser.add_argument('--prefixes', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--streaming', action='store_true', help='parse with XBRL(streaming=True)')
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'benchmarks', 'data'), help='where generated documents are kept')
+    parser.add_argument('-o', '--output', help='save the results as json to this path')
+    parser.add_argument('--compare', help='a json saved by an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    if args.streaming and not supports_streaming():
+        parser.error('--streaming needs XBRL(streaming=True), which this commit does not have')
+    use_constant_quote()
+    if not os.path.isdir(args.data_dir):
+        os.makedirs(args.data_dir)
+    results = {
+        'revision': git_revision(),
+        'time': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'streaming': args.streaming,
+        'documents': {},
+        'micro': {},
+    }
+    for size in args.sizes:
+        path = prepare_document(args.data_dir, size, args.contexts, args.segments, args.prefixes)
+        results['documents'][size] = bench_document(path, args.repeat, args.streaming)
+        print size, ' '.join('{0}={1:.4f}'.format(phase, results['documents'][size][phase]) for phase in [x[0] for x in PHASES] + ['total'])
+    results['micro']['rpn_calculate_us'] = bench_rpn()
+    for key, value in bench_taxonomy().items():
+        results['micro']['taxonomy_' + key] = value
+    print ' '.join('{0}={1:.4f}'.format(key, value) for key, value in sorted(results['micro'].items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+An opt-in on-disk cache for xbrl.XBRL. Filings never change once they are published, so everything extracted from a document can be kept and reused instead of parsing the xml again.
+
+Each entry is keyed by the hash of the document content, and stored under a directory named after a fingerprint of the DEI, CommonFact and CommonMeasurement definitions, so changing any definition automatically stops old entries from being used.
+
+Usage:
+    >>> cache = XBRLCache('/data/xbrl-cache')
+    >>> x = xbrl.XBRL(url, cache=cache)
+"""
+import cPickle
+import hashlib
+import os
+import shutil
+import tempfile
+import zlib
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+from xbrl import DEI
+
+# bump this whenever what XBRL stores in a cache entry changes
+CACHE_VERSION = 5
+
+def definitions_fingerprint():
+    """
+    Return a hex string which changes whenever any DEI, CommonFact or CommonMeasurement is added, removed or redefined, or CACHE_VERSION changes
+    """
+    definitions = [
+        CACHE_VERSION,
+        sorted(dei.name for dei in DEI.all()),
+        [(fact.name, fact.possible_fact_names, fact.impute_equations) for fact in CommonFact.all()],
+        [(m.name, tuple(str(token) for token in m.equation)) for m in CommonMeasurement.all()],
+    ]
+    return hashlib.sha1(repr(definitions)).hexdigest()
+
+class XBRLCache(object):
+    """
+    This class represents a directory of cached XBRL results, see xbrl.XBRL.__init__
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def make_key(self, data, streaming=False):
+        """
+        Given the content of a document, return the key of its cache entry
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        return '{0}/{1}/{2}{3}'.format(definitions_fingerprint()[:16], digest[:2], digest, '-streaming' if streaming else '')
+
+    def _path(self, key):
+        return os.path.join(self.directory, *key.split('/')) + '.bin'
+
+    def get(self, key):
+        """
+        Return the state stored for key, or None if there is no usable entry
+        """
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            state = cPickle.loads(zlib.decompress(data))
+        except (IOError, EOFError, zlib.error, cPickle.UnpicklingError):
+            return None
+        if not isinstance(state, dict) or state.get('version') != CACHE_VERSION:
+            return None
+        return state['state']
+
+    def put(self, key, state):
+        """
+        Store state for key. The entry is written to a temporary file first and then renamed, so readers in other processes never see a partial entry
+        """
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # another process created it in the meantime
+                if not os.path.isdir(directory):
+                    raise
+        data = zlib.compress(cPickle.dumps({'version': CACHE_VERSION, 'state': state}, cPickle.HIGHEST_PROTOCOL))
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def clear_stale(self):
+        """
+        Remove all entries which were stored with definitions other than the current ones
+        """
+        if not os.path.isdir(self.directory):
+            return
+        current = definitions_fingerprint()[:16]
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name != current and os.path.isdir(path):
+                shutil.rmtree(path)
@@ -1,3 +1,5 @@
+import operator
+import graph_helper
 import rpn_helper
 
 class CommonFact(object):
@@ -6,9 +8,18 @@ class CommonFact(object):
     As a result, this class takes an argument of possible fact names which is a tuple of possible us-gaap tags which this common fact can be fetched from.
     As well as an argument impute_equations, which is a tuple of tuple represents a series of possible equations to impute the value for this common fact. The equation is using Reverse Polish Notation
     For example, a CommonFact named 'Assets' represents the total amount of Assets in this statement, its possible_fact_name could be 'Assets', 'Asset', and etc.
+
+    Each CommonFact gets an index in the order it was defined, so the values of all CommonFact for a filing can be kept in a list, see values_of.
+    Imputation should follow evaluation_order, in which every CommonFact comes after the CommonFact its impute_equations refer to.
     """
-    # pool is a set of strings contains all object names, for convenient retrieval
+    __slots__ = ('name', 'possible_fact_names', 'impute_equations', 'index', '_evaluators')
+
+    # pool is a map that maps from name to CommonFact, for convenient retrieval
     pool = {}
+    # all CommonFact in the order they were defined, CommonFact.index is the position in this list
+    _members = []
+    # (evaluation order, cycles, dependents), see _get_graph
+    _graph = None
 
     def __init__(self,
                  name,
@@ -24,7 +35,17 @@ class CommonFact(object):
             self.name = name
             self.possible_fact_names = possible_fact_names
             self.impute_equations = impute_equations
+            # compiled impute_equations, see _get_evaluators
+            self._evaluators = None
+            if name in self.pool:
+                # redefining a CommonFact takes over the position of the old one
+                self.index = self.pool[name].index
+                self._members[self.index] = self
+            else:
+                self.index = len(self._members)
+                self._members.append(self)
             self.pool[name] = self
+            CommonFact._graph = None
         else:
             raise ValueError('Given name is not a string')
 
@@ -34,36 +55,114 @@ class CommonFact(object):
         """
         if common_facts[self] != float(0):
             return common_facts[self]
-        ret = float(0)
-        if not self.impute_equations:
+        return self.impute_values(self.values_of(common_facts))
+
+    def impute_values(self, values):
+        """
+        Same as impute, but given a list of values indexed by CommonFact.index, see values_of
+        """
+        ret = values[self.index]
+        if ret != float(0):
             return ret
-        for equation in self.impute_equations:
-            equation = list(equation)
-            equation = [self.pool[x] if x in self.pool else x for x in equation]
-            equation = [common_facts[x] if x in common_facts else x for x in equation]
-            ret = rpn_helper.calculate(equation)
+        for evaluate in self._get_evaluators():
+            ret = evaluate(values)
             if ret:
                 break
         return ret
 
+    def _get_evaluators(self):
+        """
+        Compile impute_equations into closures the first time they are needed. This can not be done in __init__ because an equation may refer to a CommonFact defined later in this module.
+        Raises ValueError if an equation is invalid or refers to an unknown CommonFact.
+        """
+        if self._evaluators is None:
+            self._evaluators = tuple(rpn_helper.compile_expression(equation, self._load) for equation in self.impute_equations or ())
+        return self._evaluators
+
+    @classmethod
+    def _load(cls, name):
+        if name not in cls.pool:
+            return None
+        return operator.itemgetter(cls.pool[name].index)
+
+    def get_dependencies(self):
+        """
+        Return a tuple of CommonFact which impute_equations refer to, unknown names are ignored
+        """
+        ret = []
+        for equation in self.impute_equations or ():
+            for token in equation:
+                if token in self.pool and self.pool[token] not in ret:
+                    ret.append(self.pool[token])
+        return tuple(ret)
+
+    @classmethod
+    def _get_graph(cls):
+        """
+        Build the dependency graph of impute_equations once and cache it until another CommonFact is defined
+        """
+        if cls._graph is None:
+            groups = graph_helper.sort_topologically(cls._members, cls.get_dependencies)
+            order = tuple(fact for group in groups for fact in group)
+            cycles = graph_helper.find_cycles(groups, cls.get_dependencies)
+            dependents = graph_helper.find_dependents(cls._members, cls.get_dependencies)
+            cls._graph = (order, cycles, dependents)
+        return cls._graph
+
+    @classmethod
+    def evaluation_order(cls):
+        """
+        Returns a tuple of all members, ordered so that imputing them one by one in a single pass uses every value an equation refers to after it has been determined.
+        impute_equations are alternatives which often refer to each other, eg. Revenues from GrossProfit and GrossProfit from Revenues, see cycles. Members of such a cycle keep the order they were defined in.
+        """
+        return cls._get_graph()[0]
+
+    @classmethod
+    def cycles(cls):
+        """
+        Returns a list of tuples, each tuple is a group of CommonFact whose impute_equations depend on each other
+        """
+        return cls._get_graph()[1]
+
+    @classmethod
+    def downstream(cls, facts):
+        """
+        Given an iterable of CommonFact, return a tuple of CommonFact in evaluation_order which are imputed from any of them, directly or indirectly
+        """
+        ret = graph_helper.find_downstream(facts, cls._get_graph()[2])
+        return tuple(fact for fact in cls.evaluation_order() if fact in ret)
+
+    @classmethod
+    def upstream(cls, facts):
+        """
+        Given an iterable of CommonFact, return a tuple of them and all CommonFact they are imputed from, directly or indirectly, in evaluation_order.
+        Imputing these in order gives the given CommonFact the same values as imputing everything would.
+        """
+        ret = graph_helper.find_upstream(facts, cls.get_dependencies)
+        return tuple(fact for fact in cls.evaluation_order() if fact in ret)
+
+    @classmethod
+    def values_of(cls, common_facts):
+        """
+        Given a map maps from CommonFact to its value, return a list of values indexed by CommonFact.index, missing CommonFact are 0
+        """
+        ret = [float(0)] * len(cls._members)
+        for fact, value in common_facts.items():
+            ret[fact.index] = value
+        return ret
+
     def __str__(self):
         return self.name
 
     def __repr__(self):
         return '<{0}: {1}>'.format(self.__class__.__name__, self.name)
 
-    def __getattr__(self, name):
-        lookup = name
-        if lookup in self.__dict__:
-            return self.__dict__[lookup]
-        return self.__dict__[name] if name in self.__dict__ else None
-
     @classmethod
     def all(cls):
         """
-        Returns a tuple which contains all members
+        Returns a tuple which contains all members, in the order they were defined
         """
-        return tuple(cls.pool.values())
+        return tuple(cls._members)
 
 ############################################################
 ###             Balance Sheet
@@ -735,5 +834,9 @@ CommonFact.DepreciationDepletionAndAmortization = CommonFact(
     ),
 )
 
+# build the dependency graph when this module is imported
+CommonFact.evaluation_order()
+
 if __name__ == '__main__':
     print CommonFact.all()
+    print CommonFact.cycles()
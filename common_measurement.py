@@ -1,4 +1,5 @@
 from common_fact import CommonFact
+import graph_helper
 import rpn_helper
 
 class CommonMeasurement(object):
@@ -6,9 +7,17 @@ class CommonMeasurement(object):
     A CommonMeasurement is a calculated number from some facts that can indicate the performance of a stock.
     For example, ROE (Return on Equity) is the amount of net income returned as a percentage of shareholders equity.
     This class provides basic implementation and a set of predefined measurement for your disposal.
+
+    Like CommonFact, each CommonMeasurement gets an index in the order it was defined, and its equation is compiled once when it is defined, see calculate_values.
+    Measurements should be calculated following evaluation_order, in which every CommonMeasurement comes after the CommonMeasurement its equation refers to.
     """
+    __slots__ = ('name', 'abbreviation', 'definition', 'equation', 'requires_quote', 'index', '_evaluate')
 
     pool = {}
+    # all CommonMeasurement in the order they were defined, CommonMeasurement.index is the position in this list
+    _members = []
+    # (evaluation order, dependents), see _get_graph
+    _graph = None
 
     def __init__(self,
                  name,
@@ -30,7 +39,18 @@ class CommonMeasurement(object):
         self.abbreviation = abbr if abbr else self.name
         self.definition = definition
         self.equation = equation
+        # True if the equation refers to Quote directly
+        self.requires_quote = any(token == Quote for token in equation if isinstance(token, str))
+        self._evaluate = rpn_helper.compile_expression(equation, self._load)
+        if name in self.pool:
+            # redefining a CommonMeasurement takes over the position of the old one
+            self.index = self.pool[name].index
+            self._members[self.index] = self
+        else:
+            self.index = len(self._members)
+            self._members.append(self)
         self.pool[name] = self
+        CommonMeasurement._graph = None
 
     def __str__(self):
         return self.name
@@ -38,48 +58,106 @@ class CommonMeasurement(object):
     def __repr__(self):
         return '<{0}: {1}>'.format(self.__class__.__name__, self.name)
 
+    @staticmethod
+    def _load(token):
+        """
+        Return a callable which loads the value of token from env, where env is a tuple of (list of CommonFact values, list of CommonMeasurement values, quote)
+        """
+        if isinstance(token, CommonFact):
+            index = token.index
+            return lambda env: env[0][index]
+        if isinstance(token, CommonMeasurement):
+            index = token.index
+            return lambda env: env[1][index]
+        if token == Quote:
+            return lambda env: env[2]
+        # any other string is taken as 0
+        return lambda env: 0
+
     def calculate(self, common_facts, common_measurements, quote=1):
         """
         Given common_facts as a map which maps from CommonFact to its value and common_measurements which maps from CommonMeasurement to its value, calculate the measurement value based on the equation using Reverse Polish Notation.
         The reason to have 2 maps here is:
             1. common_facts, most of the measurements are calculated using CommonFact, for example, WorkingCapital = CurrentAssets - CurrentLiabilities
             2. common_measurements, some of the measurements are calculated using CommonMeasurement as well
+        If a CommonMeasurement in the equation has not yet been calculated, it is taken as 0.
         Return a float
         """
         if not common_facts or len(common_facts) == 0:
             raise ValueError('Given common_facts is either None or nothing in it')
-        ret = float(0)
-        if not self.equation:
-            return ret
-        copy = list(self.equation)
-        copy = [common_facts[f] if (isinstance(f, CommonFact) and f in common_facts) else f for f in copy]
-        copy = [common_measurements[f] if (isinstance(f, CommonMeasurement) and f in common_measurements) else f for f in copy]
-        copy = [quote if (isinstance(f, str) and f == 'Quote') else f for f in copy]
-        copy = [0 if (isinstance(f, str) and f not in '+-*/') else f for f in copy]
-        # if there is still CommonFact or CommonMeasurement object in copy array, then it means that is a CommonMeasurement and it has not yet been calculated, so put it as 0
-        copy = [0 if (isinstance(f, CommonFact) or isinstance(f, CommonMeasurement)) else f for f in copy]
-        # for index in xrange(len(copy)):
-        #     value = copy[index]
-        #     if isinstance(value, float) or isinstance(value, int):
-        #         continue
-        #     if isinstance(value, str) and value in '+-*/':
-        #         continue
-        #     if value in common_measurements:
-        #         copy[index] = common_measurements[value]
-        #     else:
-        #         copy[index] = 0
-        try:
-            ret = rpn_helper.calculate(copy)
-        except ZeroDivisionError:
-            return 0
+        return self.calculate_values(CommonFact.values_of(common_facts), self.values_of(common_measurements), quote)
+
+    def calculate_values(self, fact_values, measurement_values, quote=1):
+        """
+        Same as calculate, but given lists of values indexed by CommonFact.index and CommonMeasurement.index, see CommonFact.values_of and values_of
+        """
+        return self._evaluate((fact_values, measurement_values, quote))
+
+    def get_dependencies(self):
+        """
+        Return a tuple of CommonFact and CommonMeasurement which the equation refers to
+        """
+        ret = []
+        for token in self.equation:
+            if isinstance(token, (CommonFact, CommonMeasurement)) and token not in ret:
+                ret.append(token)
+        return tuple(ret)
+
+    @classmethod
+    def _get_graph(cls):
+        """
+        Build the dependency graph of equations once and cache it until another CommonMeasurement is defined.
+        Raises ValueError if some equations depend on each other, as there is no way to calculate them.
+        """
+        if cls._graph is None:
+            groups = graph_helper.sort_topologically(cls._members, cls.get_dependencies)
+            cycles = graph_helper.find_cycles(groups, cls.get_dependencies)
+            if cycles:
+                raise ValueError('CommonMeasurement equations depend on each other: {0}'.format(cycles))
+            order = tuple(m for group in groups for m in group)
+            dependents = graph_helper.find_dependents(cls._members, cls.get_dependencies)
+            cls._graph = (order, dependents)
+        return cls._graph
+
+    @classmethod
+    def evaluation_order(cls):
+        """
+        Returns a tuple of all members, ordered so that calculating them one by one in a single pass uses every measurement an equation refers to after it has been calculated
+        """
+        return cls._get_graph()[0]
+
+    @classmethod
+    def downstream(cls, facts=(), measurements=()):
+        """
+        Given iterables of CommonFact and CommonMeasurement, return a tuple of CommonMeasurement in evaluation_order which are calculated from any of them, directly or indirectly
+        """
+        ret = graph_helper.find_downstream(tuple(facts) + tuple(measurements), cls._get_graph()[1])
+        return tuple(m for m in cls.evaluation_order() if m in ret)
+
+    @classmethod
+    def upstream(cls, measurements):
+        """
+        Given an iterable of CommonMeasurement, return a tuple of them and all CommonMeasurement they are calculated from, directly or indirectly, in evaluation_order
+        """
+        ret = graph_helper.find_upstream(measurements, lambda m: [x for x in m.get_dependencies() if isinstance(x, CommonMeasurement)])
+        return tuple(m for m in cls.evaluation_order() if m in ret)
+
+    @classmethod
+    def values_of(cls, common_measurements):
+        """
+        Given a map maps from CommonMeasurement to its value, return a list of values indexed by CommonMeasurement.index, missing CommonMeasurement are 0
+        """
+        ret = [float(0)] * len(cls._members)
+        for m, value in common_measurements.items():
+            ret[m.index] = value
         return ret
 
     @classmethod
     def all(cls):
         """
-        Returns a tuple which contains all members
+        Returns a tuple which contains all members, in the order they were defined
         """
-        return tuple(cls.pool.values())
+        return tuple(cls._members)
 
 Quote = 'Quote'
 
@@ -190,3 +268,6 @@ CommonMeasurement.PriceToFreeCashFlowRatio = CommonMeasurement(
     'Price to Free Cash Flow',
     (CommonMeasurement.MarketCapitalization, CommonMeasurement.FreeCashFlow, '/'),
 )
+
+# build the dependency graph when this module is imported, this fails if any equations depend on each other
+CommonMeasurement.evaluation_order()
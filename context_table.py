@@ -0,0 +1,253 @@
+"""
+Every fact in an XBRL xml refers to a <context>, which tells the entity and the period the fact is about. This module keeps all contexts of a document in a table indexed by period, so picking the context for a given period is a dictionary lookup.
+Contexts about a part of the entity, eg. a business segment or a geographic area, name that part with dimensions: pairs of an axis and a member on it. The table indexes those by axis and member as well.
+"""
+from datetime import date, timedelta
+
+def parse_date(text):
+    """
+    Given the text of <instant>, <startDate> or <endDate>, eg. 2014-06-28, return a date, or None if it is not a valid date
+    """
+    if not text:
+        return None
+    try:
+        tokens = tuple(int(x) for x in text.strip()[:10].split('-'))
+        return date(tokens[0], tokens[1], tokens[2])
+    except (ValueError, IndexError):
+        return None
+
+def one_year_before(day):
+    """
+    Return the same date one year before the given date, Feb 29 becomes Feb 28
+    """
+    try:
+        return day.replace(year=day.year-1)
+    except ValueError:
+        return day.replace(year=day.year-1, day=28)
+
+def _offsets(tolerance):
+    # 0, -1, 1, -2, 2, ... so that the closest date is tried first
+    yield 0
+    for i in range(1, tolerance+1):
+        yield -i
+        yield i
+
+class ContextRecord(object):
+    """
+    This class represents a single <context>.
+    A context has either an instant, or a start_date and an end_date, all as date objects.
+    has_dimensions is True if <entity> has anything more than <identifier>, for example a <segment> with explicit members, which means facts in this context are about a part of the entity only.
+    dimensions is a tuple of (axis, member) pairs, sorted by axis, from the <xbrldi:explicitMember> and <xbrldi:typedMember> in <segment> or <scenario>. Both are written as in the document, eg. ('us-gaap:StatementBusinessSegmentsAxis', 'aapl:AmericasSegmentMember'), and the member of a typed member is the text of its value.
+    Dimensions in <scenario> do not set has_dimensions, as they are still about the entity as a whole, so such a context is picked as a context of the entity, see ContextTable. It is found by the dimension queries though, see is_dimensional.
+    """
+    __slots__ = ('id', 'entity', 'has_dimensions', 'instant', 'start_date', 'end_date', 'dimensions')
+
+    def __init__(self, id, entity, has_dimensions, instant=None, start_date=None, end_date=None, dimensions=()):
+        self.id = id
+        self.entity = entity
+        self.has_dimensions = has_dimensions
+        self.instant = instant
+        self.start_date = start_date
+        self.end_date = end_date
+        self.dimensions = tuple(sorted(dimensions))
+
+    def __repr__(self):
+        if self.is_instant:
+            period = str(self.instant)
+        else:
+            period = '{0}~{1}'.format(self.start_date, self.end_date)
+        return '<{0}: {1} {2}{3}>'.format(self.__class__.__name__, self.id, period, ' dimensional' if self.is_dimensional else '')
+
+    @property
+    def is_instant(self):
+        return self.instant is not None
+
+    @property
+    def is_duration(self):
+        return self.start_date is not None and self.end_date is not None
+
+    @property
+    def is_dimensional(self):
+        """
+        True if this context has dimensions in <segment> or <scenario>
+        """
+        return self.has_dimensions or bool(self.dimensions)
+
+    @property
+    def months(self):
+        """
+        The length of a duration in whole months, eg. 3 for a quarter and 12 for a year, regardless of 52/53-week fiscal years. None for an instant
+        """
+        if not self.is_duration:
+            return None
+        return int(round((self.end_date - self.start_date).days / 30.4375))
+
+    def get_member(self, axis):
+        """
+        Return the member on the given axis, or None if this context has no such axis
+        """
+        for x in self.dimensions:
+            if x[0] == axis:
+                return x[1]
+        return None
+
+    def same_period(self, other):
+        """
+        Return True if the other ContextRecord is about the same instant or the same duration
+        """
+        return self.instant == other.instant and self.start_date == other.start_date and self.end_date == other.end_date
+
+    def to_tuple(self):
+        """
+        Return this record as builtin types, see from_tuple
+        """
+        return (self.id, self.entity, self.has_dimensions,
+                self.instant.toordinal() if self.instant else None,
+                self.start_date.toordinal() if self.start_date else None,
+                self.end_date.toordinal() if self.end_date else None,
+                self.dimensions)
+
+    @classmethod
+    def from_tuple(cls, values):
+        dates = tuple(date.fromordinal(x) if x else None for x in values[3:6])
+        return cls(values[0], values[1], values[2], *dates, dimensions=tuple(tuple(x) for x in values[6]) if len(values) > 6 else ())
+
+class ContextTable(object):
+    """
+    All contexts of a document, in document order, indexed by id, by instant, by end date of durations, by length of durations and by axis and member of dimensions.
+    Every lookup returns a tuple of ContextRecord in document order. By default only contexts without dimensions are returned, which are the ones describing the entity as a whole.
+    """
+    def __init__(self, records=()):
+        self._records = []
+        self._by_id = {}
+        # map from date to list of instant ContextRecord
+        self._instants = {}
+        # map from end date to list of duration ContextRecord
+        self._durations = {}
+        # map from length in months to list of duration ContextRecord
+        self._by_months = {}
+        # map from axis to list of ContextRecord
+        self._by_axis = {}
+        # map from (axis, member) to list of ContextRecord
+        self._by_member = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        self._records.append(record)
+        self._by_id[record.id] = record
+        if record.is_instant:
+            self._instants.setdefault(record.instant, []).append(record)
+        elif record.is_duration:
+            self._durations.setdefault(record.end_date, []).append(record)
+            self._by_months.setdefault(record.months, []).append(record)
+        for axis, member in record.dimensions:
+            self._by_axis.setdefault(axis, []).append(record)
+            self._by_member.setdefault((axis, member), []).append(record)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, context_id):
+        return context_id in self._by_id
+
+    def get(self, context_id):
+        """
+        Return the ContextRecord for the given id, or None
+        """
+        return self._by_id.get(context_id)
+
+    @staticmethod
+    def _filter(records, dimensional):
+        if dimensional:
+            return tuple(records)
+        return tuple(x for x in records if not x.has_dimensions)
+
+    def instants_at(self, day, dimensional=False):
+        """
+        Return the instant contexts at the given date
+        """
+        return self._filter(self._instants.get(day, ()), dimensional)
+
+    def durations_ending_at(self, day, months=None, dimensional=False):
+        """
+        Return the duration contexts ending at the given date, only those which are the given number of months long if months is given
+        """
+        records = self._durations.get(day, ())
+        if months is not None:
+            records = [x for x in records if x.months == months]
+        return self._filter(records, dimensional)
+
+    def instants_near(self, day, tolerance=7, dimensional=False):
+        """
+        Return the instant contexts at the date closest to the given date, at most tolerance days away. Useful for prior periods of 52/53-week fiscal years, which do not end on the same date every year
+        """
+        for offset in _offsets(tolerance):
+            records = self.instants_at(day + timedelta(offset), dimensional)
+            if records:
+                return records
+        return ()
+
+    def durations_ending_near(self, day, months=None, tolerance=7, dimensional=False):
+        """
+        Return the duration contexts ending at the date closest to the given date, at most tolerance days away, see instants_near
+        """
+        for offset in _offsets(tolerance):
+            records = self.durations_ending_at(day + timedelta(offset), months, dimensional)
+            if records:
+                return records
+        return ()
+
+    def durations_of(self, months, dimensional=False):
+        """
+        Return the duration contexts which are the given number of months long
+        """
+        return self._filter(self._by_months.get(months, ()), dimensional)
+
+    def axes(self):
+        """
+        Return a sorted tuple of every axis used by a context
+        """
+        return tuple(sorted(self._by_axis))
+
+    def members(self, axis):
+        """
+        Return a sorted tuple of every member used on the given axis
+        """
+        return tuple(sorted(x[1] for x in self._by_member if x[0] == axis))
+
+    def with_dimension(self, axis, member=None):
+        """
+        Return the contexts which have the given axis, only those with the given member on it if member is given
+        """
+        if member is not None:
+            return tuple(self._by_member.get((axis, member), ()))
+        return tuple(self._by_axis.get(axis, ()))
+
+    def dimensional(self, axis=None, member=None, period_of=None):
+        """
+        Return the contexts with dimensions, only those with the given axis and member if given, see with_dimension, and only those about the same period as the ContextRecord period_of if given
+        """
+        if axis is not None:
+            records = self.with_dimension(axis, member)
+        elif period_of is not None:
+            if period_of.is_instant:
+                records = self._instants.get(period_of.instant, ())
+            else:
+                records = self._durations.get(period_of.end_date, ())
+        else:
+            records = self._records
+        return tuple(x for x in records if x.is_dimensional and (period_of is None or x.same_period(period_of)))
+
+    def to_tuples(self):
+        """
+        Return all records as builtin types, see ContextRecord.to_tuple
+        """
+        return [x.to_tuple() for x in self._records]
+
+    @classmethod
+    def from_tuples(cls, values):
+        return cls(ContextRecord.from_tuple(x) for x in values)
@@ -0,0 +1,146 @@
+"""
+Data quality diagnostics of XBRL objects: which CommonFact failed to impute, which were not found in the document and which ended up 0. See XBRL.diagnostics.
+
+Nothing is printed by default. Failures are kept on each XBRL object and can be summed up across a batch with DiagnosticsSummary. To see failures as they happen, install a DiagnosticsReporter with set_reporter, which logs through the logging module and can sample and rate-limit its output.
+"""
+import logging
+import random
+import time
+
+class FilingDiagnostics(object):
+    """
+    The diagnostics of a single filing
+
+        url                     The url of the filing
+        imputation_failures     A tuple of (CommonFact name, error message) for each CommonFact whose impute equations raised an error
+        missing                 A tuple of names of CommonFact which were looked up but not found in the document
+        zero_values             A tuple of names of CommonFact which are 0 after imputation
+    """
+    __slots__ = ('url', 'imputation_failures', 'missing', 'zero_values')
+
+    def __init__(self, url, imputation_failures=(), missing=(), zero_values=()):
+        self.url = url
+        self.imputation_failures = tuple(imputation_failures)
+        self.missing = tuple(missing)
+        self.zero_values = tuple(zero_values)
+
+    def __repr__(self):
+        return '<{0}: {1} {2} failures, {3} missing, {4} zero>'.format(self.__class__.__name__, self.url, len(self.imputation_failures), len(self.missing), len(self.zero_values))
+
+    def as_dict(self):
+        """
+        Return the diagnostics as builtin types, so they can be sent across processes or written as json
+        """
+        return {
+            'url': self.url,
+            'imputation_failures': [list(x) for x in self.imputation_failures],
+            'missing': list(self.missing),
+            'zero_values': list(self.zero_values),
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(values.get('url'), [tuple(x) for x in values.get('imputation_failures', ())], values.get('missing', ()), values.get('zero_values', ()))
+
+class DiagnosticsSummary(object):
+    """
+    Counts of FilingDiagnostics across many filings, for each kind of diagnostic a map that maps from CommonFact name to the number of filings it happened in
+    """
+    KINDS = ('imputation_failures', 'missing', 'zero_values')
+
+    def __init__(self):
+        self.filings = 0
+        self.imputation_failures = {}
+        self.missing = {}
+        self.zero_values = {}
+
+    def __repr__(self):
+        return '<{0}: {1} filings>'.format(self.__class__.__name__, self.filings)
+
+    def add(self, diagnostics):
+        """
+        Count a FilingDiagnostics, or a map returned by FilingDiagnostics.as_dict. Returns self
+        """
+        if isinstance(diagnostics, dict):
+            diagnostics = FilingDiagnostics.from_dict(diagnostics)
+        self.filings += 1
+        for name in set(x[0] for x in diagnostics.imputation_failures):
+            self.imputation_failures[name] = self.imputation_failures.get(name, 0) + 1
+        for name in diagnostics.missing:
+            self.missing[name] = self.missing.get(name, 0) + 1
+        for name in diagnostics.zero_values:
+            self.zero_values[name] = self.zero_values.get(name, 0) + 1
+        return self
+
+    def merge(self, other):
+        """
+        Add the counts of another DiagnosticsSummary to this one. Returns self
+        """
+        self.filings += other.filings
+        for kind in self.KINDS:
+            counts = getattr(self, kind)
+            for name, count in getattr(other, kind).iteritems():
+                counts[name] = counts.get(name, 0) + count
+        return self
+
+    def most_common(self, kind, n=10):
+        """
+        Return a list of (CommonFact name, number of filings) of the given kind, see KINDS, the most frequent first
+        """
+        return sorted(getattr(self, kind).items(), key=lambda x: (-x[1], x[0]))[:n]
+
+    def as_dict(self):
+        ret = dict((kind, dict(getattr(self, kind))) for kind in self.KINDS)
+        ret['filings'] = self.filings
+        return ret
+
+class DiagnosticsReporter(object):
+    """
+    Log imputation failures as they happen, through logger, which is the logger named 'pyxbrl.diagnostics' by default.
+    Only sample_rate of the failures are considered, and at most max_per_second of those are logged, the rest are counted in dropped.
+    """
+    def __init__(self, logger=None, sample_rate=1.0, max_per_second=None, seed=None):
+        self.logger = logger if logger else logging.getLogger('pyxbrl.diagnostics')
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self.reported = 0
+        self.dropped = 0
+        self._random = random.Random(seed)
+        # a token bucket which refills at max_per_second
+        self._tokens = max_per_second
+        self._last = time.time()
+
+    def _allow(self):
+        if self.sample_rate < 1 and self._random.random() >= self.sample_rate:
+            return False
+        if self.max_per_second is None:
+            return True
+        now = time.time()
+        self._tokens = min(self.max_per_second, self._tokens + (now - self._last) * self.max_per_second)
+        self._last = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def imputation_failed(self, url, fact, message):
+        """
+        Called by XBRL when the impute equations of fact raised an error
+        """
+        if not self._allow():
+            self.dropped += 1
+            return
+        self.reported += 1
+        self.logger.warning('Imputation failed: %s, equation: %s on xbrl %s because %s', fact, fact.impute_equations, url, message)
+
+_reporter = None
+
+def set_reporter(reporter):
+    """
+    Make every XBRL object report imputation failures to the given DiagnosticsReporter, or to nothing if reporter is None
+    """
+    global _reporter
+    _reporter = reporter
+
+def get_reporter():
+    return _reporter
@@ -0,0 +1,120 @@
+"""
+Download XBRL xml documents over http with timeouts, retries and connection reuse, and many of them concurrently.
+
+XBRL uses the default Downloader for http urls, see get_downloader. batch.extract uses a Downloader to download a whole batch with bounded parallelism and hands each document to the worker processes as soon as it arrives, see Downloader.fetch_all.
+"""
+import Queue
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+# EDGAR rejects requests without a User-Agent
+DEFAULT_HEADERS = {'User-Agent': 'pyXBRL', 'Accept-Encoding': 'gzip, deflate'}
+
+def is_url(path):
+    return path.startswith('http://') or path.startswith('https://')
+
+class Downloader(object):
+    """
+    Download documents through a pooled requests.Session.
+
+    Args:
+        concurrency The number of documents downloaded at once by fetch_all, which is also the size of the connection pool
+        timeout Seconds to wait for the server to connect or send data
+        retries How many times a request is retried on connection errors and on 429 and 5xx responses, with exponential backoff
+        backoff The backoff factor in seconds, the n-th retry waits backoff * 2 ** (n - 1)
+        headers Headers sent with every request, DEFAULT_HEADERS by default
+    """
+    def __init__(self, concurrency=8, timeout=30, retries=3, backoff=0.5, headers=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers if headers is not None else DEFAULT_HEADERS)
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url):
+        """
+        Return the content of the given http url, or of the given local file path. Raises IOError if it can not be downloaded
+        """
+        if not is_url(url):
+            with open(url, 'rb') as f:
+                return f.read()
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as err:
+            raise IOError('Failed to download {0}: {1}'.format(url, err))
+        return response.content
+
+    def fetch_all(self, urls, ordered=False):
+        """
+        Download the given urls with at most self.concurrency at once, and return a generator of (url, content, error) as each download finishes.
+        content is None and error is a string if a download failed. If ordered is True, the results are generated in the order of urls.
+        Unless ordered is True, at most 2 * self.concurrency downloaded documents wait to be taken from the generator, downloading pauses until they are.
+        """
+        urls = list(urls)
+        pending = Queue.Queue()
+        for item in enumerate(urls):
+            pending.put(item)
+        done = Queue.Queue(2 * self.concurrency)
+        stop = threading.Event()
+
+        def work():
+            while not stop.is_set():
+                try:
+                    i, url = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    result = (i, url, self.fetch(url), None)
+                except Exception as err:
+                    result = (i, url, None, '{0}: {1}'.format(err.__class__.__name__, err))
+                # wait for room, but give up once the generator is closed
+                while not stop.is_set():
+                    try:
+                        done.put(result, timeout=0.5)
+                        break
+                    except Queue.Full:
+                        pass
+
+        threads = [threading.Thread(target=work) for i in range(min(self.concurrency, len(urls)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            waiting = {}
+            next_index = 0
+            for count in range(len(urls)):
+                i, url, content, error = done.get()
+                if not ordered:
+                    yield (url, content, error)
+                    continue
+                waiting[i] = (url, content, error)
+                while next_index in waiting:
+                    yield waiting.pop(next_index)
+                    next_index += 1
+        finally:
+            stop.set()
+
+_downloader = None
+
+def get_downloader():
+    """
+    Return the Downloader shared by XBRL objects
+    """
+    global _downloader
+    if _downloader is None:
+        _downloader = Downloader()
+    return _downloader
+
+def set_downloader(downloader):
+    """
+    Make XBRL objects download through the given Downloader, eg. one with a different timeout
+    """
+    global _downloader
+    _downloader = downloader
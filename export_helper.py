@@ -0,0 +1,255 @@
+"""
+Export the values of many filings as a table with one row per filing, to CSV, or to Arrow and Parquet files when pyarrow is installed.
+
+Every table has the same columns, see columns: url and error, then every DEI by name, then every CommonFact in the order of CommonFact.all(), then every CommonMeasurement in the order of CommonMeasurement.all().
+DEI columns are strings and the others are float64. The values of a filing which failed are empty in CSV and null in Arrow and Parquet.
+Rows are collected into column arrays of chunk_size rows and written a chunk at a time, so memory stays bounded however many filings are exported:
+
+    with export_helper.open_writer('/data/2014q3.parquet') as writer:
+        for result in batch.extract(inputs):
+            writer.write(result)
+"""
+import csv
+import os
+
+import numpy
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+from xbrl import DEI
+
+# a map that maps from file extension to format
+EXTENSIONS = {'.csv': 'csv', '.arrow': 'arrow', '.feather': 'arrow', '.parquet': 'parquet'}
+DEFAULT_CHUNK_SIZE = 1024
+
+def dei_columns():
+    """
+    Return a tuple of DEI in the order of their columns, which is by name
+    """
+    return tuple(sorted(DEI.all(), key=lambda x: x.name))
+
+def columns():
+    """
+    Return a list of column names of the exported table
+    """
+    return (['url', 'error'] + [x.name for x in dei_columns()] +
+            [x.name for x in CommonFact.all()] + [x.name for x in CommonMeasurement.all()])
+
+def _text(value):
+    if value is None or isinstance(value, unicode):
+        return value
+    return str(value).decode('utf-8')
+
+class _Chunk(object):
+    """
+    Up to size rows kept as columns. CommonFact and CommonMeasurement values are kept in column major matrices, so each column is a contiguous array
+    """
+    def __init__(self, size, deis):
+        self.deis = deis
+        self.rows = 0
+        self.urls = []
+        self.errors = []
+        self.dei_values = [[] for x in deis]
+        self.failed = numpy.zeros(size, dtype=bool)
+        self.facts = numpy.zeros((size, len(CommonFact.all())), dtype=numpy.float64, order='F')
+        self.measurements = numpy.zeros((size, len(CommonMeasurement.all())), dtype=numpy.float64, order='F')
+
+    def __len__(self):
+        return self.rows
+
+    def full(self):
+        return self.rows == len(self.failed)
+
+    def add(self, result):
+        """
+        Add a row for result, an xbrl.XBRL object or a batch.BatchResult
+        """
+        i = self.rows
+        error = getattr(result, 'error', None)
+        self.urls.append(_text(result.url))
+        self.errors.append(_text(error))
+        for values, dei in zip(self.dei_values, self.deis):
+            values.append(None if error else _text(result.dei.get(dei)))
+        if error:
+            self.failed[i] = True
+            self.facts[i] = numpy.nan
+            self.measurements[i] = numpy.nan
+        else:
+            self.facts[i] = CommonFact.values_of(result.common_facts)
+            self.measurements[i] = CommonMeasurement.values_of(result.common_measurements)
+        self.rows += 1
+
+    def value_columns(self):
+        """
+        Return a list of 1-D arrays of the CommonFact and CommonMeasurement columns, views of the matrices
+        """
+        n = self.rows
+        return [self.facts[:n, j] for j in range(self.facts.shape[1])] + [self.measurements[:n, j] for j in range(self.measurements.shape[1])]
+
+class TableWriter(object):
+    """
+    The base of the writers of each format, which implement _write_chunk and _close. Use it as a context manager, or call close when done.
+    """
+    format = None
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        # the number of rows written so far
+        self.rows = 0
+        self.deis = dei_columns()
+        self._chunk = _Chunk(chunk_size, self.deis)
+
+    def __repr__(self):
+        return '<{0}: {1} {2} rows>'.format(self.__class__.__name__, self.path, self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def write(self, result):
+        """
+        Add a row for result, an xbrl.XBRL object or a batch.BatchResult. It is written once chunk_size rows are collected
+        """
+        self._chunk.add(result)
+        if self._chunk.full():
+            self.flush()
+
+    def write_all(self, results):
+        """
+        Add a row for each of the given results. Returns self
+        """
+        for result in results:
+            self.write(result)
+        return self
+
+    def flush(self):
+        """
+        Write the rows collected so far
+        """
+        if len(self._chunk):
+            self._write_chunk(self._chunk)
+            self.rows += len(self._chunk)
+            self._chunk = _Chunk(self.chunk_size, self.deis)
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def _write_chunk(self, chunk):
+        raise NotImplementedError()
+
+    def _close(self):
+        raise NotImplementedError()
+
+class CSVWriter(TableWriter):
+    """
+    Write a CSV file with a header row. Floats are written with repr, so they read back exactly
+    """
+    format = 'csv'
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        super(CSVWriter, self).__init__(path, chunk_size)
+        self._file = open(path, 'wb')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns())
+
+    def _write_chunk(self, chunk):
+        text_columns = [chunk.urls, chunk.errors] + chunk.dei_values
+        text_columns = [['' if x is None else x.encode('utf-8') for x in column] for column in text_columns]
+        value_columns = [['' if failed else repr(x) for x, failed in zip(column.tolist(), chunk.failed)] for column in chunk.value_columns()]
+        self._writer.writerows(zip(*(text_columns + value_columns)))
+
+    def _close(self):
+        self._file.close()
+
+def arrow_schema():
+    """
+    Return the pyarrow.Schema of the exported table
+    """
+    text = [pyarrow.field(name, pyarrow.string()) for name in columns()[:2 + len(dei_columns())]]
+    values = [pyarrow.field(x.name, pyarrow.float64()) for x in CommonFact.all() + CommonMeasurement.all()]
+    return pyarrow.schema(text + values)
+
+class _ArrowWriterBase(TableWriter):
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        if pyarrow is None:
+            raise ImportError('pyarrow is required to write {0} files'.format(self.format))
+        super(_ArrowWriterBase, self).__init__(path, chunk_size)
+        self.schema = arrow_schema()
+
+    def _record_batch(self, chunk):
+        mask = chunk.failed[:len(chunk)]
+        arrays = [pyarrow.array(x, type=pyarrow.string()) for x in [chunk.urls, chunk.errors] + chunk.dei_values]
+        # the float columns are contiguous, so pyarrow takes them without copying
+        arrays.extend(pyarrow.array(x, type=pyarrow.float64(), mask=mask) for x in chunk.value_columns())
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+class ArrowWriter(_ArrowWriterBase):
+    """
+    Write an Arrow IPC file, also known as Feather version 2, with a record batch per chunk
+    """
+    format = 'arrow'
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        super(ArrowWriter, self).__init__(path, chunk_size)
+        self._writer = pyarrow.ipc.new_file(path, self.schema)
+
+    def _write_chunk(self, chunk):
+        self._writer.write_batch(self._record_batch(chunk))
+
+    def _close(self):
+        self._writer.close()
+
+class ParquetWriter(_ArrowWriterBase):
+    """
+    Write a Parquet file with a row group per chunk
+    """
+    format = 'parquet'
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        super(ParquetWriter, self).__init__(path, chunk_size)
+        self._writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def _write_chunk(self, chunk):
+        self._writer.write_table(pyarrow.Table.from_batches([self._record_batch(chunk)]))
+
+    def _close(self):
+        self._writer.close()
+
+WRITERS = {'csv': CSVWriter, 'arrow': ArrowWriter, 'parquet': ParquetWriter}
+
+def get_format(path):
+    """
+    Return the format of the given path by its extension, see EXTENSIONS
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXTENSIONS:
+        raise ValueError('Unknown table format of {0}, expected one of {1}'.format(path, ', '.join(sorted(EXTENSIONS))))
+    return EXTENSIONS[ext]
+
+def open_writer(path, format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Return a TableWriter of the given format, one of WRITERS, which is determined by the extension of path if not given
+    """
+    if format is None:
+        format = get_format(path)
+    if format not in WRITERS:
+        raise ValueError('Unknown table format {0}, expected one of {1}'.format(format, ', '.join(sorted(WRITERS))))
+    return WRITERS[format](path, chunk_size)
+
+def export(results, path, format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write a row for each of the given results, xbrl.XBRL objects or batch.BatchResult, to a table at path. Returns the number of rows written
+    """
+    with open_writer(path, format, chunk_size) as writer:
+        writer.write_all(results)
+    return writer.rows
@@ -0,0 +1,89 @@
+"""
+Helpers to order CommonFact and CommonMeasurement by their dependencies, so that everything a value is calculated from is determined before that value.
+"""
+
+def sort_topologically(nodes, dependencies):
+    """ Group nodes into strongly connected components with Tarjan's algorithm, and return the groups so that the dependencies of a group always come before the group itself.
+        A group with more than 1 node, or a node depending on itself, is a cycle, see find_cycles.
+
+        Args:
+            nodes A sequence of nodes. The order of nodes is kept inside each group and between groups which do not depend on each other, so the result is deterministic
+            dependencies A callable which is given a node and returns an iterable of nodes it depends on. Nodes not in nodes are ignored
+
+        Returns a list of tuples of nodes
+    """
+    position = dict((node, i) for i, node in enumerate(nodes))
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    groups = []
+
+    def visit(node):
+        index[node] = lowlink[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        for dependency in dependencies(node):
+            if dependency not in position:
+                continue
+            if dependency not in index:
+                visit(dependency)
+                lowlink[node] = min(lowlink[node], lowlink[dependency])
+            elif dependency in on_stack:
+                lowlink[node] = min(lowlink[node], index[dependency])
+        if lowlink[node] == index[node]:
+            group = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                group.append(member)
+                if member == node:
+                    break
+            groups.append(tuple(sorted(group, key=position.get)))
+
+    for node in nodes:
+        if node not in index:
+            visit(node)
+    return groups
+
+def find_cycles(groups, dependencies):
+    """
+    Given groups returned by sort_topologically, return the groups which are cycles
+    """
+    return [group for group in groups if len(group) > 1 or group[0] in dependencies(group[0])]
+
+def find_dependents(nodes, dependencies):
+    """
+    Reverse dependencies, return a map that maps from each node or dependency to a list of nodes which depend on it directly
+    """
+    ret = {}
+    for node in nodes:
+        for dependency in dependencies(node):
+            ret.setdefault(dependency, []).append(node)
+    return ret
+
+def find_downstream(starts, dependents):
+    """
+    Given starting nodes and a map returned by find_dependents, return a set of all nodes which depend on any of starts, directly or indirectly. starts themselves are not included unless they depend on each other
+    """
+    ret = set()
+    pending = list(starts)
+    while pending:
+        for node in dependents.get(pending.pop(), ()):
+            if node not in ret:
+                ret.add(node)
+                pending.append(node)
+    return ret
+
+def find_upstream(starts, dependencies):
+    """
+    Given starting nodes, return a set of starts and all nodes they depend on, directly or indirectly
+    """
+    ret = set(starts)
+    pending = list(starts)
+    while pending:
+        for node in dependencies(pending.pop()):
+            if node not in ret:
+                ret.add(node)
+                pending.append(node)
+    return ret
@@ -0,0 +1,154 @@
+"""
+This module is to calculate CommonMeasurement for a large number of filings at once with NumPy.
+Instead of calling CommonMeasurement.calculate once per filing, every equation is evaluated as array operations over a matrix of CommonFact values, one row per filing.
+CommonFact impute_equations can be evaluated the same way, see impute_facts, which makes what-if analysis across many filings a few array operations per affected column, see override_facts.
+
+The column order of the matrices follows CommonFact.index and CommonMeasurement.index, which is the order of CommonFact.all() and CommonMeasurement.all().
+"""
+import numpy
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import rpn_helper
+
+def _div_or_zero(first_operand, second_operand):
+    # same as rpn_helper, dividing by 0 gives 0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        ret = numpy.true_divide(first_operand, second_operand)
+    return numpy.where(second_operand == 0, 0, ret)
+
+OPERATORS = {
+    '+': numpy.add,
+    '-': numpy.subtract,
+    '*': numpy.multiply,
+    '/': _div_or_zero,
+}
+
+# a map that maps from CommonMeasurement to its equation compiled for arrays
+_compiled = {}
+
+def _get_evaluator(m):
+    if m not in _compiled:
+        # CommonMeasurement._load reads env[0][CommonFact.index], which is a whole column when env[0] is the transposed fact matrix
+        _compiled[m] = rpn_helper.compile_expression(m.equation, CommonMeasurement._load, OPERATORS)
+    return _compiled[m]
+
+# a map that maps from CommonFact to its impute_equations compiled for arrays
+_compiled_facts = {}
+
+def _get_fact_evaluators(fact):
+    if fact not in _compiled_facts:
+        _compiled_facts[fact] = tuple(rpn_helper.compile_expression(equation, CommonFact._load, OPERATORS) for equation in fact.impute_equations or ())
+    return _compiled_facts[fact]
+
+def build_fact_matrix(xbrls):
+    """
+    Given an iterable of xbrl.XBRL objects (or anything having common_facts), return a 2-D float64 array of filings x CommonFact
+    """
+    return numpy.array([CommonFact.values_of(x.common_facts) for x in xbrls], dtype=numpy.float64).reshape(-1, len(CommonFact.all()))
+
+def build_fetched_matrix(xbrls):
+    """
+    Given an iterable of xbrl.XBRL objects, return a 2-D float64 array of filings x CommonFact of the values found in the documents, 0 where a CommonFact is imputed, see XBRL.fetched_common_facts
+    """
+    return numpy.array([CommonFact.values_of(x.fetched_common_facts) for x in xbrls], dtype=numpy.float64).reshape(-1, len(CommonFact.all()))
+
+def _check_matrix(matrix, members, name):
+    matrix = numpy.array(matrix, dtype=numpy.float64)
+    if matrix.ndim != 2 or matrix.shape[1] != len(members):
+        raise ValueError('Given {0} must be of shape (filings, {1})'.format(name, len(members)))
+    return matrix
+
+def impute_facts(fetched_matrix, facts=None, fact_matrix=None):
+    """
+    Impute CommonFact for every filing at once.
+
+    Args:
+        fetched_matrix A 2-D array of filings x CommonFact of the values found in the documents, see build_fetched_matrix
+        facts The CommonFact to impute, in evaluation_order and including everything they are imputed from which is not in fact_matrix yet. Every CommonFact by default
+        fact_matrix A 2-D array of filings x CommonFact, where the values of the CommonFact not in facts are taken from. fetched_matrix by default
+
+    Returns a new 2-D float64 array of filings x CommonFact. The values are the same as XBRL gives for each filing.
+    """
+    fetched_matrix = _check_matrix(fetched_matrix, CommonFact.all(), 'fetched_matrix')
+    ret = _check_matrix(fact_matrix, CommonFact.all(), 'fact_matrix') if fact_matrix is not None else fetched_matrix.copy()
+    _impute_into(ret, fetched_matrix, CommonFact.evaluation_order() if facts is None else facts)
+    return ret
+
+def _impute_into(fact_matrix, fetched_matrix, facts):
+    env = fact_matrix.T
+    for fact in facts:
+        # same as CommonFact.impute_values, the first equation giving a value which is not 0 wins
+        column = fetched_matrix[:, fact.index].copy()
+        pending = column == 0
+        for evaluate in _get_fact_evaluators(fact):
+            if not pending.any():
+                break
+            value = evaluate(env) + numpy.zeros_like(column)
+            column[pending] = value[pending]
+            pending &= value == 0
+        fact_matrix[:, fact.index] = column
+
+def calculate_measurements(fact_matrix, quotes=1):
+    """
+    Calculate every CommonMeasurement for every filing at once.
+
+    Args:
+        fact_matrix A 2-D array of filings x CommonFact, column j holds the values of the CommonFact whose index is j, see build_fact_matrix
+        quotes Either a single quote for all filings or a 1-D array with a quote for each filing, see quote_helper.get_quote
+
+    Returns a 2-D float64 array of filings x CommonMeasurement, column j holds the values of the CommonMeasurement whose index is j.
+    The values are the same as CommonMeasurement.calculate gives for each filing.
+    """
+    fact_matrix = numpy.asarray(fact_matrix, dtype=numpy.float64)
+    if fact_matrix.ndim != 2 or fact_matrix.shape[1] != len(CommonFact.all()):
+        raise ValueError('Given fact_matrix must be of shape (filings, {0})'.format(len(CommonFact.all())))
+    quotes = numpy.asarray(quotes, dtype=numpy.float64)
+    ret = numpy.zeros((fact_matrix.shape[0], len(CommonMeasurement.all())), dtype=numpy.float64)
+    env = (fact_matrix.T, ret.T, quotes)
+    for m in CommonMeasurement.evaluation_order():
+        ret[:, m.index] = _get_evaluator(m)(env)
+    return ret
+
+def to_structured(measurement_matrix):
+    """
+    Given a matrix returned by calculate_measurements, return a NumPy structured array with a float64 field named after each CommonMeasurement
+    """
+    measurement_matrix = numpy.ascontiguousarray(measurement_matrix, dtype=numpy.float64)
+    dtype = numpy.dtype([(m.name, numpy.float64) for m in CommonMeasurement.all()])
+    return measurement_matrix.view(dtype).reshape(-1)
+
+def override_facts(fact_matrix, fetched_matrix, overrides, measurement_matrix=None, quotes=1):
+    """
+    What-if analysis for every filing at once, same as XBRL.override_common_facts for each filing: set the given CommonFact as if they were found in the documents, impute again only the CommonFact imputed from them and calculate again only the CommonMeasurement which depend on any of those.
+
+    Args:
+        fact_matrix A 2-D array of filings x CommonFact of the current values, see build_fact_matrix
+        fetched_matrix A 2-D array of filings x CommonFact of the values found in the documents, see build_fetched_matrix
+        overrides A map that maps from CommonFact, or its name, to either a single value for all filings or a 1-D array with a value for each filing
+        measurement_matrix A 2-D array of filings x CommonMeasurement of the current values, calculated from fact_matrix if not given
+        quotes Either a single quote for all filings or a 1-D array with a quote for each filing, see calculate_measurements
+
+    Returns a tuple of new (fact_matrix, fetched_matrix, measurement_matrix), the given ones are left alone. The changes are where the old and new matrices differ, eg. numpy.nonzero(new != old)
+    """
+    facts = CommonFact.all()
+    fact_matrix = _check_matrix(fact_matrix, facts, 'fact_matrix')
+    fetched_matrix = _check_matrix(fetched_matrix, facts, 'fetched_matrix')
+    changed = {}
+    for fact, value in overrides.items():
+        if isinstance(fact, basestring):
+            if fact not in CommonFact.pool:
+                raise ValueError('{0} is not a CommonFact'.format(fact))
+            fact = CommonFact.pool[fact]
+        changed[fact] = value
+        fetched_matrix[:, fact.index] = value
+        fact_matrix[:, fact.index] = value
+    downstream = tuple(fact for fact in CommonFact.downstream(changed) if fact not in changed)
+    _impute_into(fact_matrix, fetched_matrix, downstream)
+    if measurement_matrix is None:
+        return (fact_matrix, fetched_matrix, calculate_measurements(fact_matrix, quotes))
+    measurement_matrix = _check_matrix(measurement_matrix, CommonMeasurement.all(), 'measurement_matrix')
+    env = (fact_matrix.T, measurement_matrix.T, numpy.asarray(quotes, dtype=numpy.float64))
+    for m in CommonMeasurement.downstream(tuple(changed) + downstream):
+        measurement_matrix[:, m.index] = _get_evaluator(m)(env)
+    return (fact_matrix, fetched_matrix, measurement_matrix)
@@ -0,0 +1,169 @@
+"""
+Derive the fourth quarter of each fiscal year from a company's filings. A 10-K only reports the full year, so the fourth quarter of a flow such as Revenues or NetIncomeLoss is the full year less the first three quarters:
+
+    Q4 = FY - 9 months year to date of the Q3 10-Q, or FY - Q1 - Q2 - Q3 when the year to date is not known
+
+The filings of every company are aligned at once with array operations: each 10-K is matched to the 10-Q of the same company with DocumentFiscalPeriodFocus Q1, Q2 and Q3 ending in the year before its DocumentPeriodEndDate.
+Nothing is parsed again, the values come from XBRL objects or batch.BatchResult already extracted, see derive, or from a timeseries_store.TimeSeriesStore, see derive_from_store.
+
+Only CommonFact which add up over time are derived, see FactKind. Balance sheet CommonFact are taken from the 10-K as they are, and per-share and share count CommonFact are 0 in the fourth quarter, as they can not be derived.
+"""
+import numpy
+
+from common_fact import CommonFact
+import measurement_matrix
+import timeseries_store
+from usgaap_concept import UsGaapConceptPool
+from xbrl import Period
+
+FISCAL_YEAR = timeseries_store.FISCAL_PERIODS.index('FY')
+FOURTH_QUARTER = timeseries_store.FISCAL_PERIODS.index('Q4')
+# a quarter ends at most this many days before the fiscal year it belongs to ends, a year plus a week for 52/53-week fiscal years
+MAX_DAYS_BEFORE_YEAR_END = 371
+
+class FactKind(object):
+    """ A simulated Enum class to represent how a CommonFact behaves over time
+        Stock is a balance at an instant, Flow is an amount over a duration which adds up, Other is a duration which does not add up, eg. EarningsPerShareBasic
+    """
+    Stock, Flow, Other = range(3)
+
+    @classmethod
+    def all(cls):
+        """
+        Returns a tuple which contains all members
+        """
+        return tuple(range(3))
+
+# a map that maps from CommonFact to its FactKind
+_kinds = {}
+
+def get_fact_kind(fact):
+    """
+    Return the FactKind of the given CommonFact, by the periodType and type of its possible_fact_names in the us-gaap taxonomy, or by the CommonFact it is imputed from if it has none
+    """
+    if fact not in _kinds:
+        kinds = set()
+        for name in fact.possible_fact_names or ():
+            concept = UsGaapConceptPool.get(name)
+            if concept is None:
+                continue
+            if concept.periodType == 'instant':
+                kinds.add(FactKind.Stock)
+            elif concept.type == 'xbrli:monetaryItemType':
+                kinds.add(FactKind.Flow)
+            else:
+                kinds.add(FactKind.Other)
+        if not fact.possible_fact_names:
+            kinds.update(get_fact_kind(x) for x in fact.get_dependencies() if x is not fact)
+        _kinds[fact] = kinds.pop() if len(kinds) == 1 else FactKind.Other
+    return _kinds[fact]
+
+def build_inputs(results):
+    """
+    Given an iterable of xbrl.XBRL objects or batch.BatchResult, return a tuple of (keys, fact_matrix, ytd_matrix) for derive_fourth_quarters. Failed results and those without a valid key are left out, see timeseries_store.filing_key.
+    ytd_matrix has the Period.YearToDate values of XBRL objects, and NaN for batch.BatchResult which do not have them
+    """
+    keys = []
+    facts = []
+    ytd = []
+    nan_row = [numpy.nan] * len(CommonFact.all())
+    for result in results:
+        if getattr(result, 'error', None):
+            continue
+        try:
+            key = timeseries_store.filing_key(result)
+        except ValueError:
+            continue
+        keys.append(key + (len(keys),))
+        facts.append(CommonFact.values_of(result.common_facts))
+        period_facts = getattr(result, 'period_facts', None)
+        ytd.append(CommonFact.values_of(period_facts[Period.YearToDate]) if period_facts is not None and key[2] != FISCAL_YEAR else nan_row)
+    shape = (-1, len(CommonFact.all()))
+    return (numpy.array(keys, dtype=timeseries_store.KEY_DTYPE),
+            numpy.array(facts, dtype=numpy.float64).reshape(shape),
+            numpy.array(ytd, dtype=numpy.float64).reshape(shape))
+
+def _find_quarters(keys, fiscal_years, quarter):
+    """
+    Return the positions in keys of the last quarter row of the same company ending before each of the given fiscal year rows, -1 where there is none
+    """
+    cik = keys['cik'].astype(numpy.int64)
+    end = keys['period_end'].astype('M8[D]').astype(numpy.int64)
+    # (cik, fiscal_period, period_end) packed into a single sortable integer
+    packed = (((cik << 3) | keys['fiscal_period'].astype(numpy.int64)) << 17) | numpy.clip(end, 0, (1 << 17) - 1)
+    order = numpy.argsort(packed, kind='mergesort')
+    packed = packed[order]
+    targets = (((cik[fiscal_years] << 3) | quarter) << 17) | numpy.clip(end[fiscal_years], 0, (1 << 17) - 1)
+    found = numpy.searchsorted(packed, targets, 'left') - 1
+    ret = numpy.where(found >= 0, order[numpy.maximum(found, 0)], -1)
+    days = end[fiscal_years] - end[ret]
+    ok = (found >= 0) & (cik[ret] == cik[fiscal_years]) & (keys['fiscal_period'][ret] == quarter) & (days > 0) & (days <= MAX_DAYS_BEFORE_YEAR_END)
+    return numpy.where(ok, ret, -1)
+
+def derive_fourth_quarters(keys, fact_matrix, ytd_matrix=None):
+    """
+    Derive the fourth quarter of every 10-K which has a Q3 10-Q of the same company before it.
+
+    Args:
+        keys A structured array of the key of each filing, see timeseries_store.KEY_DTYPE. Amendments should have been resolved already, see timeseries_store.TimeSeriesStore.select, otherwise the last one of each quarter is used
+        fact_matrix A 2-D array of filings x CommonFact, see measurement_matrix.build_fact_matrix
+        ytd_matrix A 2-D array of filings x CommonFact of the year to date values of the 10-Q, NaN where not known, see build_inputs
+
+    Returns a tuple of (keys, fact_matrix) of the fourth quarters, the keys are those of the 10-K with fiscal_period Q4, whose row refers to the 10-K.
+    A Flow value is 0 when it can not be derived because a quarter is missing or its value is 0.
+    """
+    fact_matrix = numpy.asarray(fact_matrix, dtype=numpy.float64)
+    fiscal_years = numpy.nonzero(keys['fiscal_period'] == FISCAL_YEAR)[0]
+    quarters = [_find_quarters(keys, fiscal_years, quarter) for quarter in (1, 2, 3)]
+    has_q3 = quarters[2] >= 0
+    fiscal_years = fiscal_years[has_q3]
+    quarters = [x[has_q3] for x in quarters]
+
+    year = fact_matrix[fiscal_years]
+    values = [numpy.where((rows >= 0)[:, None], fact_matrix[numpy.maximum(rows, 0)], 0) for rows in quarters]
+    nine_months = values[0] + values[1] + values[2]
+    known = (values[0] != 0) & (values[1] != 0) & (values[2] != 0)
+    if ytd_matrix is not None:
+        ytd = numpy.asarray(ytd_matrix, dtype=numpy.float64)[quarters[2]]
+        use_ytd = numpy.isfinite(ytd) & (ytd != 0)
+        nine_months = numpy.where(use_ytd, ytd, nine_months)
+        known |= use_ytd
+    fourth = numpy.where(known & (year != 0), year - nine_months, 0)
+
+    ret = numpy.zeros_like(year)
+    for fact in CommonFact.all():
+        kind = get_fact_kind(fact)
+        if kind == FactKind.Stock:
+            ret[:, fact.index] = year[:, fact.index]
+        elif kind == FactKind.Flow:
+            ret[:, fact.index] = fourth[:, fact.index]
+    ret_keys = numpy.array(keys[fiscal_years], dtype=keys.dtype)
+    ret_keys['fiscal_period'] = FOURTH_QUARTER
+    return (ret_keys, ret)
+
+def derive(results, quotes=1):
+    """
+    Given an iterable of xbrl.XBRL objects or batch.BatchResult of any number of companies, return a tuple of (keys, fact_matrix, measurement_matrix) of the fourth quarters, see derive_fourth_quarters.
+    CommonMeasurement are calculated from the fourth quarter CommonFact with quotes, see measurement_matrix.calculate_measurements
+    """
+    keys, facts, ytd = build_inputs(results)
+    keys, facts = derive_fourth_quarters(keys, facts, ytd)
+    return (keys, facts, measurement_matrix.calculate_measurements(facts, quotes))
+
+def derive_from_store(store, start=None, end=None, quotes=1):
+    """
+    Same as derive, but for every company in a timeseries_store.TimeSeriesStore, taking the latest amendment of each filing. Only 10-K whose period_end is between start and end are derived
+    """
+    rows = store.select(numpy.arange(len(store)))
+    keys = store.keys(rows)
+    facts = numpy.empty((len(rows), len(CommonFact.all())), dtype=numpy.float64)
+    for fact in CommonFact.all():
+        facts[:, fact.index] = store.values(fact.name)[rows] if fact.name in store.columns else 0
+    keys, facts = derive_fourth_quarters(keys, numpy.nan_to_num(facts))
+    mask = numpy.ones(len(keys), dtype=bool)
+    if start is not None:
+        mask &= keys['period_end'] >= numpy.datetime64(start, 'D')
+    if end is not None:
+        mask &= keys['period_end'] <= numpy.datetime64(end, 'D')
+    keys, facts = keys[mask], facts[mask]
+    return (keys, facts, measurement_matrix.calculate_measurements(facts, quotes))
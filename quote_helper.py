@@ -1,29 +1,216 @@
 """
 For some CommonMeasurement, quote data is needed to calculate the result. For example, P/E Ratio is price / entity where the stock price will not be there in any statement, we will need an external source to get the stock price on that date, or something like average of that month.
 If this method raises NotImplementedError, all CommonMeasurements which need price data will return 0
+
+get_quote delegates to a QuoteProvider, by default an HttpQuoteProvider talking to hostname. To get quotes from somewhere else, subclass QuoteProvider and pass an instance to set_quote_provider.
 """
+from collections import OrderedDict
 from datetime import date
-import requests
 import json
+import sqlite3
+import threading
+import time
+
+import requests
 
 hostname = "127.0.0.1:8000"
 
+class QuoteProvider(object):
+    """
+    The interface of a quote source. A quote is a float as a representative value of stock price for a symbol in the month of a date.
+    """
+    def get_quote(self, symbol, fiscal_period_end_date):
+        """
+        Given a symbol and a date, return a float as its stock price.
+        """
+        raise NotImplementedError
+
+    def prefetch(self, symbol_dates):
+        """
+        Given an iterable of (symbol, date), get ready to answer get_quote for all of them, ideally in a single round trip. Does nothing by default.
+        """
+        pass
+
+class LRUCache(object):
+    """
+    A thread-safe in-process cache which keeps at most size entries, evicting the least recently used one, and forgets entries older than ttl seconds
+    """
+    def __init__(self, size=4096, ttl=3600):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return a tuple (found, value)
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return (False, None)
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                return (False, None)
+            # re-insert to mark it as most recently used
+            self._entries[key] = entry
+            return (True, value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time())
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class PersistentQuoteCache(object):
+    """
+    A quote cache kept in a sqlite database file, so quotes survive across runs and can be shared by several processes.
+    Quotes for a past month do not change, so by default entries never expire, pass ttl in seconds otherwise.
+    """
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        connection = self._connect()
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS quotes (symbol TEXT, year INTEGER, month INTEGER, value REAL, stored_at REAL, PRIMARY KEY (symbol, year, month))')
+
+    def _connect(self):
+        # sqlite connections can not be shared across threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        """
+        Given key as (symbol, year, month), return a tuple (found, value)
+        """
+        row = self._connect().execute('SELECT value, stored_at FROM quotes WHERE symbol = ? AND year = ? AND month = ?', key).fetchone()
+        if row is None:
+            return (False, None)
+        if self.ttl is not None and time.time() - row[1] > self.ttl:
+            return (False, None)
+        return (True, row[0])
+
+    def put(self, key, value):
+        connection = self._connect()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO quotes VALUES (?, ?, ?, ?, ?)', tuple(key) + (value, time.time()))
+
+class HttpQuoteProvider(QuoteProvider):
+    """
+    Get quotes from a quote server over http, with
+        1. a pooled requests.Session, so connections are reused between requests
+        2. an in-process LRUCache keyed by (symbol, year, month)
+        3. optionally a PersistentQuoteCache, if persistent_path is given
+        4. optionally a bulk endpoint for prefetch, if bulk is True
+
+    The server is expected to answer
+        GET /get_quote?symbol=AAPL&year=2014&month=3 with a json list of {"close_price": float}, one for each trading day in that month
+        POST /get_quotes with a json list of {"symbol": str, "year": int, "month": int} with a json list of the same length, each item being what GET /get_quote would return
+    """
+    def __init__(self, host=None, bulk=False, cache_size=4096, ttl=3600, persistent_path=None, timeout=10):
+        self.host = host if host else hostname
+        self.bulk = bulk
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.cache = LRUCache(cache_size, ttl)
+        self.persistent_cache = PersistentQuoteCache(persistent_path) if persistent_path else None
+
+    @staticmethod
+    def _make_key(symbol, fiscal_period_end_date):
+        return (symbol, fiscal_period_end_date.year, fiscal_period_end_date.month)
+
+    @staticmethod
+    def _average(obj):
+        if not obj:
+            return 0
+        return round(sum([x['close_price'] for x in obj])/float(len(obj)), 2)
+
+    def _lookup(self, key):
+        found, value = self.cache.get(key)
+        if found:
+            return (True, value)
+        if self.persistent_cache:
+            found, value = self.persistent_cache.get(key)
+            if found:
+                self.cache.put(key, value)
+                return (True, value)
+        return (False, None)
+
+    def _store(self, key, value):
+        self.cache.put(key, value)
+        if self.persistent_cache:
+            self.persistent_cache.put(key, value)
+
+    def get_quote(self, symbol, fiscal_period_end_date):
+        key = self._make_key(symbol, fiscal_period_end_date)
+        found, value = self._lookup(key)
+        if found:
+            return value
+        api_url = 'http://{hostname}/get_quote'.format(hostname=self.host)
+        r = self.session.get(api_url, params={'symbol': key[0], 'year': key[1], 'month': key[2]}, timeout=self.timeout)
+        value = self._average(json.loads(r.text))
+        self._store(key, value)
+        return value
+
+    def prefetch(self, symbol_dates):
+        keys = []
+        for symbol, fiscal_period_end_date in symbol_dates:
+            key = self._make_key(symbol, fiscal_period_end_date)
+            if key not in keys and not self._lookup(key)[0]:
+                keys.append(key)
+        if not keys:
+            return
+        if not self.bulk:
+            for symbol, year, month in keys:
+                self.get_quote(symbol, date(year, month, 1))
+            return
+        api_url = 'http://{hostname}/get_quotes'.format(hostname=self.host)
+        body = [{'symbol': symbol, 'year': year, 'month': month} for symbol, year, month in keys]
+        r = self.session.post(api_url, data=json.dumps(body), headers={'Content-Type': 'application/json'}, timeout=self.timeout)
+        obj = json.loads(r.text)
+        if len(obj) != len(keys):
+            raise ValueError('Expect {0} quotes from {1}, got {2}'.format(len(keys), api_url, len(obj)))
+        for key, rows in zip(keys, obj):
+            self._store(key, self._average(rows))
+
+_provider = None
+
+def set_quote_provider(provider):
+    """
+    Make get_quote use the given QuoteProvider
+    """
+    global _provider
+    _provider = provider
+
+def get_quote_provider():
+    """
+    Return the QuoteProvider used by get_quote, an HttpQuoteProvider to hostname unless set_quote_provider was called
+    """
+    global _provider
+    if _provider is None:
+        _provider = HttpQuoteProvider()
+    return _provider
+
 def get_quote(symbol, fiscal_period_end_date):
     """
     Given a symbol and a date, return a float as its stock price.
     """
-    # raise NotImplementedError
-    api_url = 'http://{hostname}/get_quote?symbol={symbol}&year={year}&month={month}'.format(
-        hostname=hostname,
-        symbol=symbol,
-        year=fiscal_period_end_date.year,
-        month=fiscal_period_end_date.month
-    )
-    r = requests.get(api_url)
-    obj = json.loads(r.text)
-    if not obj:
-        return 0
-    return round(sum([x['close_price'] for x in obj])/float(len(obj)), 2)
+    return get_quote_provider().get_quote(symbol, fiscal_period_end_date)
+
+def prefetch_quotes(symbol_dates):
+    """
+    Given an iterable of (symbol, date), fetch the quotes ahead so that later get_quote calls are answered from cache
+    """
+    get_quote_provider().prefetch(symbol_dates)
 
 if __name__ == '__main__':
     print get_quote('AAPL', date(2014, 3, 3))
@@ -1,3 +1,5 @@
+import operator
+
 def calculate(tokens, decimal=-1):
     """ The idea is simple, just look through tokens, there are 2 different scenarios here
         1. if we see a number, just append it to stack
@@ -63,6 +65,63 @@ def calculate(tokens, decimal=-1):
     else:
         raise ValueError('Given tokens in not a valid RPN expression: {0}'.format(copy))
 
+def _div_or_zero(first_operand, second_operand):
+    # same as calculate, dividing by 0 gives 0
+    if not second_operand:
+        return 0
+    return float(first_operand) / second_operand
+
+OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': _div_or_zero,
+}
+
+def compile_expression(tokens, operand, operators=OPERATORS):
+    """ Compile an RPN expression once into a closure, so that evaluating it later involves no token validation, float parsing or stack handling.
+        The compiled closure follows the same rules as calculate: every operand is taken in absolute value and dividing by 0 gives 0.
+
+        Args:
+            tokens A tuple or list represents an RPN expression, same as calculate. A token can also be anything operand knows how to load, for example a CommonFact
+            operand A callable which is given a token that is neither an operator nor a number, and returns a callable which takes env and returns the value of that token. Return None if the token is invalid
+            operators A map that maps from operator to a function of 2 operands, default is OPERATORS
+
+        Returns a callable which takes a single argument env and returns the value of the expression
+
+        Raises:
+            ValueError if the RPN expression is invalid or the token in tokens is invalid
+    """
+    copy = tuple(tokens)
+    stack = []
+    for token in copy:
+        if isinstance(token, basestring) and token in operators:
+            if len(stack) < 2:
+                raise ValueError('Given tokens is not a valid RPN expression: {0}'.format(copy))
+            second_operand = stack.pop()
+            first_operand = stack.pop()
+            stack.append(_compile_operator(operators[token], first_operand, second_operand))
+            continue
+        try:
+            stack.append(_compile_constant(abs(float(token))))
+        except (ValueError, TypeError):
+            load = operand(token)
+            if load is None:
+                raise ValueError('{0} in tokens {1} invalid'.format(token, copy))
+            stack.append(_compile_operand(load))
+    if len(stack) != 1:
+        raise ValueError('Given tokens in not a valid RPN expression: {0}'.format(copy))
+    return stack.pop()
+
+def _compile_constant(value):
+    return lambda env: value
+
+def _compile_operand(load):
+    return lambda env: abs(load(env))
+
+def _compile_operator(function, first_operand, second_operand):
+    return lambda env: function(first_operand(env), second_operand(env))
+
 if __name__ == '__main__':
     cases = [
         # [["10","6","9","3","+","-11","*","/","*","17","+","5","+"], 22],
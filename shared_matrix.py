@@ -0,0 +1,179 @@
+"""
+This module shares the CommonFact and CommonMeasurement values of a batch of filings with any number of processes without copying them.
+The matrices are written once into a file which every process memory-maps, so they share the same pages, and each process reads them as NumPy arrays backed by the mapping, see SharedMatrices. Put the file under /dev/shm to keep it in memory only.
+
+A matrix file is laid out as
+    1. the header, see HEADER
+    2. the fact matrix, float64 of filings x CommonFact, one row per filing, columns in the order of CommonFact.all()
+    3. the measurement matrix, float64 of filings x CommonMeasurement, columns in the order of CommonMeasurement.all()
+    4. the url of each filing, joined by newlines
+The matrices start at multiples of ALIGNMENT bytes, all offsets are from the start of the file and all numbers are little-endian.
+The header keeps a fingerprint of the CommonFact and CommonMeasurement definitions, so a file is never read with columns in another order.
+
+    >>> shared_matrix.write('/dev/shm/2014.matrix', xbrls)
+    >>> results = shared_matrix.map_shared('/dev/shm/2014.matrix', analyse, range(8), processes=8)
+"""
+import mmap
+import multiprocessing
+import os
+import struct
+import tempfile
+
+import numpy
+
+from cache_helper import definitions_fingerprint
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import measurement_matrix
+
+MAGIC = 'PYXBRLMX'
+MATRIX_VERSION = 1
+# magic, version, number of filings, number of CommonFact, number of CommonMeasurement, definitions fingerprint, offset of the facts, offset of the measurements, offset of the urls, length of the urls
+HEADER = struct.Struct('<8sIQII16sQQQQ')
+ALIGNMENT = 64
+
+def _fingerprint():
+    return definitions_fingerprint()[:16]
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def write_matrices(path, facts, measurements, urls=None):
+    """
+    Write a matrix file. It is written to a temporary file first and then renamed, so processes attaching to path never see a partial file.
+
+    Args:
+        facts A 2-D array of filings x CommonFact, see measurement_matrix.build_fact_matrix
+        measurements A 2-D array of filings x CommonMeasurement, see measurement_matrix.calculate_measurements
+        urls A list of the url of each filing, '' for every filing if not given
+    """
+    facts = numpy.ascontiguousarray(facts, dtype='<f8')
+    measurements = numpy.ascontiguousarray(measurements, dtype='<f8')
+    rows = facts.shape[0]
+    if facts.ndim != 2 or facts.shape[1] != len(CommonFact.all()):
+        raise ValueError('Given facts must be of shape (filings, {0})'.format(len(CommonFact.all())))
+    if measurements.shape != (rows, len(CommonMeasurement.all())):
+        raise ValueError('Given measurements must be of shape ({0}, {1})'.format(rows, len(CommonMeasurement.all())))
+    urls = [url.encode('utf-8') if isinstance(url, unicode) else url for url in (urls if urls is not None else [''] * rows)]
+    if len(urls) != rows or any('\n' in url for url in urls):
+        raise ValueError('Given urls must be a url without newlines for each filing')
+    url_data = '\n'.join(urls)
+    facts_offset = _align(HEADER.size)
+    measurements_offset = _align(facts_offset + facts.nbytes)
+    urls_offset = measurements_offset + measurements.nbytes
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, MATRIX_VERSION, rows, facts.shape[1], measurements.shape[1], _fingerprint(),
+                                facts_offset, measurements_offset, urls_offset, len(url_data)))
+            f.write('\0' * (facts_offset - HEADER.size))
+            facts.tofile(f)
+            f.write('\0' * (measurements_offset - facts_offset - facts.nbytes))
+            measurements.tofile(f)
+            f.write(url_data)
+        os.rename(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+def write(path, results, quotes=None):
+    """
+    Write a matrix file of the given xbrl.XBRL objects or batch.BatchResult, failed results are left out. Returns the number of filings written
+    If quotes is given, the CommonMeasurement are calculated from the CommonFact with it, see measurement_matrix.calculate_measurements, otherwise the ones of each result are taken
+    """
+    results = [x for x in results if not getattr(x, 'error', None)]
+    facts = numpy.array([CommonFact.values_of(x.common_facts) for x in results], dtype=numpy.float64).reshape(-1, len(CommonFact.all()))
+    if quotes is not None:
+        measurements = measurement_matrix.calculate_measurements(facts, quotes)
+    else:
+        measurements = numpy.array([CommonMeasurement.values_of(x.common_measurements) for x in results], dtype=numpy.float64).reshape(-1, len(CommonMeasurement.all()))
+    write_matrices(path, facts, measurements, [x.url for x in results])
+    return len(results)
+
+class SharedMatrices(object):
+    """
+    A read-only view of a matrix file. facts and measurements are NumPy arrays backed by the memory mapping, nothing is copied or unpickled.
+    Raises ValueError if the file is not a matrix file, or was written with other CommonFact or CommonMeasurement definitions.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError('{0} is not a matrix file'.format(path))
+        (magic, version, self.rows, fact_count, measurement_count, fingerprint,
+         facts_offset, measurements_offset, self._urls_offset, self._urls_length) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a matrix file'.format(path))
+        if version != MATRIX_VERSION:
+            raise ValueError('{0} is of matrix version {1}, expect {2}'.format(path, version, MATRIX_VERSION))
+        if fingerprint != _fingerprint() or fact_count != len(CommonFact.all()) or measurement_count != len(CommonMeasurement.all()):
+            raise ValueError('{0} was written with other CommonFact or CommonMeasurement definitions'.format(path))
+        self.facts = numpy.frombuffer(self._map, dtype='<f8', count=self.rows * fact_count, offset=facts_offset).reshape(self.rows, fact_count)
+        self.measurements = numpy.frombuffer(self._map, dtype='<f8', count=self.rows * measurement_count, offset=measurements_offset).reshape(self.rows, measurement_count)
+        self._urls = None
+        self._rows_by_url = None
+
+    def __repr__(self):
+        return '<{0}: {1} {2} filings>'.format(self.__class__.__name__, self.path, self.rows)
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def urls(self):
+        """
+        A list of the url of each filing, read the first time it is asked for
+        """
+        if self._urls is None:
+            data = self._map[self._urls_offset:self._urls_offset + self._urls_length]
+            self._urls = data.split('\n') if self.rows else []
+        return self._urls
+
+    def row_of(self, url):
+        """
+        Return the row of the filing of the given url, or -1
+        """
+        if self._rows_by_url is None:
+            self._rows_by_url = dict((x, i) for i, x in enumerate(self.urls))
+        return self._rows_by_url.get(url, -1)
+
+    def get_fact(self, row, fact):
+        return self.facts[row, fact.index]
+
+    def get_measurement(self, row, measurement):
+        return self.measurements[row, measurement.index]
+
+    def close(self):
+        """
+        Unmap the file. The arrays must not be used after this
+        """
+        self.facts = None
+        self.measurements = None
+        self._map.close()
+
+# the SharedMatrices of a worker process of map_shared
+_attached = None
+
+def _attach(path):
+    global _attached
+    _attached = SharedMatrices(path)
+
+def _call(args):
+    function, item = args
+    return function(_attached, item)
+
+def map_shared(path, function, items, processes=None):
+    """
+    Call function(matrices, item) for each of the given items in a pool of worker processes, where matrices is the SharedMatrices of path attached once by each worker. Returns the list of results in the order of items.
+    function must be defined at the top level of a module, so it can be sent to the workers
+    """
+    pool = multiprocessing.Pool(processes, _attach, (path,))
+    try:
+        ret = pool.map(_call, [(function, item) for item in items])
+        pool.close()
+        return ret
+    finally:
+        pool.terminate()
@@ -0,0 +1,228 @@
+"""
+The places an XBRL instance document can be read from: a local file path, a http url, the document itself as a str, bytearray, memoryview or buffer, an open file object, or a member of a zip, tar or gzip archive. See XBRL.__init__ and resolve.
+
+Nothing is written to a temporary file. A document held in memory is handed to lxml as it is when lxml takes it, a str, or otherwise read through BufferReader, which gives lxml one small slice at a time instead of copying the whole buffer.
+Gzip compressed documents are decompressed on the fly, whether they are given as a path ending with .gz, as content or as an archive member. To go through every instance document inside an archive, use iter_archive.
+"""
+import gzip
+import os
+import tarfile
+import zipfile
+
+from lxml import etree
+
+import download_helper
+
+GZIP_MAGIC = '\x1f\x8b'
+UTF8_BOM = '\xef\xbb\xbf'
+LINKBASE_SUFFIXES = ('_cal.xml', '_def.xml', '_lab.xml', '_pre.xml', '_ref.xml')
+
+def is_instance_document(path):
+    """
+    Return True if the given file name looks like an XBRL instance document rather than a linkbase or a schema
+    """
+    name = os.path.basename(path).lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if not name.endswith('.xml'):
+        return False
+    return not name.endswith(LINKBASE_SUFFIXES) and name != 'filingsummary.xml'
+
+def is_document(text):
+    """
+    Return True if the given str is an xml document rather than a path or url
+    """
+    start = text[:256]
+    bom = u'\ufeff' if isinstance(start, unicode) else UTF8_BOM
+    if start.startswith(bom):
+        start = start[len(bom):]
+    return start.lstrip().startswith('<')
+
+def is_gzip(data):
+    """
+    Return True if the given str is gzip compressed
+    """
+    return isinstance(data, str) and data[:2] == GZIP_MAGIC
+
+class BufferReader(object):
+    """
+    A read only file object over a str, bytearray, memoryview or buffer. read returns a slice of the buffer, so the buffer is never copied as a whole
+    """
+    __slots__ = ('_view', '_pos')
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def read(self, size=-1):
+        start = self._pos
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), start + size)
+        self._pos = end
+        return self._view[start:end].tobytes()
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += len(self._view)
+        self._pos = max(0, min(len(self._view), offset))
+
+    def __len__(self):
+        return len(self._view)
+
+    def startswith(self, prefix):
+        return self._view[:len(prefix)].tobytes() == prefix
+
+class Source(object):
+    """
+    A document to parse, one of
+        path        a local file path
+        data        the document as a str
+        buffer      a BufferReader over a bytearray, memoryview or buffer holding the document
+        fileobj     a file object to read the document from
+    name is the path or url it came from, which is '' when that is not known
+    """
+    __slots__ = ('name', 'path', 'data', 'buffer', 'fileobj')
+
+    def __init__(self, name, path=None, data=None, buffer=None, fileobj=None):
+        self.name = name
+        self.path = path
+        self.data = data
+        self.buffer = buffer
+        self.fileobj = fileobj
+
+    def __repr__(self):
+        return '<{0}: {1}>'.format(self.__class__.__name__, self.name)
+
+    def read(self):
+        """
+        Return the whole document as a str, eg. to hash it. The document is kept, so it is read only once
+        """
+        if self.data is None:
+            if self.path is not None:
+                with open(self.path, 'rb') as f:
+                    self.data = f.read()
+            else:
+                self.data = self.open().read()
+            self.path = self.buffer = self.fileobj = None
+        return self.data
+
+    def open(self):
+        """
+        Return a file object to read the document from, which is the given one if it was a file object
+        """
+        if self.path is not None:
+            return open(self.path, 'rb')
+        if self.data is not None:
+            return BufferReader(self.data)
+        if self.buffer is not None:
+            return self.buffer
+        return self.fileobj
+
+    def parse(self):
+        """
+        Parse the whole document and return its root element
+        """
+        if self.data is not None:
+            return etree.fromstring(self.data)
+        if self.path is not None:
+            return etree.parse(self.path).getroot()
+        return etree.parse(self.open()).getroot()
+
+    def iterparse(self, **kwargs):
+        """
+        Return lxml.etree.iterparse over the document with the given arguments
+        """
+        return etree.iterparse(self.open(), **kwargs)
+
+def _from_content(name, data):
+    """
+    Return a Source of a document given as a str, bytearray, memoryview or buffer, decompressing it if it is gzip
+    """
+    if isinstance(data, str):
+        if is_gzip(data):
+            return Source(name, fileobj=gzip.GzipFile(fileobj=BufferReader(data)))
+        return Source(name, data=data)
+    buf = BufferReader(data)
+    if buf.startswith(GZIP_MAGIC):
+        return Source(name, fileobj=gzip.GzipFile(fileobj=buf))
+    return Source(name, buffer=buf)
+
+def resolve(document, data=None):
+    """
+    Return a Source for any of the things XBRL accepts as a document:
+        1. a local file path, which may end with .gz
+        2. a http url, which is downloaded with download_helper.get_downloader()
+        3. the document itself as a str, which starts with '<' or is gzip compressed, or as a bytearray, memoryview or buffer
+        4. an open file object, eg. one returned by open, gzip.open or zipfile.ZipFile.open, its name is taken from its name attribute if it has one
+    If data is given, it is the content of document, which is then only used as the name. data can be anything in 3.
+    """
+    if data is not None:
+        return _from_content(document if isinstance(document, basestring) else '', data)
+    if isinstance(document, basestring):
+        if is_gzip(document) or is_document(document):
+            return _from_content('', document)
+        if download_helper.is_url(document):
+            return _from_content(document, download_helper.get_downloader().fetch(document))
+        if document.lower().endswith('.gz'):
+            return Source(document, fileobj=gzip.open(document, 'rb'))
+        return Source(document, path=document)
+    if hasattr(document, 'read'):
+        name = getattr(document, 'name', '')
+        return Source(name if isinstance(name, basestring) else '', fileobj=document)
+    return _from_content('', document)
+
+def iter_archive(archive, include=is_instance_document):
+    """
+    Given the path of a zip, tar or gzip archive, or an open file object of one, return a generator of (name, content) of each member whose name passes include, every XBRL instance document by default.
+    Tar archives may be compressed with gzip or bzip2. A gzip archive has a single member named after the archive without .gz. content is a str which can be given to XBRL as it is, or as data along with name:
+
+        for name, content in iter_archive('/data/edgar/2014-q3.zip'):
+            x = XBRL(name, data=content)
+    """
+    if zipfile.is_zipfile(archive):
+        zf = zipfile.ZipFile(archive)
+        try:
+            for info in zf.infolist():
+                if not info.filename.endswith('/') and include(info.filename):
+                    yield (info.filename, zf.read(info))
+        finally:
+            zf.close()
+        return
+    if hasattr(archive, 'seek'):
+        archive.seek(0)
+    tar = _open_tar(archive)
+    if tar is not None:
+        try:
+            for member in tar:
+                if member.isfile() and include(member.name):
+                    yield (member.name, tar.extractfile(member).read())
+        finally:
+            tar.close()
+        return
+    name = getattr(archive, 'name', archive) if hasattr(archive, 'read') else archive
+    name = os.path.basename(name) if isinstance(name, basestring) else ''
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    f = gzip.GzipFile(fileobj=archive, mode='rb') if hasattr(archive, 'read') else gzip.open(archive, 'rb')
+    try:
+        if include(name):
+            yield (name, f.read())
+    finally:
+        f.close()
+
+def _open_tar(archive):
+    """
+    Return the archive opened as a tarfile.TarFile, or None if it is not a tar archive
+    """
+    try:
+        if hasattr(archive, 'read'):
+            return tarfile.open(fileobj=archive, mode='r:*')
+        return tarfile.open(archive, mode='r:*')
+    except tarfile.TarError:
+        if hasattr(archive, 'seek'):
+            archive.seek(0)
+        return None
@@ -0,0 +1,123 @@
+"""
+Timing and counters of the work done by an XBRL object, so a slow filing can be traced to the phase responsible for it. See XBRL.stats.
+
+Each XBRL object has its own XBRLStats, and stats of many filings can be merged into one, see XBRLStats.merge.
+To forward the numbers to another metrics system, register a hook with add_hook. A hook is called with (stats, phase, seconds) every time a phase ends, where stats is the XBRLStats of the filing.
+"""
+import time
+
+# the phases timed by XBRL, in the order they happen
+PHASES = ('cache', 'parse', 'contexts', 'facts', 'impute', 'quote', 'measure')
+
+# the callables registered by add_hook
+_hooks = []
+
+def add_hook(hook):
+    """
+    Call hook with (stats, phase, seconds) whenever a phase of any XBRL object ends
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+class _PhaseTimer(object):
+    """
+    A context manager which adds the time spent in it to a phase of an XBRLStats
+    """
+    __slots__ = ('stats', 'phase', 'start')
+
+    def __init__(self, stats, phase):
+        self.stats = stats
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.add_time(self.phase, time.time() - self.start)
+        return False
+
+class XBRLStats(object):
+    """
+    The counters of one or more filings.
+
+        seconds             A map that maps from phase to the wall time spent in it, see PHASES
+        filings             The number of filings counted
+        index_hits          The number of fact lookups which found a fact in the fact index
+        index_misses        The number of fact lookups which found nothing
+        imputations         The number of CommonFact not found in the document which got a value by imputation
+        quote_requests      The number of quotes fetched, their latency is the 'quote' phase
+    """
+    COUNTERS = ('filings', 'index_hits', 'index_misses', 'imputations', 'quote_requests')
+
+    def __init__(self):
+        self.seconds = dict((phase, 0.0) for phase in PHASES)
+        self.filings = 1
+        self.index_hits = 0
+        self.index_misses = 0
+        self.imputations = 0
+        self.quote_requests = 0
+
+    def __repr__(self):
+        return '<{0}: {1}>'.format(self.__class__.__name__, self.as_dict())
+
+    def phase(self, name):
+        """
+        Return a context manager which times the given phase:
+
+            with stats.phase('parse'):
+                ...
+        """
+        return _PhaseTimer(self, name)
+
+    def add_time(self, phase, seconds):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        for hook in _hooks:
+            hook(self, phase, seconds)
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+    def merge(self, other):
+        """
+        Add the counters of other, an XBRLStats or a map returned by as_dict, to this one. Returns self
+        """
+        if isinstance(other, dict):
+            other = self.from_dict(other)
+        for phase, seconds in other.seconds.iteritems():
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    @classmethod
+    def merged(cls, stats):
+        """
+        Given an iterable of XBRLStats or maps returned by as_dict, return a new XBRLStats which is the sum of all of them
+        """
+        ret = cls()
+        ret.filings = 0
+        for x in stats:
+            ret.merge(x)
+        return ret
+
+    def as_dict(self):
+        """
+        Return the counters as builtin types, so they can be sent across processes or written as json
+        """
+        ret = dict((name, getattr(self, name)) for name in self.COUNTERS)
+        ret['seconds'] = dict(self.seconds)
+        return ret
+
+    @classmethod
+    def from_dict(cls, values):
+        ret = cls()
+        for name in cls.COUNTERS:
+            setattr(ret, name, values.get(name, 0))
+        ret.seconds.update(values.get('seconds', {}))
+        return ret
@@ -0,0 +1,252 @@
+"""
+This module compiles a us-gaap taxonomy, as shipped in us-gaap/<year>/modified.xlsx, into a binary snapshot which can be memory-mapped.
+Looking up a concept in a snapshot is a binary search over a sorted tag index, only the concept asked for is turned into a UsGaapConcept, and every process mapping the same snapshot shares its pages.
+
+A snapshot file is laid out as
+    1. the header, see HEADER
+    2. the index, one INDEX_ENTRY (key offset, key length, record offset, record length) for each concept, sorted by the upper case tag
+    3. the order, one unsigned int for each concept, which are the positions in the index sorted by the tag as is, see TaxonomySnapshot.tags
+    4. the keys, each is a tag in <prefix>:<name> format
+    5. the records, each is the 11 fields of UsGaapConcept joined by FIELD_SEPARATOR
+All offsets are from the start of the file and all numbers are little-endian.
+
+To build the snapshots for every year under us-gaap:
+    python taxonomy_snapshot.py
+"""
+import mmap
+import os
+import struct
+import sys
+import zipfile
+
+from lxml import etree
+
+MAGIC = 'PYXBRLTX'
+SNAPSHOT_VERSION = 1
+# magic, version, number of concepts, offset of the order, offset of the keys, offset of the records
+HEADER = struct.Struct('<8sIIIII')
+INDEX_ENTRY = struct.Struct('<IIII')
+FIELD_SEPARATOR = '\x1f'
+FIELD_COUNT = 11
+
+SNAPSHOT_FILE_NAME = 'concepts.snapshot'
+SOURCE_FILE_NAME = 'modified.xlsx'
+
+_SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+def _encode(text):
+    if isinstance(text, unicode):
+        return text.encode('utf-8')
+    return text if text else ''
+
+def _column_index(cell_ref):
+    # A1 -> 0, L17671 -> 11
+    ret = 0
+    for char in cell_ref:
+        if not char.isalpha():
+            break
+        ret = ret * 26 + ord(char.upper()) - ord('A') + 1
+    return ret - 1
+
+def read_xlsx_rows(path):
+    """
+    Given the path to an xlsx file, generate each row of its first sheet as a list of strings, one for each column from A. Empty cells are ''
+    """
+    with zipfile.ZipFile(path) as z:
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in z.namelist():
+            for event, node in etree.iterparse(z.open('xl/sharedStrings.xml'), tag=_SPREADSHEET_NS + 'si'):
+                # rich text is split into several <t> under <r>
+                shared_strings.append(_encode(u''.join(t.text or u'' for t in node.iter(_SPREADSHEET_NS + 't'))))
+                node.clear()
+        for event, node in etree.iterparse(z.open('xl/worksheets/sheet1.xml'), tag=_SPREADSHEET_NS + 'row'):
+            row = []
+            for cell in node.iterchildren(_SPREADSHEET_NS + 'c'):
+                column = _column_index(cell.get('r', ''))
+                if column < 0:
+                    column = len(row)
+                cell_type = cell.get('t')
+                if cell_type == 'inlineStr':
+                    value = _encode(u''.join(t.text or u'' for t in cell.iter(_SPREADSHEET_NS + 't')))
+                else:
+                    value_node = cell.find(_SPREADSHEET_NS + 'v')
+                    value = _encode(value_node.text) if value_node is not None else ''
+                    if cell_type == 's' and value:
+                        value = shared_strings[int(value)]
+                row.extend([''] * (column + 1 - len(row)))
+                row[column] = value
+            yield row
+            node.clear()
+            while node.getprevious() is not None:
+                del node.getparent()[0]
+
+def read_concepts(path):
+    """
+    Given the path to a taxonomy source, generate the 11 fields of each concept as a tuple of strings, see UsGaapConcept.
+    The source is either the xlsx file downloaded from fasb.org as described in usgaap_concept.py, or the pipe-delimited csv exported from it. In both, the first column is the row number and is dropped.
+    """
+    if path.endswith('.xlsx'):
+        rows = read_xlsx_rows(path)
+    else:
+        rows = (line.rstrip('\r\n').split('|') for line in open(path) if line.strip() and not line.startswith('#'))
+    for row in rows:
+        fields = [x.replace('"', '').strip() for x in row[1:FIELD_COUNT+1]]
+        fields.extend([''] * (FIELD_COUNT - len(fields)))
+        # skip the header row and rows without prefix or name
+        if not fields[0] or not fields[1] or (fields[0], fields[1]) == ('prefix', 'name'):
+            continue
+        yield tuple(fields)
+
+def build_snapshot(source_path, snapshot_path):
+    """
+    Compile the taxonomy source at source_path into a snapshot at snapshot_path, see read_concepts.
+    Tags are case insensitive as in UsGaapConceptPool.get, if a tag appears more than once the last one is kept.
+    Returns the number of concepts in the snapshot
+    """
+    concepts = {}
+    for fields in read_concepts(source_path):
+        tag = '{0}:{1}'.format(fields[0], fields[1])
+        concepts[tag.upper()] = (tag, FIELD_SEPARATOR.join(fields))
+    entries = [concepts[key] for key in sorted(concepts)]
+    count = len(entries)
+    order = sorted(range(count), key=lambda i: entries[i][0])
+
+    order_offset = HEADER.size + INDEX_ENTRY.size * count
+    keys_offset = order_offset + 4 * count
+    records_offset = keys_offset + sum(len(tag) for tag, record in entries)
+    index = []
+    key_position = keys_offset
+    record_position = records_offset
+    for tag, record in entries:
+        index.append(INDEX_ENTRY.pack(key_position, len(tag), record_position, len(record)))
+        key_position += len(tag)
+        record_position += len(record)
+
+    # write to a temporary file first, so readers never see a partial snapshot
+    temp_path = '{0}.{1}.tmp'.format(snapshot_path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, count, order_offset, keys_offset, records_offset))
+        f.write(''.join(index))
+        f.write(struct.pack('<{0}I'.format(count), *order))
+        f.write(''.join(tag for tag, record in entries))
+        f.write(''.join(record for tag, record in entries))
+    os.rename(temp_path, snapshot_path)
+    return count
+
+class TaxonomySnapshot(object):
+    """
+    A read-only view of a snapshot file built by build_snapshot. The file is memory-mapped and nothing is read until it is asked for.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError('{0} is not a taxonomy snapshot'.format(path))
+        magic, version, self._count, self._order_offset, self._keys_offset, self._records_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a taxonomy snapshot'.format(path))
+        if version != SNAPSHOT_VERSION:
+            raise ValueError('{0} is of snapshot version {1}, expect {2}'.format(path, version, SNAPSHOT_VERSION))
+        self._tags = None
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, tag):
+        return self._find(tag) >= 0
+
+    def _entry(self, i):
+        return INDEX_ENTRY.unpack_from(self._map, HEADER.size + INDEX_ENTRY.size * i)
+
+    def _key(self, i):
+        key_offset, key_length, record_offset, record_length = self._entry(i)
+        return self._map[key_offset:key_offset+key_length]
+
+    def _find(self, tag):
+        """
+        Return the position of the given tag in the index, or -1
+        """
+        key = _encode(tag).upper()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle).upper() < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._key(low).upper() == key:
+            return low
+        return -1
+
+    def _record(self, i):
+        key_offset, key_length, record_offset, record_length = self._entry(i)
+        return tuple(self._map[record_offset:record_offset+record_length].split(FIELD_SEPARATOR))
+
+    def get_fields(self, tag):
+        """
+        Given a tag in <prefix>:<name> format, case insensitive, return the 11 fields of that concept as a tuple of strings, or None if not found
+        """
+        i = self._find(tag)
+        return self._record(i) if i >= 0 else None
+
+    def iter_fields(self):
+        """
+        Generate the fields of every concept in the order of tags
+        """
+        for i in self._get_order():
+            yield self._record(i)
+
+    def _get_order(self):
+        return struct.unpack_from('<{0}I'.format(self._count), self._map, self._order_offset)
+
+    def tags(self):
+        """
+        Return a tuple of every tag, sorted
+        """
+        if self._tags is None:
+            self._tags = tuple(self._key(i) for i in self._get_order())
+        return self._tags
+
+    def close(self):
+        self._map.close()
+
+def is_stale(source_path, snapshot_path):
+    """
+    Return True if the snapshot does not exist or is older than its source
+    """
+    if not os.path.isfile(snapshot_path):
+        return True
+    return os.path.isfile(source_path) and os.path.getmtime(source_path) > os.path.getmtime(snapshot_path)
+
+def load_snapshot(source_path, snapshot_path):
+    """
+    Return a TaxonomySnapshot for snapshot_path, building it from source_path first if it is stale, see is_stale
+    """
+    if is_stale(source_path, snapshot_path):
+        if not os.path.isfile(source_path):
+            raise IOError('Concept file does not exist in {0}'.format(source_path))
+        build_snapshot(source_path, snapshot_path)
+    try:
+        return TaxonomySnapshot(snapshot_path)
+    except ValueError:
+        # built by an older version of this module
+        build_snapshot(source_path, snapshot_path)
+        return TaxonomySnapshot(snapshot_path)
+
+def find_sources(root):
+    """
+    Given the us-gaap directory, return a map that maps from each year to the path of its taxonomy source
+    """
+    ret = {}
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name, SOURCE_FILE_NAME)
+        if name.isdigit() and os.path.isfile(path):
+            ret[int(name)] = path
+    return ret
+
+if __name__ == '__main__':
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.realpath(__file__)), 'us-gaap')
+    for year, source_path in sorted(find_sources(root).items()):
+        snapshot_path = os.path.join(os.path.dirname(source_path), SNAPSHOT_FILE_NAME)
+        print year, build_snapshot(source_path, snapshot_path), snapshot_path
@@ -0,0 +1,38 @@
+"""
+Synthetic filings for the tests, made with benchmarks/generate_instance.py so no network or EDGAR file is needed.
+"""
+from datetime import date
+import os
+import re
+import StringIO
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import generate_instance
+from usgaap_concept import UsGaapConceptPool
+
+def make_document(symbol='abc', period_end=date(2014, 6, 28), document_type='10-Q', facts=200, without=(), us_gaap=None):
+    """
+    Return a synthetic instance document as a str.
+
+    Args:
+        without A tuple of local names of DEI to leave out, eg. ('DocumentFiscalYearFocus',)
+        us_gaap If given, a map that maps from us-gaap local name to value. The generated us-gaap facts are replaced by these, in the current instant context or in both current duration contexts by the periodType of the concept
+    """
+    out = StringIO.StringIO()
+    generate_instance.generate(out, symbol=symbol, period_end=period_end, document_type=document_type, facts=facts)
+    document = out.getvalue()
+    for name in without:
+        document = re.sub(r'  <dei:{0} [^\n]*\n'.format(name), '', document)
+    if us_gaap is not None:
+        document = re.sub(r'  <us-gaap:[^\n]*\n', '', document)
+        lines = []
+        for name, value in sorted(us_gaap.items()):
+            tag = 'us-gaap:' + name
+            context_ids = ('I0',) if UsGaapConceptPool.get(tag).periodType == 'instant' else ('D0', 'D1')
+            lines.extend(generate_instance._fact(tag, x, value) for x in context_ids)
+        document = document.replace('</xbrli:xbrl>', ''.join(lines) + '</xbrli:xbrl>')
+    return document
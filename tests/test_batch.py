@@ -0,0 +1,134 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import fixture_helper
+
+import batch
+from download_helper import Downloader
+from common_measurement import CommonMeasurement
+import quote_helper
+from xbrl import XBRL
+
+class RecordingQuoteProvider(quote_helper.QuoteProvider):
+    """
+    A quote for each symbol by its length, which records the prefetch calls made in this process
+    """
+    def __init__(self):
+        self.prefetched = []
+
+    def get_quote(self, symbol, fiscal_period_end_date):
+        return 10.0 * len(symbol)
+
+    def prefetch(self, symbol_dates):
+        self.prefetched.append(sorted(symbol_dates))
+
+class FindInstancesTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.document = fixture_helper.make_document()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write_gzip(self, name):
+        path = os.path.join(self.path, name)
+        f = gzip.open(path, 'wb')
+        try:
+            f.write(self.document)
+        finally:
+            f.close()
+        return path
+
+    def test_gzip_instance(self):
+        path = self._write_gzip('abc-20140628.xml.gz')
+        self.assertEqual(batch.find_instances([path]), [path])
+        result = list(batch.extract([path], processes=1))[0]
+        self.assertIsNone(result.error)
+        self.assertEqual(dict(result.common_facts), dict(XBRL(self.document).common_facts))
+
+    def test_gzip_instance_without_xml_name(self):
+        path = self._write_gzip('abc-20140628.gz')
+        self.assertEqual(batch.find_instances([path]), [path])
+
+    def test_manifest(self):
+        path = os.path.join(self.path, 'manifest.txt')
+        with open(path, 'w') as f:
+            f.write('# filings\n/data/abc-20140628.xml\n\nhttp://www.sec.gov/abc-20140628.xml\n')
+        self.assertEqual(batch.find_instances([path]), ['/data/abc-20140628.xml', 'http://www.sec.gov/abc-20140628.xml'])
+
+class CountingDownloader(Downloader):
+    """
+    Hand out the given documents one at a time as they are asked for, counting them
+    """
+    def __init__(self, documents):
+        super(CountingDownloader, self).__init__()
+        self.documents = documents
+        self.fetched = 0
+
+    def fetch_all(self, urls, ordered=False):
+        for url in urls:
+            self.fetched += 1
+            yield (url, self.documents[url], None)
+
+class DownloadWindowTest(unittest.TestCase):
+    def test_downloads_stay_bounded(self):
+        document = fixture_helper.make_document()
+        urls = ['http://www.sec.gov/abc{0}-20140628.xml'.format(i) for i in range(20)]
+        downloader = CountingDownloader(dict((url, document) for url in urls))
+        ahead = []
+        def progress(done, total, result):
+            ahead.append(downloader.fetched - done)
+        results = list(batch.extract(urls, processes=1, ordered=True, progress=progress, downloads=downloader, quote_batch=0))
+        self.assertEqual([x.url for x in results], urls)
+        self.assertTrue(all(x.ok for x in results))
+        # at most 2 * processes documents are handed to the pool ahead of the results
+        self.assertLessEqual(max(ahead), 2)
+
+class QuoteBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for symbol in ('a', 'bb', 'ccc', 'dddd', 'eeeee'):
+            with open(os.path.join(self.path, '{0}-20140628.xml'.format(symbol)), 'wb') as f:
+                f.write(fixture_helper.make_document(symbol=symbol, us_gaap={'EarningsPerShareBasic': 2, 'CommonStockSharesIssued': 1000, 'NetCashProvidedByUsedInOperatingActivities': 5000}))
+        self.provider = RecordingQuoteProvider()
+        quote_helper.set_quote_provider(self.provider)
+
+    def tearDown(self):
+        quote_helper.set_quote_provider(None)
+        shutil.rmtree(self.path)
+
+    def _extract(self, quote_batch):
+        return dict((x.url, x) for x in batch.extract([self.path], processes=2, quote_batch=quote_batch))
+
+    def test_quote_measurements(self):
+        quoted = set(batch.quote_measurements())
+        self.assertTrue(quoted)
+        for m in CommonMeasurement.all():
+            self.assertEqual(m in quoted, m.requires_quote or any(x in quoted for x in m.get_dependencies()))
+
+    def test_same_as_quotes_in_workers(self):
+        expected = self._extract(0)
+        self.assertEqual(self.provider.prefetched, [])
+        results = self._extract(2)
+        self.assertEqual(sorted(results), sorted(expected))
+        for url, result in results.items():
+            self.assertIsNone(result.error)
+            self.assertEqual(result.common_measurements, expected[url].common_measurements)
+            self.assertEqual(result.stats.quote_requests, 1)
+        quoted = batch.quote_measurements()
+        self.assertEqual(len(set(tuple(x.common_measurements[m] for m in quoted) for x in results.values())), 5)
+        # 5 filings in batches of 2
+        self.assertEqual([len(x) for x in self.provider.prefetched], [2, 2, 1])
+        self.assertEqual(sorted(x[0] for keys in self.provider.prefetched for x in keys), ['a', 'bb', 'ccc', 'dddd', 'eeeee'])
+
+    def test_quote_failure(self):
+        self.provider.get_quote = lambda symbol, fiscal_period_end_date: 1 / 0
+        results = self._extract(10)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(x.error.startswith('ZeroDivisionError') for x in results.values()))
+
+if __name__ == '__main__':
+    unittest.main()
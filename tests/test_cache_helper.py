@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fixture_helper
+
+from cache_helper import XBRLCache
+from xbrl import XBRL, DEI
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = XBRLCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, document):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(document)
+        return path
+
+    def test_hit_restores_the_parse(self):
+        path = self.write('abc-20140628.xml', fixture_helper.make_document())
+        parsed = XBRL(path, cache=self.cache)
+        cached = XBRL(path, cache=self.cache)
+        self.assertIsNone(cached.doc_root)
+        self.assertEqual(cached.dei, parsed.dei)
+        self.assertEqual(cached.common_facts, parsed.common_facts)
+
+    def test_symbol_from_url_is_not_cached(self):
+        document = fixture_helper.make_document(without=('TradingSymbol',))
+        abc = XBRL(self.write('abc-20140628.xml', document), cache=self.cache)
+        xyz = XBRL(self.write('xyz-20140628.xml', document), cache=self.cache)
+        self.assertIsNone(xyz.doc_root)
+        self.assertEqual(abc.dei[DEI.TradingSymbol], 'ABC')
+        self.assertEqual(xyz.dei[DEI.TradingSymbol], 'XYZ')
+
+    def test_symbol_from_document_is_cached(self):
+        document = fixture_helper.make_document(symbol='abc')
+        self.write('abc-20140628.xml', document)
+        XBRL(os.path.join(self.directory, 'abc-20140628.xml'), cache=self.cache)
+        xyz = XBRL(self.write('xyz-20140628.xml', document), cache=self.cache)
+        self.assertIsNone(xyz.doc_root)
+        self.assertEqual(xyz.dei[DEI.TradingSymbol], 'abc')
+
+if __name__ == '__main__':
+    unittest.main()
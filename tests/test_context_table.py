@@ -0,0 +1,55 @@
+from datetime import date
+import unittest
+
+import fixture_helper
+
+from context_table import ContextRecord, ContextTable
+from xbrl import XBRL
+
+SCENARIO = ('<xbrli:scenario><xbrldi:explicitMember dimension="us-gaap:StatementScenarioAxis">'
+            'us-gaap:ScenarioPreviouslyReportedMember</xbrldi:explicitMember></xbrli:scenario>')
+SCENARIO_DIMENSION = ('us-gaap:StatementScenarioAxis', 'us-gaap:ScenarioPreviouslyReportedMember')
+
+class ContextTableTest(unittest.TestCase):
+    def setUp(self):
+        end = date(2014, 6, 28)
+        self.table = ContextTable([
+            ContextRecord('D0', '123', False, start_date=date(2014, 3, 30), end_date=end),
+            ContextRecord('D0_S0', '123', True, start_date=date(2014, 3, 30), end_date=end,
+                          dimensions=(('us-gaap:StatementBusinessSegmentsAxis', 'abc:Segment0Member'),)),
+            ContextRecord('D0_R', '123', False, start_date=date(2014, 3, 30), end_date=end, dimensions=(SCENARIO_DIMENSION,)),
+        ])
+
+    def test_scenario_is_about_the_entity(self):
+        self.assertFalse(self.table.get('D0_R').has_dimensions)
+        self.assertTrue(self.table.get('D0_R').is_dimensional)
+        self.assertEqual([x.id for x in self.table.durations_ending_at(date(2014, 6, 28))], ['D0', 'D0_R'])
+
+    def test_dimension_queries(self):
+        self.assertEqual([x.id for x in self.table.dimensional()], ['D0_S0', 'D0_R'])
+        self.assertEqual([x.id for x in self.table.with_dimension(*SCENARIO_DIMENSION)], ['D0_R'])
+        self.assertEqual(self.table.axes(), ('us-gaap:StatementBusinessSegmentsAxis', 'us-gaap:StatementScenarioAxis'))
+
+    def test_to_tuple(self):
+        for record in self.table:
+            copy = ContextRecord.from_tuple(record.to_tuple())
+            self.assertEqual(copy.to_tuple(), record.to_tuple())
+
+class ScenarioContextTest(unittest.TestCase):
+    def test_scenario_only_context(self):
+        document = fixture_helper.make_document()
+        expected = XBRL(document)
+        # the current quarter and year to date contexts get a scenario, which leaves them contexts of the entity
+        for context_id in ('D0', 'D1'):
+            start = document.index('<xbrli:context id="{0}">'.format(context_id))
+            end = document.index('</xbrli:context>', start)
+            document = document[:end] + SCENARIO + document[end:]
+        x = XBRL(document)
+        self.assertFalse(x.contexts.get('D0').has_dimensions)
+        self.assertEqual(x.contexts.get('D0').dimensions, (SCENARIO_DIMENSION,))
+        self.assertEqual((x.context_instant, x.context_duration), (expected.context_instant, expected.context_duration))
+        self.assertEqual(dict(x.common_facts), dict(expected.common_facts))
+        self.assertTrue(x.get_dimensional_facts(axis=SCENARIO_DIMENSION[0]))
+
+if __name__ == '__main__':
+    unittest.main()
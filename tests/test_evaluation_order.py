@@ -0,0 +1,38 @@
+import unittest
+
+import fixture_helper
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+from xbrl import XBRL
+
+class EvaluationOrderTest(unittest.TestCase):
+    def test_net_cash_flow_imputed_from_components(self):
+        # NetCashFlowsFinancing is itself imputed from the continuing operations tag, so it has to come before NetCashFlow
+        x = XBRL(fixture_helper.make_document(us_gaap={
+            'NetCashProvidedByUsedInOperatingActivities': 825000,
+            'NetCashProvidedByUsedInInvestingActivities': 300000,
+            'NetCashProvidedByUsedInFinancingActivitiesContinuingOperations': 200000,
+        }))
+        self.assertEqual(x.common_facts[CommonFact.NetCashFlowsFinancing], 200000)
+        self.assertEqual(x.common_facts[CommonFact.NetCashFlow], 1325000)
+
+    def test_net_cash_flow_found_in_document(self):
+        x = XBRL(fixture_helper.make_document(us_gaap={
+            'CashAndCashEquivalentsPeriodIncreaseDecrease': 10000,
+            'NetCashProvidedByUsedInOperatingActivities': 825000,
+        }))
+        self.assertEqual(x.common_facts[CommonFact.NetCashFlow], 10000)
+
+    def test_measurement_of_measurement(self):
+        # NetQuickAssets is QuickAssets less CurrentLiabilities, so QuickAssets has to be calculated first
+        x = XBRL(fixture_helper.make_document(us_gaap={
+            'AssetsCurrent': 90000,
+            'InventoryNet': 20000,
+            'LiabilitiesCurrent': 40000,
+        }))
+        self.assertEqual(x.common_measurements[CommonMeasurement.QuickAssets], 70000)
+        self.assertEqual(x.common_measurements[CommonMeasurement.NetQuickAssets], 30000)
+
+if __name__ == '__main__':
+    unittest.main()
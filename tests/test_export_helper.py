@@ -0,0 +1,80 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import fixture_helper
+
+from batch import BatchResult
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import export_helper
+import quote_helper
+from xbrl import XBRL, DEI
+
+class ConstantQuoteProvider(quote_helper.QuoteProvider):
+    def get_quote(self, symbol, fiscal_period_end_date):
+        return 25.0
+
+class CSVExportTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        quote_helper.set_quote_provider(ConstantQuoteProvider())
+        self.xbrls = [XBRL(fixture_helper.make_document(symbol=symbol, us_gaap={
+            'AssetsCurrent': 90000 * len(symbol),
+            'InventoryNet': 20000,
+            'LiabilitiesCurrent': 40000,
+            'EarningsPerShareBasic': 0.1 * len(symbol),
+        })) for symbol in ('a', 'bb', 'ccc')]
+
+    def tearDown(self):
+        quote_helper.set_quote_provider(None)
+        shutil.rmtree(self.path)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return list(csv.reader(f))
+
+    def test_rows(self):
+        failed = BatchResult('/data/ddd-20140628.xml', error='XMLSyntaxError: no document')
+        path = os.path.join(self.path, 'out.csv')
+        # a chunk size smaller than the number of rows, so more than one chunk is written
+        self.assertEqual(export_helper.export(self.xbrls + [failed], path, chunk_size=2), 4)
+        rows = self._read(path)
+        self.assertEqual(rows[0], export_helper.columns())
+        self.assertEqual(len(rows), 5)
+        for row, x in zip(rows[1:4], self.xbrls):
+            values = dict(zip(rows[0], row))
+            self.assertEqual(values['error'], '')
+            self.assertEqual(values[DEI.TradingSymbol.name], x.dei[DEI.TradingSymbol])
+            for fact in CommonFact.all():
+                self.assertEqual(values[fact.name], repr(float(x.common_facts[fact])))
+            for m in CommonMeasurement.all():
+                self.assertEqual(values[m.name], repr(float(x.common_measurements[m])))
+        values = dict(zip(rows[0], rows[4]))
+        self.assertEqual(values['url'], failed.url)
+        self.assertEqual(values['error'], failed.error)
+        self.assertEqual(set(values[x] for x in rows[0][2:]), set(['']))
+
+    def test_unicode(self):
+        result = BatchResult(u'/data/caf\xe9-20140628.xml', dei={DEI.TradingSymbol: u'caf\xe9'})
+        path = os.path.join(self.path, 'out.csv')
+        export_helper.export([result], path)
+        values = dict(zip(*self._read(path)))
+        self.assertEqual(values['url'].decode('utf-8'), result.url)
+        self.assertEqual(values[DEI.TradingSymbol.name].decode('utf-8'), u'caf\xe9')
+
+    def test_empty(self):
+        path = os.path.join(self.path, 'out.csv')
+        self.assertEqual(export_helper.export([], path), 0)
+        self.assertEqual(self._read(path), [export_helper.columns()])
+
+    def test_format(self):
+        self.assertEqual(export_helper.get_format('/data/OUT.CSV'), 'csv')
+        self.assertEqual(export_helper.get_format('/data/out.feather'), 'arrow')
+        self.assertRaises(ValueError, export_helper.get_format, '/data/out.xlsx')
+        self.assertRaises(ValueError, export_helper.open_writer, os.path.join(self.path, 'out.csv'), format='xlsx')
+
+if __name__ == '__main__':
+    unittest.main()
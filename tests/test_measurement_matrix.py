@@ -0,0 +1,69 @@
+import unittest
+
+import numpy
+
+import fixture_helper
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import measurement_matrix
+import quote_helper
+from xbrl import XBRL, DEI
+
+class SymbolQuoteProvider(quote_helper.QuoteProvider):
+    """
+    A quote for each symbol by its length
+    """
+    def get_quote(self, symbol, fiscal_period_end_date):
+        return 10.0 * len(symbol)
+
+class MeasurementMatrixTest(unittest.TestCase):
+    def setUp(self):
+        quote_helper.set_quote_provider(SymbolQuoteProvider())
+        self.xbrls = [
+            XBRL(fixture_helper.make_document(symbol='a')),
+            XBRL(fixture_helper.make_document(symbol='bb', us_gaap={
+                'AssetsCurrent': 90000,
+                'InventoryNet': 20000,
+                'LiabilitiesCurrent': 40000,
+                'EarningsPerShareBasic': 2,
+                'CommonStockSharesIssued': 1000,
+            })),
+            XBRL(fixture_helper.make_document(symbol='ccc', us_gaap={
+                'NetCashProvidedByUsedInOperatingActivities': 825000,
+                'NetCashProvidedByUsedInInvestingActivities': 300000,
+                'NetCashProvidedByUsedInFinancingActivitiesContinuingOperations': 200000,
+            })),
+            XBRL(fixture_helper.make_document(symbol='dddd', us_gaap={})),
+        ]
+        self.quotes = numpy.array([10.0 * len(x.dei[DEI.TradingSymbol]) for x in self.xbrls])
+
+    def tearDown(self):
+        quote_helper.set_quote_provider(None)
+
+    def test_measurements_match_each_filing(self):
+        matrix = measurement_matrix.calculate_measurements(measurement_matrix.build_fact_matrix(self.xbrls), self.quotes)
+        self.assertEqual(matrix.shape, (len(self.xbrls), len(CommonMeasurement.all())))
+        for row, x in zip(matrix, self.xbrls):
+            self.assertEqual(list(row), CommonMeasurement.values_of(x.common_measurements))
+
+    def test_imputed_facts_match_each_filing(self):
+        matrix = measurement_matrix.impute_facts(measurement_matrix.build_fetched_matrix(self.xbrls))
+        self.assertTrue((matrix == measurement_matrix.build_fact_matrix(self.xbrls)).all())
+
+    def test_no_filings(self):
+        fact_matrix = measurement_matrix.build_fact_matrix([])
+        self.assertEqual(fact_matrix.shape, (0, len(CommonFact.all())))
+        self.assertEqual(measurement_matrix.calculate_measurements(fact_matrix).shape, (0, len(CommonMeasurement.all())))
+
+    def test_wrong_shape(self):
+        self.assertRaises(ValueError, measurement_matrix.calculate_measurements, numpy.zeros((2, 3)))
+
+    def test_to_structured(self):
+        matrix = measurement_matrix.calculate_measurements(measurement_matrix.build_fact_matrix(self.xbrls), self.quotes)
+        structured = measurement_matrix.to_structured(matrix)
+        for m in CommonMeasurement.all():
+            self.assertTrue((structured[m.name] == matrix[:, m.index]).all())
+
+if __name__ == '__main__':
+    unittest.main()
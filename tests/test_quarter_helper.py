@@ -0,0 +1,81 @@
+from datetime import date
+import unittest
+
+import fixture_helper
+
+from batch import BatchResult
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import quarter_helper
+from quarter_helper import FactKind
+import timeseries_store
+from xbrl import XBRL, DEI
+
+def _filing(cik, focus, period_end, **values):
+    dei = {
+        DEI.EntityCentralIndexKey: str(cik),
+        DEI.DocumentFiscalYearFocus: '2014',
+        DEI.DocumentFiscalPeriodFocus: focus,
+        DEI.DocumentPeriodEndDate: period_end,
+        DEI.AmendmentFlag: 'false',
+    }
+    facts = dict((fact, values.get(fact.name, 0)) for fact in CommonFact.all())
+    return BatchResult('{0}-{1}.xml'.format(cik, focus), dei=dei, common_facts=facts)
+
+class FactKindTest(unittest.TestCase):
+    def test_kinds(self):
+        self.assertEqual(quarter_helper.get_fact_kind(CommonFact.Revenues), FactKind.Flow)
+        self.assertEqual(quarter_helper.get_fact_kind(CommonFact.Assets), FactKind.Stock)
+        self.assertEqual(quarter_helper.get_fact_kind(CommonFact.EarningsPerShareBasic), FactKind.Other)
+
+class DeriveTest(unittest.TestCase):
+    def test_from_quarters(self):
+        results = [
+            _filing(1, 'Q1', '2013-12-28', Revenues=100, Assets=5000, EarningsPerShareBasic=1),
+            _filing(1, 'Q2', '2014-03-29', Revenues=200, Assets=5100, EarningsPerShareBasic=1),
+            _filing(1, 'Q3', '2014-06-28', Revenues=300, Assets=5200, EarningsPerShareBasic=1),
+            _filing(1, 'FY', '2014-09-27', Revenues=1000, Assets=5300, EarningsPerShareBasic=5),
+            # no Q3 before this 10-K, so there is no fourth quarter
+            _filing(2, 'FY', '2014-09-27', Revenues=1000),
+            # Q2 is missing, so the flows can not be derived
+            _filing(3, 'Q1', '2013-12-28', Revenues=100),
+            _filing(3, 'Q3', '2014-06-28', Revenues=300, Assets=700),
+            _filing(3, 'FY', '2014-09-27', Revenues=1000, Assets=800),
+        ]
+        keys, facts, measurements = quarter_helper.derive(results)
+        self.assertEqual(list(keys['cik']), [1, 3])
+        self.assertEqual(list(keys['fiscal_period']), [quarter_helper.FOURTH_QUARTER] * 2)
+        self.assertEqual(list(keys['row']), [3, 7])
+        self.assertEqual(list(facts[:, CommonFact.Revenues.index]), [400, 0])
+        self.assertEqual(list(facts[:, CommonFact.Assets.index]), [5300, 800])
+        self.assertEqual(list(facts[:, CommonFact.EarningsPerShareBasic.index]), [0, 0])
+        self.assertEqual(measurements.shape[0], 2)
+
+    def test_quarter_of_previous_year_is_not_used(self):
+        results = [
+            _filing(1, 'Q1', '2012-12-29', Revenues=100),
+            _filing(1, 'Q2', '2013-03-30', Revenues=200),
+            _filing(1, 'Q3', '2013-06-29', Revenues=300),
+            _filing(1, 'FY', '2014-09-27', Revenues=1000),
+        ]
+        keys, facts, measurements = quarter_helper.derive(results)
+        self.assertEqual(len(keys), 0)
+        self.assertEqual(facts.shape, (0, len(CommonFact.all())))
+
+    def test_from_year_to_date(self):
+        # the Q3 10-Q reports the 9 months year to date, so Q1 and Q2 are not needed
+        q3 = XBRL(fixture_helper.make_document(us_gaap={'Revenues': 300}))
+        fy = XBRL(fixture_helper.make_document(period_end=date(2014, 9, 27), document_type='10-K', us_gaap={'Revenues': 1000}))
+        self.assertEqual(timeseries_store.filing_key(q3)[0], timeseries_store.filing_key(fy)[0])
+        self.assertEqual(fy.dei[DEI.DocumentFiscalPeriodFocus], 'FY')
+        keys, facts, measurements = quarter_helper.derive([q3, fy])
+        self.assertEqual(list(keys['row']), [1])
+        self.assertEqual(list(facts[:, CommonFact.Revenues.index]), [700])
+
+    def test_no_filings(self):
+        keys, facts, measurements = quarter_helper.derive([])
+        self.assertEqual(len(keys), 0)
+        self.assertEqual(measurements.shape, (0, len(CommonMeasurement.all())))
+
+if __name__ == '__main__':
+    unittest.main()
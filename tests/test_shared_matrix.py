@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import fixture_helper
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import measurement_matrix
+import shared_matrix
+from xbrl import XBRL
+
+def _revenues(matrices, row):
+    return matrices.get_fact(row, CommonFact.Revenues)
+
+class SharedMatrixTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path, 'test.matrix')
+        self.facts = numpy.arange(3 * len(CommonFact.all()), dtype=numpy.float64).reshape(3, -1)
+        self.measurements = measurement_matrix.calculate_measurements(self.facts)
+        self.urls = ['/data/a-20140628.xml', u'/data/caf\xe9-20140628.xml', '/data/c-20140628.xml']
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        shared_matrix.write_matrices(self.file, self.facts, self.measurements, self.urls)
+        matrices = shared_matrix.SharedMatrices(self.file)
+        try:
+            self.assertEqual(len(matrices), 3)
+            self.assertTrue((matrices.facts == self.facts).all())
+            self.assertTrue((matrices.measurements == self.measurements).all())
+            self.assertEqual(matrices.urls[1].decode('utf-8'), self.urls[1])
+            self.assertEqual(matrices.row_of('/data/c-20140628.xml'), 2)
+            self.assertEqual(matrices.row_of('/data/d-20140628.xml'), -1)
+            self.assertEqual(matrices.get_measurement(1, CommonMeasurement.QuickAssets), self.measurements[1, CommonMeasurement.QuickAssets.index])
+            self.assertEqual(matrices.facts.ctypes.data % shared_matrix.ALIGNMENT, 0)
+        finally:
+            matrices.close()
+
+    def test_no_filings(self):
+        self.assertEqual(shared_matrix.write(self.file, []), 0)
+        matrices = shared_matrix.SharedMatrices(self.file)
+        try:
+            self.assertEqual(len(matrices), 0)
+            self.assertEqual(matrices.facts.shape, (0, len(CommonFact.all())))
+            self.assertEqual(matrices.measurements.shape, (0, len(CommonMeasurement.all())))
+            self.assertEqual(matrices.urls, [])
+            self.assertEqual(matrices.row_of(''), -1)
+        finally:
+            matrices.close()
+
+    def test_write_results(self):
+        xbrls = [XBRL(fixture_helper.make_document(symbol=symbol, us_gaap={'AssetsCurrent': 90000, 'InventoryNet': 20000 * len(symbol)})) for symbol in ('a', 'bb')]
+        self.assertEqual(shared_matrix.write(self.file, xbrls), 2)
+        matrices = shared_matrix.SharedMatrices(self.file)
+        try:
+            self.assertTrue((matrices.facts == measurement_matrix.build_fact_matrix(xbrls)).all())
+            self.assertEqual(list(matrices.measurements[:, CommonMeasurement.QuickAssets.index]), [70000, 50000])
+        finally:
+            matrices.close()
+
+    def test_wrong_shape(self):
+        self.assertRaises(ValueError, shared_matrix.write_matrices, self.file, self.facts[:, 1:], self.measurements)
+        self.assertRaises(ValueError, shared_matrix.write_matrices, self.file, self.facts, self.measurements[1:])
+        self.assertRaises(ValueError, shared_matrix.write_matrices, self.file, self.facts, self.measurements, self.urls[1:])
+        self.assertFalse(os.path.exists(self.file))
+
+    def test_not_a_matrix_file(self):
+        with open(self.file, 'wb') as f:
+            f.write('\0' * 256)
+        self.assertRaises(ValueError, shared_matrix.SharedMatrices, self.file)
+        with open(self.file, 'wb') as f:
+            f.write(shared_matrix.MAGIC)
+        self.assertRaises(ValueError, shared_matrix.SharedMatrices, self.file)
+
+    def test_other_definitions(self):
+        shared_matrix.write_matrices(self.file, self.facts, self.measurements)
+        with open(self.file, 'r+b') as f:
+            # the fingerprint is followed by the four offsets and lengths of 8 bytes each
+            f.seek(shared_matrix.HEADER.size - 16 - 4 * 8)
+            f.write('0' * 16)
+        self.assertRaises(ValueError, shared_matrix.SharedMatrices, self.file)
+
+    def test_map_shared(self):
+        shared_matrix.write_matrices(self.file, self.facts, self.measurements, self.urls)
+        self.assertEqual(shared_matrix.map_shared(self.file, _revenues, [2, 0, 1], processes=2),
+                         [self.facts[row, CommonFact.Revenues.index] for row in (2, 0, 1)])
+
+if __name__ == '__main__':
+    unittest.main()
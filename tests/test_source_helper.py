@@ -0,0 +1,97 @@
+import gzip
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import fixture_helper
+
+import source_helper
+from xbrl import XBRL, DEI
+
+class ResolveTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.document = fixture_helper.make_document()
+        self.file_path = os.path.join(self.path, 'abc-20140628.xml')
+        with open(self.file_path, 'wb') as f:
+            f.write(self.document)
+        self.compressed = self._compress(self.document)
+        self.expected = self._values(XBRL(self.file_path))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @staticmethod
+    def _compress(data):
+        out = StringIO.StringIO()
+        f = gzip.GzipFile(fileobj=out, mode='wb')
+        f.write(data)
+        f.close()
+        return out.getvalue()
+
+    @staticmethod
+    def _values(x):
+        return (dict((dei, value) for dei, value in x.dei.items() if dei != DEI.TradingSymbol), dict(x.common_facts))
+
+    def _check(self, document, **kwargs):
+        self.assertEqual(self._values(XBRL(document, **kwargs)), self.expected)
+        self.assertEqual(self._values(XBRL(document, streaming=True, **kwargs)), self.expected)
+
+    def test_str(self):
+        self._check(self.document)
+
+    def test_str_with_bom(self):
+        self._check(source_helper.UTF8_BOM + self.document)
+
+    def test_bytearray(self):
+        self._check(bytearray(self.document))
+
+    def test_memoryview(self):
+        self._check(memoryview(self.document))
+
+    def test_gzip_str(self):
+        self._check(self.compressed)
+
+    def test_gzip_bytearray(self):
+        self._check(bytearray(self.compressed))
+
+    def test_gzip_path(self):
+        path = self.file_path + '.gz'
+        with open(path, 'wb') as f:
+            f.write(self.compressed)
+        self._check(path)
+
+    def test_file_object(self):
+        with open(self.file_path, 'rb') as f:
+            x = XBRL(f)
+        self.assertEqual(x.url, self.file_path)
+        self.assertEqual(self._values(x), self.expected)
+
+    def test_unicode_path(self):
+        x = XBRL(unicode(self.file_path))
+        self.assertEqual(x.url, self.file_path)
+        self.assertEqual(self._values(x), self.expected)
+
+    def test_data(self):
+        self._check('http://www.sec.gov/abc-20140628.xml', data=self.document)
+        self._check('http://www.sec.gov/abc-20140628.xml.gz', data=self.compressed)
+        x = XBRL('http://www.sec.gov/abc-20140628.xml', data=bytearray(self.document))
+        self.assertEqual(x.url, 'http://www.sec.gov/abc-20140628.xml')
+
+class IsDocumentTest(unittest.TestCase):
+    def test_is_document(self):
+        self.assertTrue(source_helper.is_document('<?xml version="1.0"?><a/>'))
+        self.assertTrue(source_helper.is_document(source_helper.UTF8_BOM + '  <a/>'))
+        self.assertTrue(source_helper.is_document(u'\ufeff<a/>'))
+        self.assertFalse(source_helper.is_document('/data/abc-20140628.xml'))
+        self.assertFalse(source_helper.is_document(u'/data/abc-20140628.xml'))
+
+    def test_is_gzip(self):
+        self.assertTrue(source_helper.is_gzip(source_helper.GZIP_MAGIC + 'data'))
+        self.assertFalse(source_helper.is_gzip('<a/>'))
+        self.assertFalse(source_helper.is_gzip(u'/data/abc-20140628.xml'))
+
+if __name__ == '__main__':
+    unittest.main()
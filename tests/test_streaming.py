@@ -0,0 +1,58 @@
+from datetime import date
+import unittest
+
+import fixture_helper
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+import quote_helper
+from xbrl import XBRL
+
+class ConstantQuoteProvider(quote_helper.QuoteProvider):
+    def get_quote(self, symbol, fiscal_period_end_date):
+        return 25.0
+
+class StreamingParityTest(unittest.TestCase):
+    def setUp(self):
+        quote_helper.set_quote_provider(ConstantQuoteProvider())
+
+    def tearDown(self):
+        quote_helper.set_quote_provider(None)
+
+    def assertSameResults(self, document):
+        parsed = XBRL(document)
+        streamed = XBRL(document, streaming=True)
+        self.assertIsNone(streamed.doc_root)
+        self.assertEqual(streamed.dei, parsed.dei)
+        self.assertEqual(streamed.fiscal_year, parsed.fiscal_year)
+        self.assertEqual(streamed.fiscal_period_end_date, parsed.fiscal_period_end_date)
+        self.assertEqual(streamed.context_instant, parsed.context_instant)
+        self.assertEqual(streamed.context_duration, parsed.context_duration)
+        self.assertEqual(streamed.contexts.to_tuples(), parsed.contexts.to_tuples())
+        for fact in CommonFact.all():
+            self.assertEqual(streamed.common_facts[fact], parsed.common_facts[fact], fact.name)
+        for m in CommonMeasurement.all():
+            self.assertEqual(streamed.common_measurements[m], parsed.common_measurements[m], m.name)
+
+    def test_quarterly(self):
+        self.assertSameResults(fixture_helper.make_document(facts=400))
+
+    def test_annual(self):
+        self.assertSameResults(fixture_helper.make_document(symbol='xyz', period_end=date(2013, 9, 28), document_type='10-K'))
+
+    def test_imputed_facts(self):
+        self.assertSameResults(fixture_helper.make_document(us_gaap={
+            'AssetsCurrent': 90000,
+            'InventoryNet': 20000,
+            'LiabilitiesCurrent': 40000,
+            'NetCashProvidedByUsedInOperatingActivities': 825000,
+            'NetCashProvidedByUsedInInvestingActivities': 300000,
+            'NetCashProvidedByUsedInFinancingActivitiesContinuingOperations': 200000,
+            'EarningsPerShareBasic': 2,
+        }))
+
+    def test_missing_dei(self):
+        self.assertSameResults(fixture_helper.make_document(without=('DocumentFiscalYearFocus', 'TradingSymbol')))
+
+if __name__ == '__main__':
+    unittest.main()
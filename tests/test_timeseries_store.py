@@ -0,0 +1,30 @@
+import shutil
+import tempfile
+import unittest
+
+import fixture_helper
+
+import timeseries_store
+from xbrl import XBRL, DEI
+
+class FilingKeyTest(unittest.TestCase):
+    def test_without_fiscal_year_focus(self):
+        x = XBRL(fixture_helper.make_document(without=('DocumentFiscalYearFocus',)))
+        # XBRL falls back to the year of DocumentPeriodEndDate, as an int
+        self.assertEqual(x.dei[DEI.DocumentFiscalYearFocus], 2014)
+        key = timeseries_store.filing_key(x)
+        self.assertEqual(key[1], 2014)
+        self.assertEqual(key[2], timeseries_store.FISCAL_PERIODS.index('Q3'))
+
+    def test_append_without_fiscal_year_focus(self):
+        path = tempfile.mkdtemp()
+        try:
+            store = timeseries_store.TimeSeriesStore(path)
+            results = [XBRL(fixture_helper.make_document()), XBRL(fixture_helper.make_document(without=('DocumentFiscalYearFocus',)))]
+            self.assertEqual(store.append(results), 2)
+            self.assertEqual(list(store.key('fiscal_year')), [2014, 2014])
+        finally:
+            shutil.rmtree(path)
+
+if __name__ == '__main__':
+    unittest.main()
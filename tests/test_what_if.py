@@ -0,0 +1,38 @@
+import unittest
+
+import fixture_helper
+
+from common_fact import CommonFact
+from xbrl import XBRL
+
+def _failing_net_cash_flow(values):
+    return 1.0 / values[CommonFact.NetCashFlowsOperating.index]
+
+class OverrideCommonFactsTest(unittest.TestCase):
+    def setUp(self):
+        # NetCashFlow fails to impute as long as NetCashFlowsOperating is 0
+        self.evaluators = CommonFact.NetCashFlow._evaluators
+        CommonFact.NetCashFlow._evaluators = (_failing_net_cash_flow,)
+        self.x = XBRL(fixture_helper.make_document(us_gaap={}))
+        self.assertEqual(self.x.common_facts[CommonFact.NetCashFlow], 0)
+        self.assertEqual([name for name, message in self.x.diagnostics.imputation_failures], ['NetCashFlow'])
+
+    def tearDown(self):
+        CommonFact.NetCashFlow._evaluators = self.evaluators
+
+    def test_override_clears_failure_of_imputed_fact(self):
+        diff = self.x.override_common_facts({CommonFact.NetCashFlowsOperating: 4})
+        self.assertEqual(diff[CommonFact.NetCashFlow], (0, 0.25))
+        self.assertEqual(self.x.diagnostics.imputation_failures, ())
+        self.assertEqual(self.x._dump_state()['imputation_failures'], {})
+
+    def test_override_clears_failure_of_overridden_fact(self):
+        self.x.override_common_facts({'NetCashFlow': 100})
+        self.assertEqual(self.x.diagnostics.imputation_failures, ())
+
+    def test_what_if_keeps_failure(self):
+        self.x.what_if({CommonFact.NetCashFlowsOperating: 4})
+        self.assertEqual([name for name, message in self.x.diagnostics.imputation_failures], ['NetCashFlow'])
+
+if __name__ == '__main__':
+    unittest.main()
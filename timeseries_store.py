@@ -0,0 +1,283 @@
+"""
+A file backed store of CommonFact and CommonMeasurement values of many filings over time, to build the history of a company or to compare a value across companies without constructing XBRL objects again.
+
+A store is a directory with a file per column, each a flat little-endian array which is memory mapped when read:
+    meta.json               the number of rows and the names of the value columns. It is replaced after the columns are written, so a crashed append is never seen
+    keys/<field>            the key of each row, see KEY_FIELDS
+    values/<name>.f8        a float64 column for each CommonFact and CommonMeasurement, by name
+
+Rows are only ever appended, see TimeSeriesStore.append. A filing and its amendments all stay in the store, and reads pick one filing for each fiscal period, the latest amendment by default.
+CommonFact and CommonMeasurement defined after a store was created get a new column, which is NaN for the rows appended before.
+
+    >>> store = TimeSeriesStore('/data/fundamentals')
+    >>> store.append(batch.extract(['/data/edgar/2014']))
+    >>> keys, values = store.company(320193, ('Revenues', 'ROE'))
+    >>> keys, values = store.column('ROE', start=date(2014, 1, 1))
+"""
+import json
+import os
+import tempfile
+
+import numpy
+
+from common_fact import CommonFact
+from common_measurement import CommonMeasurement
+from context_table import parse_date
+from xbrl import DEI
+
+STORE_VERSION = 1
+# DEI.DocumentFiscalPeriodFocus as stored in the fiscal_period key, by position. Anything else is stored as 0
+FISCAL_PERIODS = ('', 'Q1', 'Q2', 'Q3', 'Q4', 'FY')
+KEY_FIELDS = (
+    ('cik', '<i8'),             # DEI.EntityCentralIndexKey
+    ('fiscal_year', '<i2'),     # DEI.DocumentFiscalYearFocus, 0 if missing
+    ('fiscal_period', 'i1'),    # DEI.DocumentFiscalPeriodFocus, see FISCAL_PERIODS
+    ('period_end', '<M8[D]'),   # DEI.DocumentPeriodEndDate
+    ('amended', '?'),           # DEI.AmendmentFlag
+)
+KEY_DTYPE = numpy.dtype(list(KEY_FIELDS) + [('row', '<i8')])
+AMENDMENTS = ('latest', 'original', 'all')
+
+def value_columns():
+    """
+    Return a list of names of every CommonFact and CommonMeasurement, in the order of all()
+    """
+    return [x.name for x in CommonFact.all()] + [x.name for x in CommonMeasurement.all()]
+
+def fiscal_period_code(text):
+    text = (text or '').strip().upper()
+    return FISCAL_PERIODS.index(text) if text in FISCAL_PERIODS else 0
+
+def filing_key(result):
+    """
+    Given an xbrl.XBRL object or a batch.BatchResult, return its key as a tuple in the order of KEY_FIELDS, period_end as a date.
+    Raises ValueError if it has no valid DEI.EntityCentralIndexKey or DEI.DocumentPeriodEndDate
+    """
+    dei = result.dei
+    cik = int((dei.get(DEI.EntityCentralIndexKey) or '').strip())
+    period_end = parse_date(dei.get(DEI.DocumentPeriodEndDate))
+    if period_end is None:
+        raise ValueError('{0} has no valid DocumentPeriodEndDate'.format(result.url))
+    try:
+        # XBRL keeps the year of DocumentPeriodEndDate as an int when DocumentFiscalYearFocus is absent
+        fiscal_year = int(str(dei.get(DEI.DocumentFiscalYearFocus) or '').strip())
+    except ValueError:
+        fiscal_year = 0
+    amended = (dei.get(DEI.AmendmentFlag) or '').strip().lower() == 'true'
+    return (cik, fiscal_year, fiscal_period_code(dei.get(DEI.DocumentFiscalPeriodFocus)), period_end, amended)
+
+class TimeSeriesStore(object):
+    """
+    This class represents a store directory, which is created if it does not exist. Use a store from one writing process at a time, any number of processes may read it
+    """
+    def __init__(self, path):
+        self.path = path
+        for name in ('keys', 'values'):
+            directory = os.path.join(path, name)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        self._load_meta()
+
+    def __repr__(self):
+        return '<{0}: {1} {2} rows>'.format(self.__class__.__name__, self.path, self.rows)
+
+    def __len__(self):
+        return self.rows
+
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.path, 'meta.json')) as f:
+                meta = json.load(f)
+        except IOError:
+            meta = {'version': STORE_VERSION, 'rows': 0, 'columns': []}
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError('{0} is a store of version {1}, expected {2}'.format(self.path, meta.get('version'), STORE_VERSION))
+        self.rows = meta['rows']
+        # the names of the value columns, in the order they were added
+        self.columns = [str(x) for x in meta['columns']]
+        # memory maps and the sort order of rows, valid until the next append
+        self._arrays = {}
+        self._order = None
+
+    def _write_meta(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': STORE_VERSION, 'rows': self.rows, 'columns': self.columns}, f)
+            os.rename(temp_path, os.path.join(self.path, 'meta.json'))
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def _files(self):
+        """
+        Return a list of (path, dtype) of every column file
+        """
+        ret = [(os.path.join(self.path, 'keys', name), numpy.dtype(dtype)) for name, dtype in KEY_FIELDS]
+        ret.extend((os.path.join(self.path, 'values', name + '.f8'), numpy.dtype('<f8')) for name in self.columns)
+        return ret
+
+    def append(self, results, chunk_size=1024):
+        """
+        Append a row for each of the given xbrl.XBRL objects or batch.BatchResult, chunk_size rows at a time. Failed results and those without a valid key are skipped, see filing_key.
+        Returns the number of rows appended
+        """
+        added = self._add_columns()
+        if added:
+            self._write_meta()
+        appended = 0
+        keys = []
+        values = []
+        for result in results:
+            if getattr(result, 'error', None):
+                continue
+            try:
+                key = filing_key(result)
+            except ValueError:
+                continue
+            keys.append(key)
+            values.append(CommonFact.values_of(result.common_facts) + CommonMeasurement.values_of(result.common_measurements))
+            if len(keys) == chunk_size:
+                appended += self._write_chunk(keys, values)
+                keys = []
+                values = []
+        if keys:
+            appended += self._write_chunk(keys, values)
+        return appended
+
+    def _add_columns(self):
+        """
+        Add a column for each CommonFact and CommonMeasurement the store does not have yet, NaN for the existing rows. Returns the names added
+        """
+        added = [name for name in value_columns() if name not in self.columns]
+        for name in added:
+            with open(os.path.join(self.path, 'values', name + '.f8'), 'wb') as f:
+                numpy.full(self.rows, numpy.nan, dtype='<f8').tofile(f)
+            self.columns.append(name)
+        return added
+
+    def _write_chunk(self, keys, values):
+        # a crashed append may have left data past self.rows, which is dropped before writing
+        for path, dtype in self._files():
+            with open(path, 'ab') as f:
+                f.truncate(self.rows * dtype.itemsize)
+        for (name, dtype), column in zip(KEY_FIELDS, zip(*keys)):
+            with open(os.path.join(self.path, 'keys', name), 'ab') as f:
+                numpy.array(column, dtype=dtype).tofile(f)
+        matrix = numpy.array(values, dtype='<f8')
+        positions = dict((name, i) for i, name in enumerate(value_columns()))
+        for name in self.columns:
+            with open(os.path.join(self.path, 'values', name + '.f8'), 'ab') as f:
+                if name in positions:
+                    numpy.ascontiguousarray(matrix[:, positions[name]]).tofile(f)
+                else:
+                    # no longer defined
+                    numpy.full(len(keys), numpy.nan, dtype='<f8').tofile(f)
+        self.rows += len(keys)
+        self._write_meta()
+        self._arrays = {}
+        self._order = None
+        return len(keys)
+
+    def _map(self, path, dtype):
+        if path not in self._arrays:
+            if self.rows:
+                self._arrays[path] = numpy.memmap(path, dtype=dtype, mode='r', shape=(self.rows,))
+            else:
+                self._arrays[path] = numpy.zeros(0, dtype=dtype)
+        return self._arrays[path]
+
+    def key(self, field):
+        """
+        Return the memory mapped array of the given key field for every row, see KEY_FIELDS
+        """
+        return self._map(os.path.join(self.path, 'keys', field), numpy.dtype(dict(KEY_FIELDS)[field]))
+
+    def values(self, name):
+        """
+        Return the memory mapped array of the given CommonFact or CommonMeasurement, or its name, for every row. Raises KeyError if the store has no such column
+        """
+        name = getattr(name, 'name', name)
+        if name not in self.columns:
+            raise KeyError(name)
+        return self._map(os.path.join(self.path, 'values', name + '.f8'), numpy.dtype('<f8'))
+
+    def _get_order(self):
+        """
+        Return the row numbers sorted by cik and period_end, and the ciks in that order
+        """
+        if self._order is None:
+            cik = self.key('cik')
+            order = numpy.lexsort((self.key('period_end'), cik))
+            self._order = (order, cik[order])
+        return self._order
+
+    def ciks(self):
+        """
+        Return a sorted array of every cik in the store
+        """
+        return numpy.unique(self.key('cik'))
+
+    def keys(self, rows):
+        """
+        Given an array of row numbers, return a structured array of their keys, with the fields of KEY_FIELDS and row
+        """
+        ret = numpy.empty(len(rows), dtype=KEY_DTYPE)
+        for name, dtype in KEY_FIELDS:
+            ret[name] = self.key(name)[rows]
+        ret['row'] = rows
+        return ret
+
+    def select(self, rows, start=None, end=None, amendments='latest'):
+        """
+        Given an array of row numbers, return those whose period_end is between start and end inclusive, with one row for each company and fiscal period unless amendments is 'all'.
+        amendments is one of AMENDMENTS: 'latest' takes the last amendment appended, or the original filing if there is none, and 'original' takes the first original filing.
+        The returned rows are sorted by cik and period_end
+        """
+        if amendments not in AMENDMENTS:
+            raise ValueError('Given amendments must be one of {0}'.format(AMENDMENTS))
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        period_end = self.key('period_end')[rows]
+        mask = numpy.ones(len(rows), dtype=bool)
+        if start is not None:
+            mask &= period_end >= numpy.datetime64(start, 'D')
+        if end is not None:
+            mask &= period_end <= numpy.datetime64(end, 'D')
+        rows = rows[mask]
+        cik = self.key('cik')[rows]
+        period_end = self.key('period_end')[rows]
+        fiscal_period = self.key('fiscal_period')[rows]
+        if amendments == 'all' or not len(rows):
+            return rows[numpy.lexsort((rows, fiscal_period, period_end, cik))]
+        amended = self.key('amended')[rows]
+        if amendments == 'latest':
+            # the preferred row of each group sorts last
+            order = numpy.lexsort((rows, amended, fiscal_period, period_end, cik))
+        else:
+            order = numpy.lexsort((-rows, ~amended, fiscal_period, period_end, cik))
+        cik, period_end, fiscal_period = cik[order], period_end[order], fiscal_period[order]
+        last = numpy.ones(len(order), dtype=bool)
+        last[:-1] = (cik[1:] != cik[:-1]) | (period_end[1:] != period_end[:-1]) | (fiscal_period[1:] != fiscal_period[:-1])
+        return rows[order[last]]
+
+    def company(self, cik, columns=None, start=None, end=None, amendments='latest'):
+        """
+        Return the history of a company as a tuple of (keys, values), see keys and select.
+        values is a 2-D float64 array of rows x columns, where columns are CommonFact, CommonMeasurement or their names, every column of the store by default
+        """
+        order, ciks = self._get_order()
+        cik = int(cik)
+        rows = order[numpy.searchsorted(ciks, cik, 'left'):numpy.searchsorted(ciks, cik, 'right')]
+        rows = self.select(rows, start, end, amendments)
+        columns = self.columns if columns is None else columns
+        values = numpy.empty((len(rows), len(columns)), dtype=numpy.float64)
+        for i, name in enumerate(columns):
+            values[:, i] = self.values(name)[rows]
+        return (self.keys(rows), values)
+
+    def column(self, name, start=None, end=None, amendments='latest'):
+        """
+        Return the values of a CommonFact or CommonMeasurement, or its name, across every company as a tuple of (keys, values), see keys and select. values is a 1-D float64 array
+        """
+        rows = self.select(numpy.arange(self.rows), start, end, amendments)
+        return (self.keys(rows), self.values(name)[rows])
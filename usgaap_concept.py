@@ -4,15 +4,22 @@ The concepts.csv was modified from the xlsx file, the "UGT *.xlsx" file was down
 Take the first sheet "Concept" from the xlsx.
 Remove all columns after deprecatedLabel.
 Remove all rows except for dei and us-gaap
+
+The xlsx is compiled into a memory-mapped snapshot the first time it is needed, see taxonomy_snapshot.py
 """
 import os
-import pickle
 import json
+import re
+
+import taxonomy_snapshot
 
 class UsGaapConcept(object):
     """
     This class represents one line in concepts.csv
+    There are tens of thousands of concepts, so attributes are kept in __slots__ and the strings repeated by many concepts are interned.
     """
+    __slots__ = ('prefix', 'name', 'type', 'enumerations', 'substitutionGroup', 'balance', 'periodType', 'abstract', 'label', 'documentation', 'deprecated', 'tag')
+
     def __init__(self,
                  _prefix,
                  _name,
@@ -27,19 +34,19 @@ class UsGaapConcept(object):
                  _deprecatedLabel):
         if not _prefix or not _name:
             raise ValueError('_prefix and _name can not be None or empty')
-        self.prefix = _prefix
+        self.prefix = intern(_prefix)
         self.name = _name
-        self.type = _type
+        self.type = intern(_type)
         self.enumerations = _enumerations
-        self.substitutionGroup = _substitutionGroup
-        self.balance = _balance
-        self.periodType = _periodType
+        self.substitutionGroup = intern(_substitutionGroup)
+        self.balance = intern(_balance)
+        self.periodType = intern(_periodType)
         self.abstract = True if _abstract else False
         self.label = _label
         self.documentation = _documentation
         self.deprecated = True if _deprecatedLabel else False
 
-        self.tag = '{0}:{1}'.format(self.prefix, self.name)
+        self.tag = intern('{0}:{1}'.format(self.prefix, self.name))
 
     @classmethod
     def create_instance(cls, tokens):
@@ -67,74 +74,149 @@ class UsGaapConcept(object):
     def json(self):
         return json.dumps(self)
 
+class UsGaapTaxonomy(object):
+    """
+    The collection of UsGaapConcept of one taxonomy year, backed by the snapshot of us-gaap/<year>, see taxonomy_snapshot.py.
+    Get instances from UsGaapConceptPool.get_taxonomy, so concepts are shared across years.
+    """
+    def __init__(self, year, source_path, snapshot_path):
+        self.year = year
+        self.source_path = source_path
+        self.snapshot_path = snapshot_path
+        self._snapshot = None
+        self._pool = {}
+
+    def __repr__(self):
+        return '<{0}: {1}>'.format(self.__class__.__name__, self.year)
+
+    def _get_snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = taxonomy_snapshot.load_snapshot(self.source_path, self.snapshot_path)
+        return self._snapshot
+
+    def get(self, tag):
+        """
+        tag format is <prefix>:<name>, eg. dei:DocumentType
+        """
+        fields = self._get_snapshot().get_fields(tag)
+        if not fields:
+            return None
+        return UsGaapConceptPool._get_concept(fields)
+
+    def get_all_tags(self):
+        return list(self._get_snapshot().tags())
+
+    def get_pool(self):
+        """
+        Return a map that maps from upper case tag to UsGaapConcept for every concept. This creates all UsGaapConcept, use get if only a few are needed
+        """
+        if not self._pool:
+            for fields in self._get_snapshot().iter_fields():
+                c = UsGaapConceptPool._get_concept(fields)
+                if c:
+                    self._pool[c.tag.upper()] = c
+        return self._pool
+
+    def get_documentation(self, tag):
+        """
+        Given a tag in <prefix>:<name> format, return its documentation
+        """
+        if not tag:
+            return ''
+        c = self.get(tag)
+        return c.documentation if c else ''
+
 class UsGaapConceptPool(object):
     """
     This class represents the entire collection of UsGaapConcept, provide convenience method to retrieve all concepts and access to specific concept.
+    It is also the registry of every taxonomy year under us-gaap, see get_taxonomy. The class methods get, get_all_tags, get_pool and get_documentation use DEFAULT_YEAR.
+    Concepts are shared by all years: the strings are interned, and a concept which is identical in several years is the same UsGaapConcept object.
     """
 
     CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
-    PICKLE_FILE_PATH = os.path.join(CURRENT_DIR, 'usgaap-concepts.pickle')
-    _pool = {}
+    TAXONOMY_DIR = os.path.join(CURRENT_DIR, 'us-gaap')
+    DEFAULT_YEAR = 2014
+    # eg. http://fasb.org/us-gaap/2014-01-31
+    NAMESPACE_PATTERN = re.compile(r'^http://(?:xbrl\.)?fasb\.org/us-gaap/(\d{4})-\d{2}-\d{2}$')
+    # a map that maps from year to UsGaapTaxonomy
+    _taxonomies = {}
+    # a map that maps from the fields of a concept to the UsGaapConcept, shared by all years
+    _concepts = {}
 
     def __init__(self):
         raise NotImplementedError
 
     @classmethod
-    def _parse_concepts_to_pool(cls):
-        concept_file_path = os.path.join(cls.CURRENT_DIR, 'us-gaap', 'concepts_2014.csv')
-        if not os.path.isfile(concept_file_path):
-            raise IOError('Concept file does not exist in {0}'.format(concept_file_path))
-        with open(concept_file_path) as f:
-            for line in f:
-                if not line:
-                    continue
-                if line.startswith('#'):
-                    continue
-                line = line.strip()
-                tokens = line.split('|')
-                tokens = tokens[1:]     # remove the first token which is id
-                if len(tokens) != 11:
-                    diff = 11 - len(tokens)
-                    tokens.extend([''] * diff)
-                c = UsGaapConcept.create_instance(tokens)
-                if not c:
-                    continue
-                cls._pool[c.tag.upper()] = c
+    def _get_concept(cls, fields):
+        fields = tuple(intern(x) for x in fields)
+        if fields not in cls._concepts:
+            cls._concepts[fields] = UsGaapConcept.create_instance(fields)
+        return cls._concepts[fields]
+
+    @classmethod
+    def get_years(cls):
+        """
+        Return a sorted list of the taxonomy years available under us-gaap
+        """
+        if not cls._taxonomies:
+            for year, source_path in taxonomy_snapshot.find_sources(cls.TAXONOMY_DIR).iteritems():
+                snapshot_path = os.path.join(os.path.dirname(source_path), taxonomy_snapshot.SNAPSHOT_FILE_NAME)
+                cls._taxonomies[year] = UsGaapTaxonomy(year, source_path, snapshot_path)
+        return sorted(cls._taxonomies)
+
+    @classmethod
+    def get_taxonomy(cls, year=None):
+        """
+        Return the UsGaapTaxonomy of the given year, DEFAULT_YEAR if year is None.
+        If that year is not available, the latest year before it is taken, or the earliest year if there is none before it
+        """
+        years = cls.get_years()
+        if not years:
+            raise IOError('No taxonomy found in {0}'.format(cls.TAXONOMY_DIR))
+        if year is None:
+            year = cls.DEFAULT_YEAR
+        candidates = [x for x in years if x <= year]
+        return cls._taxonomies[candidates[-1] if candidates else years[0]]
+
+    @classmethod
+    def get_year_of_namespace(cls, namespace):
+        """
+        Given a us-gaap namespace, eg. http://fasb.org/us-gaap/2014-01-31, return its year as int, or None if it is not a us-gaap namespace
+        """
+        match = cls.NAMESPACE_PATTERN.match(namespace.strip()) if namespace else None
+        return int(match.group(1)) if match else None
+
+    @classmethod
+    def get_taxonomy_for_nsmap(cls, nsmap):
+        """
+        Given a map that maps from prefix to namespace as declared in an XBRL xml document, return the UsGaapTaxonomy of the us-gaap namespace it declares, see get_taxonomy
+        """
+        years = [cls.get_year_of_namespace(x) for x in nsmap.values()]
+        years = [x for x in years if x is not None]
+        return cls.get_taxonomy(max(years) if years else None)
 
     @classmethod
     def get(cls, tag):
         """
         tag format is <prefix>:<name>, eg. dei:DocumentType
         """
-        if not cls._pool:
-            cls._parse_concepts_to_pool()
-        if tag.upper() not in cls._pool:
-            return None
-        return cls._pool[tag.upper()]
+        return cls.get_taxonomy().get(tag)
 
     @classmethod
     def get_all_tags(cls):
-        if not cls._pool:
-            cls._parse_concepts_to_pool()
-        return sorted([x.tag for x in cls._pool.values()])
+        return cls.get_taxonomy().get_all_tags()
 
     @classmethod
     def get_pool(cls):
-        if not cls._pool:
-            cls._parse_concepts_to_pool()
-        return cls._pool
+        return cls.get_taxonomy().get_pool()
 
     @classmethod
     def get_documentation(cls, tag):
         """
         Given a tag in <prefix>:<name> format, return its documentation
         """
-        if not tag:
-            return ''
-        c = cls.get(tag)
-        return c.documentation if c else ''
+        return cls.get_taxonomy().get_documentation(tag)
 
 if __name__ == '__main__':
-    # UsGaapConceptPool._load_pickle()
     # obj = UsGaapConceptPool.get('dei:documenttype')
     print UsGaapConceptPool.get_documentation('us-gaap:assets')
@@ -1,18 +1,95 @@
+import collections
 from lxml import etree
 from common_fact import CommonFact
 from common_measurement import CommonMeasurement
+from context_table import ContextRecord, ContextTable, one_year_before, parse_date
 from datetime import date
+import diagnostics_helper
 from quote_helper import get_quote
+import source_helper
+from stats_helper import XBRLStats
+from usgaap_concept import UsGaapConceptPool
 
 class Context(object):
     """ A simulated Enum class to represent 2 different contexts: Instant and Duration
     """
     Duration, Instant = range(2)
 
+class Period(object):
+    """ A simulated Enum class to represent the standard periods a filing reports facts for, see XBRL.period_facts
+        PriorInstant and PriorYearDuration are the comparatives one year before CurrentInstant and the current duration context
+    """
+    CurrentInstant, PriorInstant, CurrentQuarter, YearToDate, PriorYearDuration = range(5)
+
+    @classmethod
+    def all(cls):
+        """
+        Returns a tuple which contains all members
+        """
+        return tuple(range(5))
+
+class Fact(object):
+    """
+    A single fact reported in an XBRL xml document, for example <us-gaap:Assets contextRef="..." unitRef="usd" decimals="-6">1000</us-gaap:Assets>
+    Only the pieces needed for analysis are kept: the tag, contextRef, text, unitRef and decimals.
+    """
+    __slots__ = ('tag', 'context_ref', 'text', 'unit_ref', 'decimals')
+
+    def __init__(self, tag, context_ref, text, unit_ref=None, decimals=None):
+        self.tag = tag
+        self.context_ref = context_ref
+        self.text = text
+        self.unit_ref = unit_ref
+        self.decimals = decimals
+
+    def __repr__(self):
+        return '<{0}: {1} {2}={3}>'.format(self.__class__.__name__, self.tag, self.context_ref, self.text)
+
+class LazyValues(collections.Mapping):
+    """
+    A map that maps from CommonFact or CommonMeasurement objects to its value, where each value is only determined the first time it is asked for.
+    It behaves like a dict that has every member as a key, so iterating over its items determines everything.
+    """
+    def __init__(self, members, determine, assign):
+        """
+        Args:
+            members A tuple of all keys
+            determine A callable which is given a key and returns its value, determining it if needed
+            assign A callable which is given a key and a value, and sets it as the determined value for that key
+        """
+        self._members = members
+        self._keys = frozenset(members)
+        self._determine = determine
+        self._assign = assign
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._determine(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            raise KeyError(key)
+        self._assign(key, value)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
 class DEI(object):
     """
     DEI stands for Document and Entity Information. For each XBRL report, there will be a section for DEI, and this class is to provide easy access to those commonly-defined DEI attributes.
     """
+    __slots__ = ('name', 'fact_name')
+
     # pool is a set of strings contains all object names, for convenient retrieval
     pool = set()
 
@@ -20,7 +97,7 @@ class DEI(object):
         if name and isinstance(name, str):
             self.name = name
             self.pool.add(name)
-            self.fact_name = 'dei:{0}'.format(self.name)
+            self.fact_name = intern('dei:{0}'.format(self.name))
         else:
             raise ValueError('Given name is not a string')
 
@@ -30,12 +107,6 @@ class DEI(object):
     def __repr__(self):
         return '<{0}: {1}>'.format(self.__class__.__name__, self.name)
 
-    def __getattr__(self, name):
-        lookup = name
-        if lookup in self.__dict__:
-            return self.__dict__[lookup]
-        return self.__dict__[name] if name in self.__dict__ else None
-
     @classmethod
     def all(cls):
         """
@@ -66,21 +137,33 @@ class XBRL(object):
     For example: http://www.sec.gov/Archives/edgar/data/320193/000119312513416534/aapl-20130928.xml
     """
 
-    def __init__(self, url):
+    def __init__(self, url, streaming=False, cache=None, data=None):
         """
         This url can be a local file path or a http url points to the xml file
+        A http url is downloaded with the timeouts and retries of download_helper.get_downloader(). If data is given, it is the content of the document at url which has already been read, and url is only used as its name.
+        url can also be the document itself, as a str, bytearray, memoryview or an open file object, and it may be gzip compressed, see source_helper.resolve. Then self.url is the name of the file object, or ''.
+
+        If streaming is True, the document is read with lxml.etree.iterparse and every element is discarded as soon as it has been processed. Only contexts, DEI and the facts named by CommonFact.possible_fact_names are kept, and self.doc_root will be None.
+        This keeps memory bounded when processing a large number of big filings, at the cost that get_fact_value only knows about those facts.
+
+        If cache is given, it should be a cache_helper.XBRLCache. The document is looked up in the cache by the hash of its content, and if it was processed before with the same CommonFact and CommonMeasurement definitions, everything is restored from the cache without parsing xml at all, and self.doc_root will be None.
         """
-        self.url = url
-        try:
-            self.doc_root = etree.parse(url).getroot()
-        except IOError as err:
-            raise err
+        self.streaming = streaming
+        # timing and counters of the work done for this filing, see stats_helper.XBRLStats
+        self.stats = XBRLStats()
+        # A map that maps from CommonFact to the error message of its failed imputation, see diagnostics
+        self._imputation_failures = {}
+        self.doc_root = None
         self.nsmap = {}
-        for key in self.doc_root.nsmap.keys():
-            if key:
-                self.nsmap[key] = self.doc_root.nsmap[key]
-        self.nsmap['xbrli'] = 'http://www.xbrl.org/2003/instance'
-        self.nsmap['xlmns'] = 'http://www.xbrl.org/2003/instance'
+
+        # A map that maps from (tag in {namespace}name form, contextRef) to a tuple of Fact in document order
+        self._fact_index = {}
+        # A map that maps from tag in {namespace}name form to its first Fact in document order, regardless of contextRef
+        self._first_facts = {}
+        # A map that maps from contextRef to a list of tags in {namespace}name form which have facts in that context, see get_dimensional_facts
+        self._tags_by_context = {}
+        # Every <context> in the document, indexed by period, see context_table.ContextTable
+        self.contexts = ContextTable()
 
         # The year this report was filed, DEI.DocumentFiscalYearFocus
         self.fiscal_year = 0
@@ -89,50 +172,386 @@ class XBRL(object):
 
         # A map that maps from DEI objects to its value
         self.dei = {}
-        self._determine_dei()
+        # True if DEI.TradingSymbol is not in the document and was taken from self.url, see _determine_dei
+        self._symbol_from_url = False
 
         # find instant and duration contextRef
         self.context_instant = ''
         self.context_duration = ''
-        self._find_contexts()
 
-        # A map that maps from FinancialCommonFact objects to its value
-        self.common_facts = {}
-        self._determine_common_facts()
+        # A map that maps from Period to a (main, secondary) pair of contextRef, see _find_period_contexts
+        self.period_contexts = {}
+        # A map that maps from Period to a map from CommonFact objects to its value in that period, each period is extracted the first time it is asked for
+        self.period_facts = LazyValues(Period.all(), self._determine_period_facts, self._assign_period_facts)
+        self._period_facts = {}
 
-        # A map that maps from FinancialMeasurement objects to its value
-        self.common_measurements = {}
-        self._calculate_measurements()
+        # A map that maps from FinancialCommonFact objects to its value, each value is fetched and imputed the first time it is asked for
+        facts = CommonFact.all()
+        self.common_facts = LazyValues(facts, self._determine_fact, self._assign_fact)
+        # values indexed by CommonFact.index, imputation works on this list directly
+        self._fact_values = [float(0)] * len(facts)
+        # the values found in the document, None if not fetched yet. CommonFact which are 0 here are imputed
+        self._fetched_values = [None] * len(facts)
+        self._fact_determined = [False] * len(facts)
 
-    def _determine_common_facts(self):
+        # A map that maps from FinancialMeasurement objects to its value, each value is calculated the first time it is asked for
+        measurements = CommonMeasurement.all()
+        self.common_measurements = LazyValues(measurements, self._determine_measurement, self._assign_measurement)
+        # values indexed by CommonMeasurement.index
+        self._measurement_values = [float(0)] * len(measurements)
+        self._measurement_determined = [False] * len(measurements)
+        # the quote is only fetched when a CommonMeasurement which requires it is asked for
+        self._quote = None
+
+        source = source_helper.resolve(url, data)
+        self.url = source.name
+        cache_key = None
+        if cache is not None:
+            with self.stats.phase('cache'):
+                cache_key = cache.make_key(source.read(), streaming)
+                state = cache.get(cache_key)
+                if state is not None:
+                    self._restore_state(state)
+                    return
+
+        try:
+            with self.stats.phase('parse'):
+                if streaming:
+                    self._load_streaming(source)
+                else:
+                    self._load_document(source)
+        except IOError as err:
+            raise err
+        with self.stats.phase('contexts'):
+            self._determine_dei()
+            self._find_contexts()
+
+        if cache_key is not None:
+            # determining facts needs no network, so do it once here and keep them in the cache as well
+            self._determine_common_facts()
+            with self.stats.phase('cache'):
+                cache.put(cache_key, self._dump_state())
+
+    def _dump_state(self):
+        """
+        Return everything extracted from the document as builtin types, to be stored by cache_helper.XBRLCache
+        """
+        return {
+            'nsmap': self.nsmap,
+            'contexts': self.contexts.to_tuples(),
+            'facts': [(key[0], key[1], tuple((f.text, f.unit_ref, f.decimals) for f in facts)) for key, facts in self._fact_index.iteritems()],
+            'first_facts': dict((tag, fact.context_ref) for tag, fact in self._first_facts.iteritems()),
+            # the same document may be loaded from another url, so a TradingSymbol taken from the url is left out
+            'dei': dict((dei.name, '' if dei == DEI.TradingSymbol and self._symbol_from_url else value) for dei, value in self.dei.iteritems()),
+            'fiscal_year': self.fiscal_year,
+            'fiscal_period_end_date': self.fiscal_period_end_date.toordinal(),
+            'context_instant': self.context_instant,
+            'context_duration': self.context_duration,
+            'fetched_values': self._fetched_values,
+            'fact_values': self._fact_values,
+            'fact_determined': self._fact_determined,
+            'quote': self._quote,
+            'measurement_values': self._measurement_values,
+            'measurement_determined': self._measurement_determined,
+            'imputation_failures': dict((fact.name, message) for fact, message in self._imputation_failures.iteritems()),
+        }
+
+    def _restore_state(self, state):
+        """
+        The reverse of _dump_state
+        """
+        self.nsmap = state['nsmap']
+        self.contexts = ContextTable.from_tuples(state['contexts'])
+        for tag, context_ref, facts in state['facts']:
+            self._fact_index[(tag, context_ref)] = tuple(Fact(tag, context_ref, text, unit_ref, decimals) for text, unit_ref, decimals in facts)
+            if context_ref in self._tags_by_context:
+                self._tags_by_context[context_ref].append(tag)
+            else:
+                self._tags_by_context[context_ref] = [tag]
+        for tag, context_ref in state['first_facts'].iteritems():
+            self._first_facts[tag] = self._fact_index[(tag, context_ref)][0]
+        self.dei = dict((getattr(DEI, name), value) for name, value in state['dei'].iteritems())
+        self._determine_url_dei()
+        self.fiscal_year = state['fiscal_year']
+        self.fiscal_period_end_date = date.fromordinal(state['fiscal_period_end_date'])
+        self.context_instant = state['context_instant']
+        self.context_duration = state['context_duration']
+        self._find_period_contexts()
+        self._fetched_values = state['fetched_values']
+        self._fact_values = state['fact_values']
+        self._fact_determined = state['fact_determined']
+        self._quote = state['quote']
+        self._imputation_failures = dict((CommonFact.pool[name], message) for name, message in state.get('imputation_failures', {}).iteritems())
+        self._measurement_values = state['measurement_values']
+        self._measurement_determined = state['measurement_determined']
+
+    @property
+    def taxonomy(self):
+        """
+        The usgaap_concept.UsGaapTaxonomy of the us-gaap namespace this document declares, eg. the 2014 taxonomy for http://fasb.org/us-gaap/2014-01-31
+        """
+        return UsGaapConceptPool.get_taxonomy_for_nsmap(self.nsmap)
+
+    def _set_nsmap(self, nsmap):
+        """
+        Keep the namespaces declared on the root element, they are used to resolve <prefix>:<name> fact names
+        """
+        for key in nsmap.keys():
+            if key:
+                self.nsmap[key] = nsmap[key]
+        self.nsmap['xbrli'] = 'http://www.xbrl.org/2003/instance'
+        self.nsmap['xlmns'] = 'http://www.xbrl.org/2003/instance'
+
+    def _load_document(self, source):
+        """
+        Parse the whole document into self.doc_root, then collect contexts and index every fact in a single walk
+        """
+        self.doc_root = source.parse()
+        self._set_nsmap(self.doc_root.nsmap)
+        for node in self.doc_root.iterchildren(etree.Element):
+            self._load_node(node)
+        self._freeze_fact_index()
+
+    def _load_streaming(self, source):
+        """
+        Read the document with iterparse, process each child of the root once it is complete and then throw it away, so the tree never grows beyond a single fact or context
+        """
+        nsmap = {}
+        wanted_tags = None
+        for event, node in source.iterparse(events=('start-ns', 'end')):
+            if event == 'start-ns':
+                # the namespaces declared on root are all reported before the first child is complete
+                if wanted_tags is None and node[0] not in nsmap:
+                    nsmap[node[0]] = node[1]
+                continue
+            parent = node.getparent()
+            if parent is None or parent.getparent() is not None:
+                # root itself, or an element nested in a child of root which is processed along with that child
+                continue
+            if wanted_tags is None:
+                self._set_nsmap(nsmap)
+                wanted_tags = self._get_wanted_tags()
+            self._load_node(node, wanted_tags)
+            node.clear()
+            while node.getprevious() is not None:
+                del parent[0]
+        self._freeze_fact_index()
+
+    def _get_wanted_tags(self):
         """
-        Based on this XBRL xml document, try to fetch or determine the values for all CommonFact and store it in self.common_facts
+        Return a set of tags in {namespace}name form for all DEI and all CommonFact.possible_fact_names
         """
-        # fetch
+        fact_names = [dei.fact_name for dei in DEI.all()]
         for fact in CommonFact.all():
-            value = float(0)
-            if not fact.possible_fact_names:
-                self.common_facts[fact] = value
+            if fact.possible_fact_names:
+                fact_names.extend(fact.possible_fact_names)
+        return set(self._qualify(x) for x in fact_names)
+
+    def _load_node(self, node, wanted_tags=None):
+        """
+        Given a child element of root, keep it in self.contexts if it is a <context>, otherwise put every fact under it in the fact index.
+        If wanted_tags is given, only the facts whose tag is in wanted_tags are kept.
+        """
+        tag = node.tag
+        if tag[tag.find('}')+1:] == 'context':
+            self._load_context(node)
+            return
+        index = self._fact_index
+        first_facts = self._first_facts
+        tags_by_context = self._tags_by_context
+        for element in node.iter(etree.Element):
+            context_ref = element.get('contextRef')
+            if context_ref is None:
                 continue
-            for candidate in fact.possible_fact_names:
-                # get_fact_value returns string
-                temp = self.get_fact_value(candidate)
-                if temp and len(temp) > 0:
-                    try:
-                        value = float(temp)
-                        # this break here means that we take the first valid value from possible_fact_names
-                        break
-                    except ValueError:
-                        pass
-            self.common_facts[fact] = value
-        for fact in self.common_facts.keys():
-            value = self.common_facts[fact]
-            if value == float(0):
+            tag = element.tag
+            if wanted_tags is not None and tag not in wanted_tags:
+                continue
+            fact = Fact(tag, context_ref, element.text, element.get('unitRef'), element.get('decimals'))
+            key = (tag, context_ref)
+            if key in index:
+                index[key].append(fact)
+            else:
+                index[key] = [fact]
+                if context_ref in tags_by_context:
+                    tags_by_context[context_ref].append(tag)
+                else:
+                    tags_by_context[context_ref] = [tag]
+            if tag not in first_facts:
+                first_facts[tag] = fact
+
+    def _load_context(self, node):
+        """
+        Parse a <context> into a ContextRecord and add it to self.contexts
+        """
+        entity_node = None
+        period_node = None
+        dimensions = []
+        for child in node.iterchildren(etree.Element):
+            # _Element.tag contains full xmlns prefix, so need to take substring
+            tag = child.tag[child.tag.find('}')+1:]
+            if tag == 'entity':
+                entity_node = child
+            elif tag == 'period':
+                period_node = child
+            elif tag == 'scenario':
+                self._load_dimensions(child, dimensions)
+        if entity_node is None or period_node is None:
+            return
+        identifier = None
+        has_dimensions = False
+        for child in entity_node.iterchildren(etree.Element):
+            if child.tag.endswith('identifier') and identifier is None:
+                identifier = (child.text or '').strip()
+            else:
+                has_dimensions = True
+                # <segment>
+                self._load_dimensions(child, dimensions)
+        dates = {}
+        for child in period_node.iterchildren(etree.Element):
+            dates[child.tag[child.tag.find('}')+1:]] = parse_date(child.text)
+        self.contexts.add(ContextRecord(node.get('id'), identifier, has_dimensions, dates.get('instant'), dates.get('startDate'), dates.get('endDate'), dimensions))
+
+    @staticmethod
+    def _load_dimensions(node, dimensions):
+        """
+        Append (axis, member) to dimensions for each <xbrldi:explicitMember> and <xbrldi:typedMember> under the given <segment> or <scenario>
+        """
+        for child in node.iterchildren(etree.Element):
+            tag = child.tag[child.tag.find('}')+1:]
+            if tag == 'explicitMember':
+                dimensions.append((child.get('dimension'), (child.text or '').strip()))
+            elif tag == 'typedMember':
+                # the member is the value of the single element in it
+                value = next(child.iterchildren(etree.Element), None)
+                dimensions.append((child.get('dimension'), (value.text or '').strip() if value is not None else ''))
+
+    def _freeze_fact_index(self):
+        """
+        Turn the lists in the fact index into tuples once loading has finished
+        """
+        for key, facts in self._fact_index.iteritems():
+            self._fact_index[key] = tuple(facts)
+
+    def _qualify(self, fact_name):
+        """
+        Given fact_name in <prefix>:<name> format, eg. us-gaap:Assets, return the tag in {namespace}name format as lxml uses, resolved against the namespaces declared in this document.
+        Return None if the prefix is not declared.
+        """
+        prefix, sep, name = fact_name.partition(':')
+        if not sep:
+            return fact_name
+        namespace = self.nsmap.get(prefix)
+        if namespace is None:
+            return None
+        return '{{{0}}}{1}'.format(namespace, name)
+
+    def _determine_common_facts(self):
+        """
+        Based on this XBRL xml document, try to fetch or determine the values for all CommonFact at once
+        """
+        self._determine_facts(CommonFact.evaluation_order())
+
+    def _determine_fact(self, fact):
+        """
+        Return the value of the given CommonFact, fetching and imputing it along with the CommonFact it is imputed from if it has not been determined yet
+        """
+        if not self._fact_determined[fact.index]:
+            self._determine_facts(CommonFact.upstream((fact,)))
+        return self._fact_values[fact.index]
+
+    def _determine_facts(self, facts):
+        """
+        Fetch and then impute the given CommonFact which have not been determined yet. facts must be in evaluation order and include everything they are imputed from, see CommonFact.upstream
+        """
+        pending = [fact for fact in facts if not self._fact_determined[fact.index]]
+        with self.stats.phase('facts'):
+            for fact in pending:
+                if self._fetched_values[fact.index] is None:
+                    value = self._fetch_fact(fact)
+                    self._fetched_values[fact.index] = value
+                    self._fact_values[fact.index] = value
+        self._impute(pending)
+        for fact in pending:
+            self._fact_determined[fact.index] = True
+
+    def _fetch_fact(self, fact, period=None):
+        """
+        Return the value of the given CommonFact found in the document, or 0 if not found. If period is given, look in the contexts of that Period instead of the current ones
+        """
+        value = float(0)
+        if not fact.possible_fact_names:
+            return value
+        for candidate in fact.possible_fact_names:
+            # get_fact_value returns string
+            temp = self.get_fact_value(candidate, period)
+            if temp and len(temp) > 0:
                 try:
-                    value = fact.impute(self.common_facts)
-                except Exception as err:
-                    print 'Imputation failed: {0}, equaltion: {1} on xbrl {2} because {3}'.format(fact, fact.impute_equations, self.url, err)
-                self.common_facts[fact] = value
+                    value = float(temp)
+                    # this break here means that we take the first valid value from possible_fact_names
+                    break
+                except ValueError:
+                    pass
+        return value
+
+    def _assign_fact(self, fact, value):
+        self._fact_values[fact.index] = value
+        self._fact_determined[fact.index] = True
+
+    def _impute(self, facts, values=None):
+        """
+        Impute the given CommonFact in order if they have no value yet, see CommonFact.evaluation_order
+        values is a list indexed by CommonFact.index, self._fact_values by default
+        """
+        if values is None:
+            values = self._fact_values
+        with self.stats.phase('impute'):
+            for fact in facts:
+                if values[fact.index] == float(0):
+                    try:
+                        values[fact.index] = fact.impute_values(values)
+                    except Exception as err:
+                        self._imputation_failed(fact, err, values is self._fact_values)
+                    if values[fact.index]:
+                        self.stats.imputations += 1
+
+    def _imputation_failed(self, fact, err, keep):
+        """
+        Keep the failure in self._imputation_failures if keep is True and pass it on to the DiagnosticsReporter if there is one
+        """
+        message = '{0}: {1}'.format(err.__class__.__name__, err)
+        if keep:
+            self._imputation_failures[fact] = message
+        reporter = diagnostics_helper.get_reporter()
+        if reporter is not None:
+            reporter.imputation_failed(self.url, fact, message)
+
+    @property
+    def diagnostics(self):
+        """
+        A diagnostics_helper.FilingDiagnostics of the CommonFact determined so far
+        """
+        facts = CommonFact.all()
+        return diagnostics_helper.FilingDiagnostics(
+            self.url,
+            [(fact.name, self._imputation_failures[fact]) for fact in facts if fact in self._imputation_failures],
+            [fact.name for fact in facts if fact.possible_fact_names and self._fetched_values[fact.index] == float(0)],
+            [fact.name for fact in facts if self._fact_determined[fact.index] and self._fact_values[fact.index] == float(0)],
+        )
+
+    def _determine_period_facts(self, period):
+        """
+        Fetch and impute every CommonFact for the given Period, see _find_period_contexts
+        """
+        if period not in self._period_facts:
+            facts = CommonFact.all()
+            with self.stats.phase('facts'):
+                values = [self._fetch_fact(fact, period) for fact in facts]
+            self._impute(CommonFact.evaluation_order(), values)
+            self._period_facts[period] = dict(zip(facts, values))
+        return self._period_facts[period]
+
+    def _assign_period_facts(self, period, values):
+        self._period_facts[period] = dict(values)
 
     def get_empty_common_facts(self):
         """
@@ -152,97 +571,201 @@ class XBRL(object):
 
     def _calculate_measurements(self):
         """
-        Calculate CommonMeasurement and put the result in self.common_measurements
+        Calculate all CommonMeasurement at once
+        """
+        self._determine_measurements(CommonMeasurement.evaluation_order())
+
+    def _determine_measurement(self, m):
+        """
+        Return the value of the given CommonMeasurement, calculating it along with what it is calculated from if it has not been calculated yet
+        """
+        if not self._measurement_determined[m.index]:
+            self._determine_measurements(CommonMeasurement.upstream((m,)))
+        return self._measurement_values[m.index]
+
+    def _determine_measurements(self, measurements):
+        """
+        Calculate the given CommonMeasurement which have not been calculated yet. measurements must be in evaluation order and include everything they are calculated from, see CommonMeasurement.upstream
+        Only the CommonFact they refer to are determined, and the quote is only fetched if one of them requires it.
+        """
+        pending = [m for m in measurements if not self._measurement_determined[m.index]]
+        facts = set(x for m in pending for x in m.get_dependencies() if isinstance(x, CommonFact))
+        self._determine_facts(CommonFact.upstream(facts))
+        if self._quote is None and any(m.requires_quote for m in pending):
+            with self.stats.phase('quote'):
+                self._quote = get_quote(self.dei[DEI.TradingSymbol], self.fiscal_period_end_date)
+            self.stats.quote_requests += 1
+        self._calculate(pending)
+        for m in pending:
+            self._measurement_determined[m.index] = True
+
+    def _calculate(self, measurements):
+        """
+        Calculate the given CommonMeasurement in order, see CommonMeasurement.evaluation_order
+        """
+        values = self._measurement_values
+        with self.stats.phase('measure'):
+            for m in measurements:
+                # measurement calculation could use both facts and measurements, so supply both
+                values[m.index] = m.calculate_values(self._fact_values, values, self._quote)
+
+    def _assign_measurement(self, m, value):
+        self._measurement_values[m.index] = value
+        self._measurement_determined[m.index] = True
+
+    def update_common_fact(self, common_fact, value):
+        """
+        Set the value of common_fact as if it was found in the document, then impute again only the CommonFact which depend on it and were not found in the document, and calculate again only the CommonMeasurement which depend on any of them.
+        CommonFact and CommonMeasurement which have not been asked for yet are left alone, they will use the new value when they are. The quote is not fetched again.
+        """
+        if not isinstance(common_fact, CommonFact):
+            raise ValueError('Given common_fact is not of type CommonFact')
+        self.override_common_facts({common_fact: value})
+
+    def override_common_facts(self, overrides):
         """
-        quote_month_avg = get_quote(self.dei[DEI.TradingSymbol], self.fiscal_period_end_date)
-        for m in CommonMeasurement.all():
-            # measurement calculation could use both facts and measurements, so supply both
-            value = m.calculate(self.common_facts, self.common_measurements, quote_month_avg)
-            self.common_measurements[m] = value
-        for m, value in self.common_measurements.items():
-            if value == 0:
-                value = m.calculate(self.common_facts, self.common_measurements, quote_month_avg)
-                self.common_measurements[m] = value
+        Same as update_common_fact, but for several CommonFact at once, which are all set before anything is imputed again.
+
+        Args:
+            overrides A map that maps from CommonFact, or its name, to the new value
+
+        Returns a map that maps from each CommonFact and CommonMeasurement whose value changed to a tuple of (old value, new value)
+        """
+        overrides = self._check_overrides(overrides)
+        changed = tuple(overrides)
+        for fact in changed:
+            # the old value is part of the diff, so it has to be determined first
+            self._determine_fact(fact)
+        facts = tuple(fact for fact in CommonFact.downstream(changed) if fact not in overrides and self._fact_determined[fact.index])
+        measurements = tuple(m for m in CommonMeasurement.downstream(changed + facts) if self._measurement_determined[m.index])
+        old_facts = [self._fact_values[fact.index] for fact in changed + facts]
+        old_measurements = [self._measurement_values[m.index] for m in measurements]
+
+        for fact, value in overrides.iteritems():
+            self._fetched_values[fact.index] = value
+            self._fact_values[fact.index] = value
+        for fact in facts:
+            if self._fetched_values[fact.index] is not None:
+                self._fact_values[fact.index] = self._fetched_values[fact.index]
+        # failures of the old values no longer hold, those imputed again are reported again
+        for fact in changed + facts:
+            self._imputation_failures.pop(fact, None)
+        self._impute(facts)
+        self._calculate(measurements)
+
+        ret = {}
+        for fact, old in zip(changed + facts, old_facts):
+            if self._fact_values[fact.index] != old:
+                ret[fact] = (old, self._fact_values[fact.index])
+        for m, old in zip(measurements, old_measurements):
+            if self._measurement_values[m.index] != old:
+                ret[m] = (old, self._measurement_values[m.index])
+        return ret
+
+    def what_if(self, overrides):
+        """
+        Return what override_common_facts would return for the given overrides, without changing any value of this object
+        """
+        # determine the overridden CommonFact before taking the state, so they keep their values
+        for fact in self._check_overrides(overrides):
+            self._determine_fact(fact)
+        state = (list(self._fetched_values), list(self._fact_values), list(self._fact_determined),
+                 list(self._measurement_values), list(self._measurement_determined), dict(self._imputation_failures))
+        try:
+            return self.override_common_facts(overrides)
+        finally:
+            (self._fetched_values, self._fact_values, self._fact_determined,
+             self._measurement_values, self._measurement_determined, self._imputation_failures) = state
+
+    @staticmethod
+    def _check_overrides(overrides):
+        """
+        Given a map that maps from CommonFact or its name to a value, return a map that maps from CommonFact to the value as a float
+        """
+        ret = {}
+        for fact, value in overrides.items():
+            if isinstance(fact, basestring):
+                if fact not in CommonFact.pool:
+                    raise ValueError('{0} is not a CommonFact'.format(fact))
+                fact = CommonFact.pool[fact]
+            elif not isinstance(fact, CommonFact):
+                raise ValueError('Given key {0} is not of type CommonFact'.format(fact))
+            ret[fact] = float(value)
+        return ret
+
+    @property
+    def fetched_common_facts(self):
+        """
+        A map that maps from CommonFact to the value found in the document or set by override_common_facts, 0 if there is none, which means the CommonFact is imputed. Every CommonFact is determined
+        """
+        self._determine_common_facts()
+        return dict((fact, self._fetched_values[fact.index] or float(0)) for fact in CommonFact.all())
 
     def _find_contexts(self):
         """
         Each XBRL xml contains a lot of different contexts, could represent different dimensions. We only need 2 from them, one is the context for instant and one for duration.
         This search process is based on the observation that
-            1. For each <context>, it contains 2 children: entity and period
-            2. For current instant and duration context, entity has only 1 child whose tag is "<identifier>"
-            3. For current instant context, there is only 1 child "<instant>" under "<period>", and its value is equal to <dei:DocumentPeriodEndDate>
-            4. For current duration context, there are 2 children "<startDate>" and "<endDate>" under "<period>", and the value for "<endDate>" is equal to <dei:DocumentPeriodEndDate>
-        """
-        context_instant = ''
-        context_duration = ''
-        # get END_DATE, which is also the date in file name
-        # we can not use self.dei[DEI.dei_DocumentPeriodEndDate] because right now self.dei has not yet been initialized
-        END_DATE = str(self.fiscal_period_end_date)
-        document_type = self.dei[DEI.DocumentType]
-        # get all nodes for <context id=??>
-        for node in self.doc_root.xpath("//*[local-name() = 'context']"):
-            # as we are not sure about the return order, we need to determine the 2 nodes by its tag
-            entity_node = None
-            period_node = None
-            for child in node.getchildren():
-                # _Element.tag contains full xmlns prefix, so need to take substring
-                tag = child.tag[child.tag.find('}')+1:]
-                if tag == 'entity':
-                    # entity node
-                    entity_node = child
-                elif tag == 'period':
-                    # period node
-                    period_node = child
-            # children under entity must be 1
-            if len(entity_node.getchildren()) != 1:
-                continue
-            # the one child under entity must have tag 'identifier'
-            if not 'identifier' in entity_node.getchildren()[0].tag:
-                continue
-            if len(period_node.getchildren()) == 1:
-                # candidate for instant
-                instant_node = period_node.getchildren()[0]
-                if instant_node.text != END_DATE:
-                    continue
-                context_instant = node.get('id')
-            elif len(period_node.getchildren()) == 2:
-                # candidate for duration
-                start_date_node = period_node.getchildren()[0]
-                end_date_node = period_node.getchildren()[1]
-                if end_date_node.text != END_DATE:
-                    continue
-                # determine startDate
-                if 'Q' in document_type:
-                    # A quarter report, there could have been multiple same endDate, so we need to check on start date, which will be 3 moths earlier than endDate
-                    year, month = self.fiscal_period_end_date.year, self.fiscal_period_end_date.month
-                    start_month = 12 if (month - 2) % 12 == 0 else (month - 2) % 12
-                    start_year = year - 1 if month <= 2 else year
-                    filter_text1 = '{0}-{1:02d}'.format(start_year, start_month)
-                    # some company put start date to the last day of previous month, so we need to check both
-                    start_month = 12 if (month - 3) % 12 == 0 else (month - 3) % 12
-                    start_year = year - 1 if month <= 3 else year
-                    filter_text2 = '{0}-{1:02d}'.format(start_year, start_month)
-                    # print filter_text1, filter_text2
-                    if filter_text1 not in start_date_node.text and filter_text2 not in start_date_node.text:
-                        continue
-                context_duration = node.get('id')
-        self.context_instant = context_instant
-        self.context_duration = context_duration
+            1. For current instant and duration context, entity has only 1 child whose tag is "<identifier>"
+            2. For current instant context, the instant is equal to <dei:DocumentPeriodEndDate>
+            3. For current duration context, the endDate is equal to <dei:DocumentPeriodEndDate>
+        If there are several candidates, the last one in the document is taken.
+        """
+        # we can not use self.dei[DEI.dei_DocumentPeriodEndDate] because it is a string
+        end_date = self.fiscal_period_end_date
+        instants = self.contexts.instants_at(end_date)
+        durations = self.contexts.durations_ending_at(end_date)
+        if 'Q' in self.dei[DEI.DocumentType]:
+            # A quarter report, there could have been multiple same endDate, so we need to check on start date, which will be 3 months earlier than endDate
+            # some company put start date to the last day of previous month, so we need to check both
+            month = end_date.year * 12 + end_date.month
+            durations = [x for x in durations if month - (x.start_date.year * 12 + x.start_date.month) in (2, 3)]
+        self.context_instant = instants[-1].id if instants else ''
+        self.context_duration = durations[-1].id if durations else ''
+        self._find_period_contexts()
+
+    def _find_period_contexts(self):
+        """
+        Find the contexts of every Period from self.contexts, after _find_contexts.
+        Each Period is given a (main, secondary) pair of contextRef, a fact is looked up in main first and then in secondary, just like in _get_elementlist. The secondary one is the instant at the end of a duration, or the duration ending at an instant, so that every Period has values for facts from both the balance sheet and the other statements.
+            1. CurrentInstant is context_instant
+            2. CurrentQuarter is the 3 months duration ending at DocumentPeriodEndDate, if any
+            3. YearToDate is the longest duration up to 12 months ending at DocumentPeriodEndDate, which is the full year for a 10-K
+            4. PriorInstant and PriorYearDuration are the contexts one year before context_instant and context_duration, matched within a few days for 52/53-week fiscal years
+        Periods not reported in the document get '' for contextRef.
+        """
+        end_date = self.fiscal_period_end_date
+        current_duration = self.contexts.get(self.context_duration)
+        quarters = self.contexts.durations_ending_at(end_date, months=3)
+        year_to_date = [x for x in self.contexts.durations_ending_at(end_date) if x.months <= 12]
+        year_to_date.sort(key=lambda x: x.months)
+        prior_instants = self.contexts.instants_near(one_year_before(end_date))
+        prior_durations = ()
+        if current_duration is not None:
+            prior_durations = self.contexts.durations_ending_near(one_year_before(end_date), months=current_duration.months)
+
+        quarter = quarters[-1].id if quarters else ''
+        year_to_date = year_to_date[-1].id if year_to_date else ''
+        prior_instant = prior_instants[-1].id if prior_instants else ''
+        prior_duration = prior_durations[-1].id if prior_durations else ''
+        self.period_contexts = {
+            Period.CurrentInstant: (self.context_instant, self.context_duration),
+            Period.PriorInstant: (prior_instant, prior_duration),
+            Period.CurrentQuarter: (quarter, self.context_instant),
+            Period.YearToDate: (year_to_date, self.context_instant),
+            Period.PriorYearDuration: (prior_duration, prior_instant),
+        }
 
     def _determine_dei(self):
         """
         For all DEI, fetch the value from XBRL xml and put it in self.dei
         """
         for dei in DEI.all():
-            fact_name = dei.fact_name
-            # value = self.get_fact_value(fact_name)
-            nodes = self.doc_root.xpath('//{0}'.format(fact_name), namespaces=self.nsmap)
-            value = nodes[0].text if nodes and len(nodes) > 0 else ''
+            fact = self._first_facts.get(self._qualify(dei.fact_name))
+            value = fact.text if fact else ''
             if not value:
                 value = ''
             self.dei[dei] = value
-        if not self.dei[DEI.TradingSymbol] or self.dei[DEI.TradingSymbol] == '':
-            self.dei[DEI.TradingSymbol] = self.url.split('/')[-1].split('.')[0].split('-')[0].upper()
+        self._determine_url_dei()
         tokens = self.dei[DEI.DocumentPeriodEndDate].split('-')
         tokens = tuple(int(x) for x in tokens)
         self.fiscal_period_end_date = date(tokens[0], tokens[1], tokens[2])
@@ -252,28 +775,86 @@ class XBRL(object):
         # determine self.fiscal_year and self.fiscal_period_end_date
         self.fiscal_year = int(self.dei[DEI.DocumentFiscalYearFocus])
 
-    def _get_elementlist(self, fact_name, context=Context.Duration):
+    def _determine_url_dei(self):
+        """
+        DEI.TradingSymbol could be absent, take it from the file name in self.url, eg. AAPL for .../aapl-20130928.xml
+        """
+        self._symbol_from_url = not self.dei[DEI.TradingSymbol]
+        if self._symbol_from_url:
+            self.dei[DEI.TradingSymbol] = self.url.split('/')[-1].split('.')[0].split('-')[0].upper()
+
+    def _get_elementlist(self, fact_name, context=Context.Duration, period=None):
         """
         In an XBRL xml document, there will be multiple context defined, but only 1 instant context and 1 duration context for current year.
-        The logic here is that if context was specified, then we set that context as main, and another one as secondary. We first get the nodes for main context, and if there is no nodes returned, we add the nodes for secondary context.
+        The logic here is that if context was specified, then we set that context as main, and another one as secondary. We first get the facts for main context, and if there is no facts found, we take the facts for secondary context.
+        If period is given, the main and secondary contexts of that Period are used instead, see _find_period_contexts.
+        Both lookups are served from self._fact_index.
 
-        Returns a tuple of lxml.etree._Element
+        Returns a tuple of Fact
         """
-        ret = []
-        if context == Context.Duration:
+        if period is not None:
+            main, secondary = self.period_contexts[period]
+        elif context == Context.Duration:
             main, secondary = self.context_duration, self.context_instant
         elif context == Context.Instant:
             main, secondary = self.context_instant, self.context_duration
-        ret.extend(self.doc_root.xpath("//{0}[@contextRef='{1}']".format(fact_name, main), namespaces=self.nsmap))
-        if len(ret) == 0:
-            ret.extend(self.doc_root.xpath("//{0}[@contextRef='{1}']".format(fact_name, secondary), namespaces=self.nsmap))
+        tag = self._qualify(fact_name)
+        ret = self._fact_index.get((tag, main)) or self._fact_index.get((tag, secondary), ())
+        if ret:
+            self.stats.index_hits += 1
+        else:
+            self.stats.index_misses += 1
+        return ret
+
+    def get_dimensional_facts(self, fact_name=None, axis=None, member=None, period=None):
+        """
+        Return a tuple of Fact in contexts with dimensions, eg. the revenues of each business segment, which every other lookup leaves out. They are served from the indexes built while loading, the document is not walked again.
+
+        Args:
+            fact_name In <prefix>:<name> format, eg. us-gaap:Revenues. Facts of every tag if None
+            axis The axis as written in the document, eg. us-gaap:StatementBusinessSegmentsAxis. Any axis if None
+            member The member on axis as written in the document, eg. aapl:AmericasSegmentMember. Any member if None
+            period A Period, then only facts about the same period as its main or secondary context are returned, see _find_period_contexts
+
+        Use self.contexts.get(fact.context_ref).dimensions to tell which part of the entity a Fact is about. In streaming mode, only the facts kept while loading are there, see __init__
+        """
+        if period is None:
+            contexts = self.contexts.dimensional(axis, member)
+        else:
+            contexts = []
+            seen = set()
+            for context_ref in self.period_contexts[period]:
+                record = self.contexts.get(context_ref)
+                if record is None:
+                    continue
+                for x in self.contexts.dimensional(axis, member, record):
+                    if x.id not in seen:
+                        seen.add(x.id)
+                        contexts.append(x)
+        tags = (self._qualify(fact_name),) if fact_name is not None else None
+        ret = []
+        for record in contexts:
+            for tag in tags or self._tags_by_context.get(record.id, ()):
+                ret.extend(self._fact_index.get((tag, record.id), ()))
         return tuple(ret)
 
-    def get_fact_value(self, fact_name):
+    def get_dimensional_values(self, fact_name, axis, period=None):
+        """
+        Return a map that maps from each member on axis to the text of fact_name in the context which has only that axis, eg. the revenues by business segment. See get_dimensional_facts
+        """
+        ret = {}
+        for fact in self.get_dimensional_facts(fact_name, axis, period=period):
+            dimensions = self.contexts.get(fact.context_ref).dimensions
+            if len(dimensions) == 1 and dimensions[0][1] not in ret:
+                ret[dimensions[0][1]] = fact.text
+        return ret
+
+    def get_fact_value(self, fact_name, period=None):
         """
         Given fact_name and filter_text, return the text for that fact. If not found, return empty string
+        If period is given, return the text for that fact in the given Period
         """
-        ret = self._get_elementlist(fact_name)
+        ret = self._get_elementlist(fact_name, period=period)
         return ret[0].text if ret else ''
 
     def get_common_fact(self, common_fact):